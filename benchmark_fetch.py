@@ -0,0 +1,119 @@
+'''
+Benchmarks end-to-end fetch.submissions throughput against a local stand-in
+portal (see standin_portal.py), for serial (concurrency 1) and concurrent
+planRead fetching.
+
+The portal runs in its own process with a fixed per-planRead latency (and
+optional transient error rate), so the measurements reflect the client's
+request scheduling rather than the server's work. Results are written as
+JSON.
+
+To use:
+    python benchmark_fetch.py --submissions 500 --latency 0.05 \
+        --concurrency 1 4 16 32 --output fetch_benchmark.json
+'''
+import argparse
+import json
+import platform
+import time
+from datetime import datetime as dt
+from multiprocessing import get_context
+import submission_analysis.fetch as fetch
+from submission_analysis.benchmark_utils import current_commit
+from standin_portal import StandInPortal
+
+
+def serve_portal(urls, **portal_kwargs):
+    """Runs a stand-in portal until its process is terminated, after putting
+    its (endpoints, plan_read_url) on the `urls` queue"""
+    portal = StandInPortal(**portal_kwargs)
+    urls.put((portal.endpoints(), portal.plan_read_url))
+    portal.server.serve_forever()
+
+
+def time_submissions(endpoints, plan_read_url: str, concurrency: int,
+                     repeats: int) -> dict:
+    """
+    Times fetch.submissions `repeats` times at the given concurrency and
+    returns the best wall time and the corresponding plans/second
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        plans_df, cois_df, _ = fetch.submissions(
+            *endpoints, concurrency=concurrency, plan_read_url=plan_read_url)
+        times.append(time.perf_counter() - start)
+    num_plans = len(plans_df) + len(cois_df)
+    return {
+        'concurrency': concurrency,
+        'plans': num_plans,
+        'seconds': min(times),
+        'plans_per_second': num_plans / min(times),
+    }
+
+
+def run_benchmark(num_submissions: int, latency: float, error_rate: float,
+                  concurrencies: list, repeats: int, seed: int) -> dict:
+    context = get_context('spawn')
+    urls = context.Queue()
+    server = context.Process(target=serve_portal,
+                             args=(urls, ),
+                             kwargs={
+                                 'num_submissions': num_submissions,
+                                 'latency': latency,
+                                 'error_rate': error_rate,
+                                 'seed': seed
+                             },
+                             daemon=True)
+    server.start()
+    try:
+        endpoints, plan_read_url = urls.get(timeout=60)
+        results = []
+        for concurrency in concurrencies:
+            result = time_submissions(endpoints, plan_read_url, concurrency,
+                                      repeats)
+            print(f"concurrency {concurrency:>3}: {result['seconds']:8.2f} s, "
+                  f"{result['plans_per_second']:8.1f} plans/s")
+            results.append(result)
+    finally:
+        server.terminate()
+        server.join()
+    return {
+        'config': {
+            'submissions': num_submissions,
+            'latency': latency,
+            'error_rate': error_rate,
+            'repeats': repeats,
+            'seed': seed,
+        },
+        'commit': current_commit(),
+        'timestamp': dt.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--submissions', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.)
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 4, 16, 32])
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='fetch_benchmark.json')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.submissions, args.latency, args.error_rate,
+                           args.concurrency, args.repeats, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(report['results'])} results to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
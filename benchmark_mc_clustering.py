@@ -0,0 +1,333 @@
+'''
+Benchmarks for submission_analysis.mc_clustering.
+
+`suite` runs geo_chain, semantic_chain and geo_semantic_chain on synthetic
+clustered documents over a grid of document and cluster counts, measuring
+setup time, steps/sec, acceptance rate, peak memory and the time needed to
+reach a target score. Each configuration runs in a fresh process so peak
+memory is measured per configuration. Results are written as JSON, and
+`compare` prints the change in throughput between two result files (e.g. from
+two commits).
+
+`proposals` compares the uniform single-flip proposal with geographic neighbor
+proposals (with and without the Metropolis-Hastings correction).
+
+To use:
+    python benchmark_mc_clustering.py suite --docs 500 2000 --clusters 5 50 \
+        --output before.json
+    python benchmark_mc_clustering.py compare before.json after.json
+    python benchmark_mc_clustering.py proposals --docs 1000 --clusters 20
+'''
+import argparse
+import json
+import platform
+import random
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime as dt
+from multiprocessing import get_context
+import numpy as np
+import submission_analysis.mc_clustering as mc
+from submission_analysis.benchmark_utils import current_commit
+
+CHAINS = ['geo', 'semantic', 'geo_semantic']
+
+
+def blob_distances(num_docs: int, num_clusters: int, seed: int = 0):
+    """
+    Places `num_docs` documents in `num_clusters` Gaussian blobs in the unit
+    square and returns their pairwise distance matrix (float32, to keep the
+    20,000-document configurations in memory) along with the blob labels
+    (the "true" clustering)
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.random((num_clusters, 2))
+    labels = np.arange(num_docs) % num_clusters
+    points = centers[labels] + rng.normal(scale=0.3 / np.sqrt(num_clusters),
+                                          size=(num_docs, 2))
+    dists = np.empty((num_docs, num_docs), dtype=np.float32)
+    for start in range(0, num_docs, 1024):
+        block = points[start:start + 1024, None, :] - points[None, :, :]
+        dists[start:start + 1024] = np.sqrt((block**2).sum(axis=2))
+    return dists, labels
+
+
+def blob_similarities(labels: np.ndarray, dim: int = 32, seed: int = 0):
+    """
+    Generates noisy embeddings around one random direction per label and
+    returns their pairwise cosine similarities, rescaled to [0, 1] (float32)
+    """
+    rng = np.random.default_rng(seed + 1)
+    directions = rng.normal(size=(labels.max() + 1, dim))
+    embeddings = directions[labels] + rng.normal(scale=1.5,
+                                                 size=(len(labels), dim))
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = embeddings.astype(np.float32)
+    sims = embeddings @ embeddings.T
+    sims += 1
+    sims /= 2
+    return sims
+
+
+def target_score(matrix: np.ndarray, labels: np.ndarray,
+                 tolerance: float) -> float:
+    """
+    Returns the score that closes all but `tolerance` of the gap between a
+    random clustering (whose expected score is about the mean of `matrix`)
+    and the true clustering given by `labels`
+    """
+    num_clusters = labels.max() + 1
+    true_score = mc.ChainState.from_assignment(
+        dict(enumerate(labels.tolist())), num_clusters,
+        {'score': mc.intracluster_score(matrix)}).scores['score']
+    return true_score + tolerance * (matrix.mean() - true_score)
+
+
+def run_to_target(chain: mc.MarkovChain, score: str, target: float,
+                  flipped: bool = False) -> dict:
+    """
+    Runs `chain` until its `score` reaches `target` (or the chain ends), and
+    returns the steps, seconds and acceptance rate of the run
+    """
+    start = time.perf_counter()
+    reached = None
+    for _ in chain:
+        value = chain.state.scores[score]
+        if (value >= target) if flipped else (value <= target):
+            reached = chain.step
+            break
+    elapsed = time.perf_counter() - start
+    return {
+        'steps': chain.step,
+        'seconds': elapsed,
+        'steps_to_target': reached,
+        'seconds_to_target': elapsed if reached is not None else None,
+        'acceptance_rate': chain.accepted / max(chain.step, 1),
+        'final_score': chain.state.scores[score],
+    }
+
+
+def compare_proposals(num_docs: int, num_clusters: int, neighbors: int,
+                      beta: float, length: int, tolerance: float,
+                      seed: int = 0) -> dict:
+    """
+    Runs a geographic chain with each proposal from the same starting RNG
+    state and reports how each fares against a target score (see
+    `target_score`)
+    """
+    dists, labels = blob_distances(num_docs, num_clusters, seed)
+    target = target_score(dists, labels, tolerance)
+    nearest = mc.nearest_neighbors(dists, neighbors)
+    proposals = {
+        'uniform': mc.single_flip_proposal,
+        'neighbor': mc.neighbor_flip_proposal(nearest),
+        'neighbor_no_mh': mc.neighbor_flip_proposal(nearest, hastings=False),
+    }
+    results = {'target': target}
+    for name, proposal_fn in proposals.items():
+        random.seed(seed)
+        chain = mc.chain_1d(dists, 'geo', False, beta, num_clusters, length,
+                            proposal_fn=proposal_fn)
+        results[name] = run_to_target(chain, 'geo', target)
+    return results
+
+
+def max_rss_bytes() -> int:
+    """
+    Peak resident set size of this process so far (ru_maxrss is in KiB on
+    Linux and bytes on macOS)
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if platform.system() == 'Darwin' else max_rss * 1024
+
+
+def benchmark_chain(chain_name: str, num_docs: int, num_clusters: int,
+                    beta: float, max_steps: int, max_seconds: float,
+                    tolerance: float, seed: int = 0) -> dict:
+    """
+    Builds one chain on synthetic data and runs it for at most `max_steps`
+    steps or `max_seconds` seconds. Meant to be run in a fresh process (see
+    `run_suite`) so the peak memory reflects this configuration alone.
+    """
+    baseline_rss = max_rss_bytes()
+    dists, labels = blob_distances(num_docs, num_clusters, seed)
+    sims = blob_similarities(labels, seed=seed)
+    targets = {
+        'geo': (target_score(dists, labels, tolerance), False),
+        'semantic': (target_score(sims, labels, tolerance), True),
+    }
+
+    random.seed(seed)
+    start = time.perf_counter()
+    if chain_name == 'geo':
+        chain = mc.geo_chain(dists, beta, num_clusters, max_steps)
+    elif chain_name == 'semantic':
+        chain = mc.semantic_chain(sims, beta, num_clusters, max_steps)
+    else:
+        chain = mc.geo_semantic_chain(dists, sims, beta, num_clusters,
+                                      max_steps)
+    setup_seconds = time.perf_counter() - start
+
+    def reached(state: mc.ChainState) -> bool:
+        return all((state.scores[name] >= target) if flipped else
+                   (state.scores[name] <= target)
+                   for name, (target, flipped) in targets.items()
+                   if name in state.scores)
+
+    steps_to_target = seconds_to_target = None
+    start = time.perf_counter()
+    deadline = start + max_seconds
+    for _ in chain:
+        if steps_to_target is None and reached(chain.state):
+            steps_to_target = chain.step
+            seconds_to_target = time.perf_counter() - start
+        if time.perf_counter() >= deadline:
+            break
+    seconds = time.perf_counter() - start
+    return {
+        'chain': chain_name,
+        'docs': num_docs,
+        'clusters': num_clusters,
+        'beta': beta,
+        'setup_seconds': setup_seconds,
+        'steps': chain.step,
+        'seconds': seconds,
+        'steps_per_second': chain.step / seconds if seconds else None,
+        'acceptance_rate': chain.accepted / max(chain.step, 1),
+        'steps_to_target': steps_to_target,
+        'seconds_to_target': seconds_to_target,
+        'final_scores': dict(chain.state.scores),
+        'matrix_bytes': int(dists.nbytes + sims.nbytes),
+        'peak_rss_bytes': max_rss_bytes(),
+        'baseline_rss_bytes': baseline_rss,
+    }
+
+
+def run_suite(chains: list, docs: list, clusters: list, beta: float,
+              max_steps: int, max_seconds: float, tolerance: float,
+              seed: int = 0) -> dict:
+    """
+    Benchmarks every (chain, docs, clusters) combination, each in its own
+    process, and returns the results along with run metadata
+    """
+    results = []
+    for num_docs in docs:
+        for num_clusters in clusters:
+            if num_clusters >= num_docs:
+                continue
+            for chain_name in chains:
+                with ProcessPoolExecutor(
+                        max_workers=1,
+                        mp_context=get_context('spawn')) as executor:
+                    result = executor.submit(benchmark_chain, chain_name,
+                                             num_docs, num_clusters, beta,
+                                             max_steps, max_seconds,
+                                             tolerance, seed).result()
+                to_target = result['seconds_to_target']
+                to_target = '-' if to_target is None else f'{to_target:.2f}s'
+                print(f"{chain_name:>12} docs={num_docs:<6} "
+                      f"clusters={num_clusters:<4} "
+                      f"setup={result['setup_seconds']:.2f}s "
+                      f"steps/s={result['steps_per_second'] or 0:.1f} "
+                      f"acceptance={result['acceptance_rate']:.3f} "
+                      f"to target={to_target} "
+                      f"peak={result['peak_rss_bytes'] / 2**20:.0f}MiB")
+                results.append(result)
+    return {
+        'commit': current_commit(),
+        'timestamp': dt.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def compare_results(before: dict, after: dict) -> list:
+    """
+    Matches configurations between two suite result files and returns
+    (chain, docs, clusters, before steps/sec, after steps/sec, ratio) rows
+    """
+    def key(result):
+        return result['chain'], result['docs'], result['clusters']
+
+    before_by_key = {key(r): r for r in before['results']}
+    rows = []
+    for result in after['results']:
+        old = before_by_key.get(key(result))
+        if old is None:
+            continue
+        old_rate = old['steps_per_second'] or 0
+        new_rate = result['steps_per_second'] or 0
+        ratio = new_rate / old_rate if old_rate else None
+        rows.append((*key(result), old_rate, new_rate, ratio))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    suite = commands.add_parser('suite', help='throughput benchmark suite')
+    suite.add_argument('--chains', nargs='+', default=CHAINS, choices=CHAINS)
+    suite.add_argument('--docs', type=int, nargs='+',
+                       default=[500, 2000, 5000, 20000])
+    suite.add_argument('--clusters', type=int, nargs='+',
+                       default=[5, 20, 50, 200])
+    suite.add_argument('--beta', type=float, default=10.)
+    suite.add_argument('--max-steps', type=int, default=100000)
+    suite.add_argument('--max-seconds', type=float, default=30.)
+    suite.add_argument('--tolerance', type=float, default=0.1)
+    suite.add_argument('--seed', type=int, default=0)
+    suite.add_argument('--output', default='mc_clustering_benchmark.json')
+
+    compare = commands.add_parser('compare',
+                                  help='compare two suite result files')
+    compare.add_argument('before')
+    compare.add_argument('after')
+
+    proposals = commands.add_parser('proposals',
+                                    help='compare proposal functions')
+    proposals.add_argument('--docs', type=int, default=500)
+    proposals.add_argument('--clusters', type=int, default=10)
+    proposals.add_argument('--neighbors', type=int, default=10)
+    proposals.add_argument('--beta', type=float, default=10.)
+    proposals.add_argument('--length', type=int, default=20000)
+    proposals.add_argument('--tolerance', type=float, default=0.1)
+    proposals.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == 'suite':
+        report = run_suite(args.chains, args.docs, args.clusters, args.beta,
+                           args.max_steps, args.max_seconds, args.tolerance,
+                           args.seed)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {len(report['results'])} results to {args.output}")
+    elif args.command == 'compare':
+        with open(args.before) as f:
+            before = json.load(f)
+        with open(args.after) as f:
+            after = json.load(f)
+        for chain, docs, clusters, old, new, ratio in compare_results(
+                before, after):
+            change = f"{ratio:.2f}x" if ratio is not None else "n/a"
+            print(f"{chain:>12} docs={docs:<6} clusters={clusters:<4} "
+                  f"{old:10.1f} -> {new:10.1f} steps/s ({change})")
+    else:
+        results = compare_proposals(args.docs, args.clusters, args.neighbors,
+                                    args.beta, args.length, args.tolerance,
+                                    args.seed)
+        print(f"target geo score: {results['target']:.4f}")
+        for name in ('uniform', 'neighbor', 'neighbor_no_mh'):
+            r = results[name]
+            print(f"{name:>14}: acceptance {r['acceptance_rate']:.3f}, "
+                  f"steps to target {r['steps_to_target']}, "
+                  f"seconds to target {r['seconds_to_target'] or 0:.2f}, "
+                  f"final score {r['final_score']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
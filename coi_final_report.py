@@ -8,6 +8,7 @@ import requests
 import json
 import coi_maps
 import submission_analysis.fetch as fetch
+from submission_analysis.submission_store import SubmissionStore, submission_kinds
 import utils as utils
 import csv
 import pydantic
@@ -36,53 +37,50 @@ def join_area_text(input_df: pd.DataFrame) -> pd.DataFrame:
     """
     Takes in a dataframe of all submissions from a given state (using fetch.py),
     and returns a dataframe with the area texts joined in.
+    Coi submissions with several areas are split into one row per area, with...
+    ids '<id>-1', '<id>-2', ...; plans whose tiles all lie in one district ...
+    are flagged as pseudo cois.
     """
-    df = input_df 
-    cols = ['area_text', 'area_name', 'num_areas', 'id']
-    pivot = pd.DataFrame(columns = cols)
-    count = 0
-    for _idx, row in df.iterrows():
-        if row['type'] == "plan":
-            if 'assignment' in row['districtr_data']['plan'].keys():         
-                asn_list = list(row['districtr_data']['plan']['assignment'].items())
-                asn = []
-                for assignment in asn_list:
-                    _, assign = assignment
-                    if isinstance(assign, list):
-                        assign = assign[0]
-                    asn.append(assign)
-                num_dists = len(set(asn))
-                if num_dists == 1:
-                    count += 1
-                    acc = pd.DataFrame({'area_name': [None], 'area_text': [None], 'num_areas': [1], 'id': [row['id']], 'pseudo_coi': True})
-                    pivot = pivot.append(acc, ignore_index = True)
-            continue
-        elif row['type'] != "coi":
-            continue
+    df = input_df
+    is_districtr = df['type'].isin(["plan", "coi"]).to_numpy()
+    store = SubmissionStore.from_frame(df[is_districtr])
+    # position in df of each plan/coi's row
+    row_of = pd.Series(np.flatnonzero(is_districtr),
+                       index=df.loc[is_districtr, 'plan_id'].astype(str))
+    ids = df['id'].to_numpy()
+    plan_types = store.submissions.set_index('plan_id')['plan_type']
+
+    # plans whose assignment uses exactly one (first-listed) district
+    num_dists = store.first_parts().groupby(
+        'plan_id', observed=True)['part'].nunique()
+    pseudo_plans = num_dists.index[(num_dists == 1).to_numpy() &
+                                   (plan_types.loc[num_dists.index] == "plan").to_numpy()]
+    pseudo = pd.DataFrame({'area_name': None, 'area_text': None, 'num_areas': 1,
+                           'id': ids[row_of.loc[pseudo_plans.astype(str)]],
+                           'pseudo_coi': True})
+
+    # one row per area of each coi
+    coi_parts = store.parts.merge(store.submissions[['plan_id', 'num_parts']],
+                                  on='plan_id')
+    coi_parts = coi_parts[(plan_types.loc[coi_parts['plan_id']] == "coi").to_numpy()]
+    rows = row_of.loc[coi_parts['plan_id'].astype(str)].to_numpy()
+    multi = (coi_parts['num_parts'] > 1).to_numpy()
+    area_ids = ids[rows].astype(object)
+    area_ids[multi] = [f'{row_id}-{position + 1}' for row_id, position
+                       in zip(area_ids[multi], coi_parts['position'][multi])]
+    areas = pd.DataFrame({'area_name': coi_parts['name'].to_numpy(),
+                          'area_text': coi_parts['description'].to_numpy(),
+                          'num_areas': coi_parts['num_parts'].to_numpy(),
+                          'id': area_ids})
 
-        # get all info
-        parts = row['districtr_data']['plan']['parts']
-        row_id = row['id']
-        new_row_id = row_id
-        num_areas = len(parts)
-        names = ""
-        texts = ""
-        i = 0
-        for p in parts:
-            if num_areas > 1:
-                temp_row = row
-                new_row_id = f'{row_id}-{i+1}'
-                temp_row['id'] = new_row_id
-                df = df.append(temp_row)
-            names = p['name'] if 'name' in p else ""
-            texts = (p['description'] if 'description' in p else "")
-            acc = pd.DataFrame({'area_name': [names], 'area_text': [texts], 'num_areas': [num_areas], 'id': [new_row_id]})
-            pivot = pivot.append(acc, ignore_index = True)
-            i += 1
-        if num_areas > 1:
-            # drop the original duplicate row
-            a = [row_id]
-            df = df[~df['id'].isin(a)]    
+    # replace each multi-area coi row by one copy per area, appended at the end
+    copies = df.iloc[rows[multi]].copy()
+    copies['id'] = area_ids[multi]
+    keep = np.ones(len(df), dtype=bool)
+    keep[rows[multi]] = False
+    df = pd.concat([df[keep], copies])
+
+    pivot = pd.concat([pseudo, areas], ignore_index=True) if len(pseudo) else areas
     pivot = df.join(pivot.set_index('id'), on='id')
     return pivot
 
@@ -142,26 +140,15 @@ def submissions_file_other(ids_url: str, plans_url: str, cois_url: str, file_url
     # join in districtr json assignments into 'districtr_data column'
     plans_df['districtr_data'] = plan_submissions
     cois_df['districtr_data'] = coi_submissions
-    # make datetime fields parseable:
-    plans_df['datetime'] = plans_df['datetime'].map( lambda datetime: (
-        datetime.split("+")[0] + " +" + datetime.split("+")[1].split(" ")[0]))
-    cois_df['datetime'] = cois_df['datetime'].map( lambda datetime: (
-        datetime.split("+")[0] + " +" + datetime.split("+")[1].split(" ")[0]))
-    written_df['datetime'] = written_df['datetime'].map( lambda datetime: (
-        datetime.split("+")[0] + " +" + datetime.split("+")[1].split(" ")[0]))
-    # # convert datetime fields from str's to datetime objects in all dataframe
-    plans_df['datetime'] = plans_df['datetime'].map(lambda datetime: (
-                                dt.strptime(datetime, '%a %b %d %Y %X %Z %z')))
-    cois_df['datetime'] = cois_df['datetime'].map(lambda datetime: (
-                                dt.strptime(datetime, '%a %b %d %Y %X %Z %z')))
-    written_df['datetime'] = written_df['datetime'].map(lambda datetime: (
-                                dt.strptime(datetime, '%a %b %d %Y %X %Z %z')))
+    # convert portal datetime strings to tz-aware datetimes
+    plans_df['datetime'] = fetch.parse_portal_datetimes(plans_df['datetime'])
+    cois_df['datetime'] = fetch.parse_portal_datetimes(cois_df['datetime'])
+    written_df['datetime'] = fetch.parse_portal_datetimes(written_df['datetime'])
+    # file and other submissions are often empty (a frame with no columns)
     if len(file_df) > 0:
-        file_df['datetime'] = file_df['datetime'].map( lambda datetime: (
-            datetime.split("+")[0] + " +" + datetime.split("+")[1].split(" ")[0]))
+        file_df['datetime'] = fetch.parse_portal_datetimes(file_df['datetime'])
     if len(other_df) > 0:
-        other_df['datetime'] = other_df['datetime'].map( lambda datetime: (
-            datetime.split("+")[0] + " +" + datetime.split("+")[1].split(" ")[0]))
+        other_df['datetime'] = fetch.parse_portal_datetimes(other_df['datetime'])
     # return relevant dataframes
     return plans_df, cois_df, written_df, file_df, other_df
 
@@ -296,25 +283,10 @@ def find_pseudo_cois(submissions_df):
     """
     Searches through a DataFrame of submissions and returns a dataframe full...
     of all the "plan" submissions that are only one district to treat as pseduo
-    cois
+    cois (see SubmissionStore.classify)
     """
-    count = 0
-    one_dist = pd.DataFrame()
-    for _idx, row in submissions_df.iterrows():
-        if row['type'] == "plan":
-            if 'assignment' in row['districtr_data']['plan'].keys():         
-                asn_list = list(row['districtr_data']['plan']['assignment'].items())
-                asn = []
-                for assignment in asn_list:
-                    _, assign = assignment
-                    if isinstance(assign, list):
-                        assign = assign[0]
-                    asn.append(assign)
-                num_dists = len(set(asn))
-                if num_dists == 1:
-                    count += 1
-                    one_dist = one_dist.append(row)
-    return one_dist
+    kinds = submission_kinds(submissions_df)
+    return submissions_df[kinds == 'pseudo_coi']
 
 def all_states_csvs_cumulative(folder_path: str, end_date: str) -> None:
     """
@@ -5,6 +5,8 @@ import matplotlib.pyplot as plt
 import us
 import contextily as ctx
 import requests
+from submission_analysis.geometry_cache import GeometryCache
+from submission_analysis.submission_store import SubmissionStore
 
 # global font
 font = {'fontname':'Helvetica'}
@@ -45,6 +47,22 @@ mggg_states = {
     'Iowa': 'https://github.com/mggg-states/IA-shapefiles/blob/master/IA_counties.zip?raw=true'
 }
 
+# local copies of the unit shapefiles (set geometry_cache.offline to run...
+# without network from a pre-populated cache directory)
+geometry_cache = GeometryCache()
+
+def unit_shapefile_link(state, unit):
+    """
+    Returns the shapefile link for a state's districtr units: 2010 census...
+    block groups and blocks, or the mggg-states shapefile otherwise.
+    """
+    fips = us.states.lookup(state).fips
+    if unit == "blockgroups":
+        return f'https://www2.census.gov/geo/pvs/tiger2010st/{fips}_{state.replace(" ", "_")}/{fips}/tl_2010_{fips}_bg10.zip'
+    elif unit == "blocks":
+        return f'https://www2.census.gov/geo/pvs/tiger2010st/{fips}_{state.replace(" ", "_")}/{fips}/tl_2010_{fips}_tabblock10.zip'
+    return mggg_states[state]
+
 # takes in an assignment df (coi_df from fetch) and spits it out with geometries
 # takes in an assignment df and spits it out with geometries
 def assignment_to_shape(df):
@@ -57,20 +75,19 @@ def assignment_to_shape(df):
         print(f"ERROR: {len(df)} COI SUBMISSIONS")
         return None
     
-    fips = us.states.lookup(state).fips
-    
     acc = pd.DataFrame(columns = ['id', 'plan_id', 'coi_id', 'tile_id', 'geometry'])
+    store = SubmissionStore.from_frame(df)
+    assignments = store.assignments.merge(
+        store.submissions[['plan_id', 'units', 'id_column']], on='plan_id')
     # iterate over units
     for unit in set(df['units']):
         print(f'Downloading shapefile for {unit.upper()}')
         # download appropriate shape
-        if unit == "blockgroups":
-            link = f'https://www2.census.gov/geo/pvs/tiger2010st/{fips}_{state.replace(" ", "_")}/{fips}/tl_2010_{fips}_bg10.zip'
-        elif unit == "blocks":
-            link = f'https://www2.census.gov/geo/pvs/tiger2010st/{fips}_{state.replace(" ", "_")}/{fips}/tl_2010_{fips}_tabblock10.zip'
-        else:
-            link = mggg_states[state]
-        shp = gpd.read_file(link)
+        unit_asn = assignments[assignments['units'] == unit]
+        # read with the id columns cast to int (GEOID falls back to GEOID10)
+        keys = set(unit_asn['id_column']) | {"GEOID10"}
+        shp = geometry_cache.read(unit_shapefile_link(state, unit), state, unit,
+                                  id_columns=keys)
 
         # get everything into the same crs
         if not crs:
@@ -81,71 +98,45 @@ def assignment_to_shape(df):
 
         subset = df[df['units'] == unit]
         print(f'{len(subset)} submissions using {unit}')
-        
-        # each COI is a row
-        for idx, row in subset.iterrows():
-            # get all info
-            plan_id = row['plan_id']
-            key = row['districtr_data']['plan']['idColumn']['key']
+
+        # join each id column's (tile, coi) pairs to the shapefile at once
+        for key, asn in unit_asn.groupby('id_column', observed=True, sort=False):
             if state == "Wisconsin" and key == "GEOID10" and unit == "wards":
-                print("Skipping a plan because it is on old WI wards")
+                print("Skipping plans because they are on old WI wards")
                 continue
-                
-            # cast everything to int (and do some error checking)
-            casting = True
-            try:
-                shp[key] = shp[key].apply(int)
-            except KeyError:
-                if key == "GEOID":
-                    try:
-                        key = "GEOID10"
-                        shp[key] = shp[key].apply(int)
-                    except KeyError:
-                        print("ERROR: GEOID and GEOID10 not in shapefile.")
-                        continue
-                else:
-                    print(f"ERROR: {key} not in shapefile.")
+
+            # do some error checking
+            if key == "GEOID" and key not in shp:
+                if "GEOID10" not in shp:
+                    print("ERROR: GEOID and GEOID10 not in shapefile.")
                     continue
-            except ValueError:
-                shp[key] = shp[key] # can't be turned to an int (not a GEOID)
-                casting = False
-                
-            try:
-                asn = row['districtr_data']['plan']['assignment']
-            except KeyError: # empty plan
-                print("Empty plan...")
+                key = "GEOID10"
+            elif key not in shp:
+                print(f"ERROR: {key} not in shapefile.")
                 continue
+            # the cache leaves a key that can't be turned to an int (not a GEOID)
+            casting = pd.api.types.is_integer_dtype(shp[key])
 
-            # make lists
-            ids = []
-            plan_ids = []
-            coi_ids = []
-            tile_ids = []
-            geoms = []
-            for k, v in asn.items():
-                # cast everything to int if we successfully cast the key column
-                if casting:
-                    try:
-                        k = int(k)
-                    except ValueError:
-                        k = k # see above
-                 
-                if isinstance(v, list):
-                    for v_prime in v:
-                        ids.append(f'{plan_id}-{v_prime}')
-                        plan_ids.append(plan_id)
-                        coi_ids.append(v_prime)
-                        tile_ids.append(k)
-                        geoms.append(shp[shp[key] == k]['geometry'].iloc[0])
-                else:
-                    ids.append(f'{plan_id}-{v}')
-                    plan_ids.append(plan_id)
-                    coi_ids.append(v)
-                    tile_ids.append(k)
-                    geoms.append(shp[shp[key] == k]['geometry'].iloc[0])
-            tmp = pd.DataFrame(zip(ids, plan_ids, coi_ids, tile_ids, geoms), 
-                               columns = ['id', 'plan_id', 'coi_id', 'tile_id', 'geometry'])
-            acc = acc.append(tmp, ignore_index = True)
+            tiles = asn['tile'].astype(str)
+            # cast tiles to int if we successfully cast the key column
+            if casting:
+                numeric = pd.to_numeric(tiles, errors='coerce')
+                tiles = tiles.where(numeric.isna(), numeric.astype('Int64'))
+            geoms = shp.drop_duplicates(key).set_index(key)['geometry']
+            found = tiles.isin(geoms.index).to_numpy()
+            if not found.all():
+                print(f"{(~found).sum()} assigned tiles not in shapefile")
+            asn = asn[found]
+            tiles = tiles[found]
+            plan_ids = asn['plan_id'].astype(str).to_numpy()
+            tmp = pd.DataFrame({
+                'id': [f'{plan_id}-{coi}' for plan_id, coi
+                       in zip(plan_ids, asn['part'])],
+                'plan_id': plan_ids,
+                'coi_id': asn['part'].to_numpy(),
+                'tile_id': tiles.to_numpy(),
+                'geometry': geoms.loc[tiles].to_numpy()})
+            acc = pd.concat([acc, tmp], ignore_index = True)
     return gpd.GeoDataFrame(acc, crs = crs)
                
 # in these, clip_bounds can either be a capitalized state name or a geometry to clip to
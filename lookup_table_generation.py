@@ -1,3 +1,5 @@
+import argparse
+import os
 import fetch
 import coi_maps
 import numpy as np
@@ -9,8 +11,19 @@ import fetch
 import contextily as ctx
 import coi_dataset
 import coi_final_report as coi_report
-from typing import Tuple
+from typing import Dict, Tuple
 import utils as utils
+from submission_analysis.crosswalk import Crosswalk, binary_membership, geoid_positions
+from submission_analysis.geometry_cache import cast_unit_ids
+from submission_analysis.hierarchy import CensusHierarchy
+from submission_analysis.lookup import LOOKUP_SUFFIX, LookupTable
+from submission_analysis.overlay import DEFAULT_INCIDENCE_CACHE_DIR, cached_incidence, overlay_incidence
+from submission_analysis.pipeline import DEFAULT_ARTIFACT_DIR, Pipeline, Stage
+from submission_analysis.pivot import unit_lookup_tables
+from submission_analysis.plan_cache import PlanCache
+from submission_analysis.submission_store import submission_kinds
+from submission_analysis import (geometry_cache, lookup, overlay, pivot,
+                                 submission_store)
 
 import fetch
 import coi_maps
@@ -39,53 +52,66 @@ mggg_states = {
     'missouri': 'https://github.com/mggg-states/MO-shapefiles/blob/master/MO_vtds.zip?raw=true',
 }
 
-def generate_full_lookup_table(state: str, outfile = None) -> None:
+def fetch_state_submissions(state: str, plan_cache_path = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
-    Takes in a state as a string and an optional outfile to export to as a csv,
-    and returns a full lookup table in the same format produced by Jack's ...
-    assignment_to_pivot function in coi_dataset. Will contain plan id, area text,
-    area name, submission text, and all assignments on whatever unit is ...
-    "preferred" to be drawn in by our portal states.
-
-    NOTE: this function produces lookup tables that Ari and Other Parker (tm)...
-    use to geographically cluster. Computationally expensive, takes awhile!
+    Fetches a state's plan and coi submissions. An optional PlanCache file...
+    (submission_analysis.plan_cache) avoids refetching plans read on earlier runs.
     """
     print("fetching endpnts")
     ids_url, plans_url, cois_url, written_url, subs = utils.submission_endpts(state)
     print(ids_url, plans_url, cois_url, written_url, subs)
     print("fetching submissions")
+    cache = PlanCache(plan_cache_path) if plan_cache_path is not None else None
     plans_df, cois_df, _ = fetch.submissions(
-                                     ids_url, plans_url, cois_url, written_url)
+                                     ids_url, plans_url, cois_url, written_url,
+                                     cache=cache)
     print("fetched submissions! len plans: {} len cois: {}".format(
                                       len(plans_df), len(cois_df)))
+    if cache is not None:
+        print("plan cache: {}".format(cache.stats()))
+        cache.close()
+    return plans_df, cois_df
+
+def drop_invalid_plans(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Drops the submissions whose districtr plan could not be read.
+    """
+    return df[submission_kinds(df) != 'invalid']
+
+def valid_cois(submissions: Tuple[pd.DataFrame, pd.DataFrame]) -> pd.DataFrame:
+    _plans_df, cois_df = submissions
+    return drop_invalid_plans(cois_df)
+
+def valid_pseudo_cois(submissions: Tuple[pd.DataFrame, pd.DataFrame]) -> pd.DataFrame:
+    plans_df, _cois_df = submissions
     print("fetching singletons...")
-    singleton_dists  = coi_report.find_pseudo_cois(plans_df)
-    print("found singletons! len singletons: {}".format)
-
-    # Filter out invalid plans
-    idxs = []
-    for _idx, row in cois_df.iterrows():
-        if row['districtr_data']['msg'] != 'Plan successfully found':
-            idxs.append(_idx)
-    cois_df = cois_df.drop(idxs)
-    idxs = []
-    for _idx, row in singleton_dists.iterrows():
-        if row['districtr_data']['msg'] != 'Plan successfully found':
-            idxs.append(_idx)
-    singleton_dists = singleton_dists.drop(idxs)
-
-    coi_lookup_table = generate_lookup_tables(state, cois_df)
+    singleton_dists = coi_report.find_pseudo_cois(plans_df)
+    print("found singletons! len singletons: {}".format(len(singleton_dists)))
+    return singleton_dists
+
+def submissions_pivots(df: pd.DataFrame, state: str) -> Dict[str, LookupTable]:
+    """
+    pivot_lookup_tables, or None if there are no submissions.
+    """
+    if df is None or len(df) == 0:
+        return None
+    return pivot_lookup_tables(state, df)
+
+def submissions_lookup_table(df: pd.DataFrame, tables: Dict[str, LookupTable],
+                             state: str) -> pd.DataFrame:
+    """
+    crosswalk_lookup_tables, or None if there are no submissions.
+    """
+    if tables is None:
+        return None
+    return crosswalk_lookup_tables(state, df, tables)
+
+def combine_lookup_tables(coi_lookup_table: pd.DataFrame, plans_lookup_table: pd.DataFrame) -> pd.DataFrame:
+    """
+    Appends the pseudo-COI lookup table to the COI lookup table.
+    """
     print("coi lookup table generated! now generating plan")
     # If no singleton districts exist, stop and return only cois
-    if singleton_dists is None:
-        print("returning just cois")
-        return coi_lookup_table
-    elif len(singleton_dists) == 0: #initial none-check to avoid invalid len()
-        print("returning just cois")
-        return coi_lookup_table
-
-    plans_lookup_table = generate_lookup_tables(state, singleton_dists)
-    # If plans lookup table is empty, return only coi lookup
     if plans_lookup_table is None:
         print("returning just cois")
         return coi_lookup_table
@@ -97,9 +123,62 @@ def generate_full_lookup_table(state: str, outfile = None) -> None:
     coi_lookup_table.columns = coi_lookup_table.columns.astype(str)
     plans_lookup_table.columns = plans_lookup_table.columns.astype(str)
     complete_lookup = coi_lookup_table.append(plans_lookup_table)
-    complete_lookup = complete_lookup.fillna(0)
+    return complete_lookup.fillna(0)
+
+def full_lookup_table_pipeline(state: str, plan_cache_path = None, artifact_dir = None,
+                               processes: int = 1) -> Pipeline:
+    """
+    The stages of generate_full_lookup_table: fetching (always rerun), filtering...
+    COIs and pseudo-COIs, pivoting each on every unit, crosswalking the pivots...
+    to the preferred unit, and combining them. With an artifact_dir, finished...
+    stages are kept there and skipped on reruns, so a failed crosswalk does...
+    not redo the pivots. Stages are also rerun when the modules doing their work...
+    change.
+    """
+    depends = (coi_dataset, coi_report, pivot, lookup, submission_store, overlay,
+               geometry_cache)
+    return Pipeline([
+        Stage('submissions', fetch_state_submissions,
+              params={'state': state, 'plan_cache_path': plan_cache_path}, volatile=True,
+              depends=(fetch, utils)),
+        Stage('cois', valid_cois, inputs=('submissions', ), depends=depends),
+        Stage('pseudo_cois', valid_pseudo_cois, inputs=('submissions', ), depends=depends),
+        Stage('coi_pivots', submissions_pivots, inputs=('cois', ), params={'state': state},
+              depends=depends),
+        Stage('pseudo_coi_pivots', submissions_pivots, inputs=('pseudo_cois', ),
+              params={'state': state}, depends=depends),
+        Stage('coi_lookup', submissions_lookup_table, inputs=('cois', 'coi_pivots'),
+              params={'state': state}, depends=depends),
+        Stage('pseudo_coi_lookup', submissions_lookup_table,
+              inputs=('pseudo_cois', 'pseudo_coi_pivots'), params={'state': state},
+              depends=depends),
+        Stage('lookup', combine_lookup_tables, inputs=('coi_lookup', 'pseudo_coi_lookup'),
+              depends=depends),
+    ], artifact_dir=artifact_dir, processes=processes)
+
+def generate_full_lookup_table(state: str, outfile = None, cache = None, artifact_dir = None,
+                               processes: int = 1) -> pd.DataFrame:
+    """
+    Takes in a state as a string and an optional outfile to export to (a wide...
+    csv if it ends in .csv, the compact lookup format otherwise),
+    and returns a full lookup table in the same format produced by Jack's ...
+    assignment_to_pivot function in coi_dataset. Will contain plan id, area text,
+    area name, submission text, and all assignments on whatever unit is ...
+    "preferred" to be drawn in by our portal states. An optional PlanCache ...
+    (submission_analysis.plan_cache) avoids refetching plans read on earlier runs.
+
+    With an artifact_dir, each stage's output is saved there so a rerun...
+    (e.g. after a crash in crosswalking) resumes where it stopped; the COI and
+    pseudo-COI tables are built in parallel when processes > 1.
+
+    NOTE: this function produces lookup tables that Ari and Other Parker (tm)...
+    use to geographically cluster. Computationally expensive, takes awhile!
+    """
+    pipeline = full_lookup_table_pipeline(state, cache.path if cache is not None else None,
+                                          artifact_dir, processes)
+    complete_lookup = pipeline.run(['lookup'])['lookup']
     if outfile != None:
-        complete_lookup.to_csv(outfile)
+        LookupTable.from_frame(complete_lookup).write(outfile)
     return complete_lookup
 
 def generate_lookup_tables(state: str, df: pd.DataFrame) -> pd.DataFrame:
@@ -115,11 +194,31 @@ def generate_lookup_tables(state: str, df: pd.DataFrame) -> pd.DataFrame:
     if 'districtr_data' not in df:
         print("ERROR: df contains no 'districtr_data' field, returning None object")
         return
+    return crosswalk_lookup_tables(state, df, pivot_lookup_tables(state, df))
+
+def pivot_lookup_tables(state: str, df: pd.DataFrame) -> Dict[str, LookupTable]:
+    """
+    Pivots the submissions in `df` drawn on the state's preferred unit and on...
+    precincts in one pass (see pivot.unit_lookup_tables), keyed by unit.
+    """
+    if 'districtr_data' not in df:
+        print("ERROR: df contains no 'districtr_data' field, returning None object")
+        return
+    unit = pref_units[state]
+    return unit_lookup_tables(df, coi_dataset.unit_index, list(dict.fromkeys([unit, 'precincts'])))
+
+def crosswalk_lookup_tables(state: str, df: pd.DataFrame,
+                            tables: Dict[str, LookupTable]) -> pd.DataFrame:
+    """
+    Takes the pivot_lookup_tables of `df`, walks the precinct table over to the...
+    preferred block group units and appends it to the preferred unit table.
+    """
+    if tables is None:
+        return
     # determine pref units, and find subsets drawn in pref units and...
     # ...subsets drawn in precincst
     unit = pref_units[state]
-    temp = df
-    temp['units'] = temp['districtr_data'].apply(lambda x: x['plan']['units']['id'])
+    temp = df.assign(units=df['districtr_data'].apply(lambda x: x['plan']['units']['id']))
     subset = temp[temp['units'] == unit]
     precinct_subset = temp[temp['units'] == 'precincts']
     print("this is the len of pref unit subset: {} this is len of precinct unit subset: {}".format(
@@ -128,16 +227,18 @@ def generate_lookup_tables(state: str, df: pd.DataFrame) -> pd.DataFrame:
     non_pref_pivot = None # initializing sentinel
     # If no precincts to move over, just return Jack's pref unit code
     if len(precinct_subset) == 0:
-        pref_pivot = coi_dataset.assignment_to_pivot(df)
+        if unit in tables:
+            pref_pivot = tables[unit].to_frame(sparse=False)
         print("No precinct submissions received, so using coi_dataset to generate lookup table")
         return pref_pivot
     # If there are preferred submissions, run Jack's code to generate lookup table on...
     # preferred units
-    elif len(subset) != 0:
-        pref_pivot = coi_dataset.assignment_to_pivot(df)
+    elif unit in tables:
+        pref_pivot = tables[unit].to_frame(sparse=False)
     # generates a precinct level lookup table that treats precincts as the...
     # prefered unit
-    non_pref_pivot = precinct_to_pivot(df)
+    if 'precincts' in tables:
+        non_pref_pivot = tables['precincts'].to_frame(sparse=False)
     if non_pref_pivot is not None:
         # take the precinct level lookup table and walk it over to a block...
         # group level lookup table in the same format as coi_dataset.py
@@ -158,17 +259,17 @@ def generate_lookup_tables(state: str, df: pd.DataFrame) -> pd.DataFrame:
 
 
 
-def crosswalk_precinct_to_bg(subset: pd.DataFrame, precinct_subset: pd.DataFrame, state: str, precinct_pivot: pd.DataFrame) -> pd.DataFrame:
+def crosswalk_precinct_to_bg(subset: pd.DataFrame, precinct_subset: pd.DataFrame, state: str, precinct_pivot: pd.DataFrame,
+                             min_overlap: float = 0., incidence_cache_dir: str = DEFAULT_INCIDENCE_CACHE_DIR) -> pd.DataFrame:
     """
-
+    Takes in a precinct level lookup table and walks it over to the state's...
+    block groups: each COI gets every block group that intersects one of its
+    precincts (covering at least `min_overlap` of the block group's area).
+    The precinct x block group overlay is cached in `incidence_cache_dir`.
     """
     print("inside crosswalk")
     path = state + "/" + state + "_bg10.shp"
-    # download blockgroup shapefile
-    bg_shp = gpd.read_file(path)
     link = mggg_states[state]
-    # download precinct shapefile
-    pcn_shp = gpd.read_file(link).to_crs(bg_shp.crs)
     if len(precinct_subset != 0):
         prcn_key = precinct_subset.iloc[0]['districtr_data']['plan']['idColumn']['key']
     else:
@@ -181,65 +282,38 @@ def crosswalk_precinct_to_bg(subset: pd.DataFrame, precinct_subset: pd.DataFrame
     print("key is: ", key)
     if state == 'Wisconsin':
         key = "Code-2"
-    try:
-        bg_shp[key] = bg_shp[key].apply(int)
-    except KeyError:
-        if key == "GEOID":
-            try:
-                key = "GEOID10"
-                bg_shp[key] = bg_shp[key].apply(int)
-            except KeyError:
-                print("ERROR: GEOID and GEOID10 not in shapefile.")
-        else:
-            print(f"ERROR: {key} not in shapefile.")
-    except ValueError:
-        bg_shp[key] = bg_shp[key]
-
-    assignment = []
-    tiles = list(bg_shp[key].apply(str))
-    print(len(tiles))
+    # download blockgroup and precinct shapefiles, with their keys cast to int
+    bg_shp = coi_maps.geometry_cache.read(path, state, 'blockgroups',
+                                          id_columns=[key, "GEOID10"])
+    pcn_shp = coi_maps.geometry_cache.read(link, state, 'precincts',
+                                           id_columns=[prcn_key]).to_crs(bg_shp.crs)
+    if key == "GEOID" and key not in bg_shp:
+        key = "GEOID10"
+        if key not in bg_shp:
+            print("ERROR: GEOID and GEOID10 not in shapefile.")
+    elif key not in bg_shp:
+        print(f"ERROR: {key} not in shapefile.")
+
+    tiles = list(bg_shp[key].astype(str))
     individ_cols = ['submission_text', 'area_text', 'area_name']
-    cols = individ_cols + tiles
-    print(len(cols))
-    temp_pivot = pd.DataFrame(columns = cols)
-    column = temp_pivot.columns
-    print(len(column))
-    for _idx, row in precinct_pivot.iterrows():
-        print("hmm1 ", len(temp_pivot.columns))
-        plan_id = [row.name.split("-")[0] + "-1"]
-        print(plan_id)
-        temp_row = row
-        pct_names = []
-        for key, value in row.items():
-            # if key.startswith("P") and value == 1:
-            if key not in individ_cols and value == 1:
-                pct_names.append(key)
-        coi_geoms = pcn_shp[pcn_shp[prcn_key].apply(lambda x: x in pct_names)]
-        union = coi_geoms.unary_union
-        possible_matches_index = bg_shp.sindex.intersection(union.bounds)
-        
-        possible_matches = bg_shp.iloc[possible_matches_index]
-        precise_matches_vtd = list(possible_matches[possible_matches.intersects(union)]["GEOID10"])
-        print(plan_id)
-        acc = pd.DataFrame(index = plan_id, columns = cols)
-        print("ope", len(acc.columns))
-        acc.at[plan_id, 'submission_text'] = row['submission_text']
-        acc.at[plan_id, 'area_name'] = ""
-        acc.at[plan_id, 'area_text'] = ""
-        temp_pivot.columns = temp_pivot.columns.astype(str)
-        acc.columns = acc.columns.astype(str)
-        for bg in precise_matches_vtd:
-            bg = str(bg)
-            acc.at[plan_id, bg] = int(1)
-        print(len(acc.columns))
-        print("hmm", len(temp_pivot.columns))
-        temp_pivot.columns = temp_pivot.columns.astype(str)
-        acc.columns = acc.columns.astype(str)
-        temp_pivot = temp_pivot.append(acc, sort=True)
-        print("hmm2", len(temp_pivot.columns))
-        print(len(set(precise_matches_vtd)))
-    temp_pivot = temp_pivot.fillna(0)
-    return temp_pivot
+    # precinct x block group overlay, computed once per state and cached
+    pct_ids = pcn_shp[prcn_key]
+    incidence = cached_incidence(
+        incidence_cache_dir,
+        {'precincts': link, 'blockgroups': path, 'precinct_key': prcn_key,
+         'blockgroup_key': key, 'min_overlap': min_overlap},
+        lambda: overlay_incidence(pcn_shp, bg_shp, pct_ids, tiles, min_overlap),
+        pct_ids, tiles)
+    pct_cols = [c for c in precinct_pivot.columns if c not in individ_cols]
+    membership = (precinct_pivot[pct_cols].to_numpy() == 1)
+    bg_membership = incidence.translate(membership, pct_cols)
+    plan_ids = [name.split("-")[0] + "-1" for name in precinct_pivot.index]
+    metadata = pd.DataFrame({
+        'submission_text': precinct_pivot['submission_text'].to_numpy(),
+        'area_text': "",
+        'area_name': "",
+    }, index=plan_ids)
+    return LookupTable(metadata, bg_membership, pd.Index(incidence.target_ids)).to_frame(sparse=False)
 
 
 
@@ -247,180 +321,92 @@ def crosswalk_bg_to_block(state: str, bg_pivot: pd.DataFrame) -> pd.DataFrame:
     """
     Takes in a state and a block group level lookup table, and walks the assigments...
     from being on block group ids (usually GEOID10s) to block level ids (usually GEOID10s).
-    Returns a lookup table where each submission has a one-hot encoding of submission to
-    block id assignment.
+    Returns a (sparse-backed) lookup table where each submission has a one-hot
+    encoding of submission to block id assignment.
 
-    NOTE: Can run very slow for a state like MI with a large number of blocks, so...
-    recomend running on the cluster if access.
+    Blocks nest in block groups by GEOID prefix, so this only reads the block...
+    ids; geometry is only used for columns that are not block group GEOIDs.
     """
-    # pull down block group and block level shapefiles
     bg_path = state + "/" + state + "_bg10.shp"
     block_path = state + "/blocks/" + state + "_tabblock10.shp"
-    block_shp = gpd.read_file(block_path)
-    bg_shp = gpd.read_file(bg_path).to_crs(block_shp.crs)
-
-    bg_key = "GEOID10"
-    key = "GEOID10" # block group level key
-    # if state == 'Wisconsin':
-    #     key = "Code-2"
-    try:
-        block_shp[key] = block_shp[key].apply(int)
-    except KeyError:
-        if key == "GEOID":
-            try:
-                key = "GEOID10"
-                block_shp[key] = block_shp[key].apply(int)
-            except KeyError:
-                print("ERROR: GEOID and GEOID10 not in shapefile.")
-        else:
-            print(f"ERROR: {key} not in shapefile.")
-    except ValueError:
-        block_shp[key] = block_shp[key]
-
-    assignment = []
+    block_ids = coi_maps.geometry_cache.read_attributes(block_path, state, 'blocks')["GEOID10"]
     # initialize all the block tile ids
-    tiles = list(block_shp[key].apply(str))
-    individ_cols = ['submission_text', 'area_text', 'area_name']
-    cols = individ_cols + tiles
-    # initialize pivot table with relevant cols
-    temp_pivot = pd.DataFrame(columns = cols)
-    column = temp_pivot.columns
-    i = 0
-    for _idx, row in bg_pivot.iterrows():
-        if i % 10 == 0:
-            print("In loop, on row: {}".format(i))
-        if i == 1 or i == 3 or i == 5:
-            print("why is this so slowwwww")
-        plan_id = [row.name.split("-")[0] + "-1"]
-        temp_row = row
-        bg_names = []
-        # loop through row's assignments and grab all block group...
-        # ids that the submission is assigned to
-        for key, value in row.items():
-            if key not in individ_cols and value == 1:
-                bg_names.append(key)
-        # retrieve the geometry of the coi submission using bg id assignment
-        coi_geoms = bg_shp[bg_shp[bg_key].apply(lambda x: x in bg_names)]
-        union = coi_geoms.unary_union
-        # find the block level interesection of the coi geometries
-        possible_matches_index = block_shp.sindex.intersection(union.bounds)
-        possible_matches = block_shp.iloc[possible_matches_index]
-        precise_matches_blocks = list(possible_matches[possible_matches.intersects(union)]["GEOID10"])
-        acc = pd.DataFrame(index = plan_id, columns = cols)
-        # fill in row submission
-        acc.at[plan_id, 'submission_text'] = row['submission_text']
-        acc.at[plan_id, 'area_name'] = row['area_name'] if 'area_name' in row.columns else "" #@ROB BROKEN
-        acc.at[plan_id, 'area_text'] = row['area_text'] if 'area_text' in row.columns else ""
-        temp_pivot.columns = temp_pivot.columns.astype(str)
-        acc.columns = acc.columns.astype(str)
-        # fill in the new block level assignments for the row
-        for bg in precise_matches_blocks:
-            bg = str(bg)
-            acc.at[plan_id, bg] = int(1)
-
-        temp_pivot.columns = temp_pivot.columns.astype(str)
-        acc.columns = acc.columns.astype(str)
-        temp_pivot = temp_pivot.append(acc, sort=True)
-        i += 1
-    temp_pivot = temp_pivot.fillna(0)
-    return temp_pivot
-
-
-def crosswalk_2010b_to_2020b(state: str, block10_pivot: pd.DataFrame) -> pd.DataFrame:
+    tiles = cast_unit_ids(block_ids).astype(str)
+    hierarchy = CensusHierarchy(block_ids)
+
+    bg_table = LookupTable.from_frame(bg_pivot)
+    bg_ids = list(bg_table.tiles)
+    block_membership = hierarchy.expand(bg_table.matrix, bg_ids, 'blockgroup')
+    # walk over any units that don't nest in blocks by GEOID geometrically
+    loose = np.flatnonzero(~hierarchy.nested(bg_ids, 'blockgroup'))
+    if len(loose) != 0:
+        print(f"{len(loose)} columns are not block groups, intersecting geometries")
+        block_shp = coi_maps.geometry_cache.read(block_path, state, 'blocks')
+        bg_shp = coi_maps.geometry_cache.read(bg_path, state, 'blockgroups',
+                                              id_columns=["GEOID10"])
+        loose_ids = [bg_ids[i] for i in loose]
+        bg_shp_ids = bg_shp["GEOID10"].astype(str)
+        in_pivot = bg_shp_ids.isin(loose_ids).to_numpy()
+        incidence = overlay_incidence(bg_shp[in_pivot], block_shp, bg_shp_ids[in_pivot], tiles)
+        block_membership = block_membership + incidence.translate(bg_table.matrix[:, loose], loose_ids)
+        block_membership.data[:] = 1
+
+    metadata = bg_table.metadata.copy()
+    metadata.index = [name.split("-")[0] + "-1" for name in bg_pivot.index]
+    return LookupTable(metadata, block_membership, pd.Index(tiles)).to_frame()
+
+
+def nhgis_crosswalk_path(state: str) -> str:
+    return "nhgis_blk2010_blk2020_ge_v0_26/" + state + "/nhgis_blk2010_blk2020_ge_v0_26.csv"
+
+def crosswalk_2010b_to_2020b(state: str, block10_pivot: pd.DataFrame, mode: str = 'fractional',
+                             cache_dir = None) -> Tuple[pd.DataFrame, list]:
     """
     Takes in a state and a 2010 census block level lookup table, and walks the assigments...
     from being on 2010 block ids (GEOID10s) to 2020 block level ids (GEOID20s).
-    Returns a lookup table where each submission has a one-hot encoding of submission to
-    2020 block id assignment.
+    Returns a (sparse-backed) lookup table where each submission has a one-hot encoding...
+    of submission to 2020 block id assignment, and the 2020 blocks assigned to any COI.
+
+    In 'fractional' mode a COI gets every 2020 block its 2010 blocks place area in;...
+    in 'max-weight' mode only the 2020 block holding most of each 2010 block.
 
     NOTE: Uses the NHGIS preliminary crosswalk to avoid expesive computation, should be...
-    updated when NHGIS updates.
+    updated when NHGIS updates. Compiled crosswalks are cached in `cache_dir` if given.
     """
-    # read in the NHGIS 2010 to 2020 crosswalk reference dataframe 
-    crosswalk_path = "nhgis_blk2010_blk2020_ge_v0_26/" + state + "nhgis_blk2010_blk2020_ge_v0_26.csv"
-    crosswalk_ref = pd.read_csv(crosswalk_path)
-    assignment = []
-    # generate list of tiles
-    tiles = crosswalk_ref['GEOID20'].to_list()
-
-    individ_cols = ['submission_text', 'area_text', 'area_name']
-
-    cols = individ_cols + tiles
-    temp_pivot = pd.DataFrame(columns = cols)
-    column = temp_pivot.columns
-    i = 0
-    block20_names = []
-    for _idx, row in block10_pivot.iterrows():
-        if i % 10 == 0:
-            print("In loop, on row: {}".format(i))
-        if i == 1 or i == 3 or i == 5:
-            print("why is this so slowwwww")
-
-        plan_id = [row.name.split("-")[0] + "-1"]
-        # print(plan_id)
-        temp_row = row
-        block10_names = []
-        # block20_names = []
-        acc = pd.DataFrame(index = plan_id, columns = cols)
-        # fill in row info
-        acc.at[plan_id, 'submission_text'] = row['submission_text']
-        acc.at[plan_id, 'area_name'] = row['area_name'] if 'area_name' in row.columns else ""
-        acc.at[plan_id, 'area_text'] = row['area_text'] if 'area_name' in row.columns else ""
-
-        for key, value in row.items():
-            if key not in individ_cols and value == 1:
-                block10_names.append(key)
-                # store the corresponding 2020 block id
-                block20 = crosswalk_ref[crosswalk_ref['GEOID10'] == key]['GEOID20']
-                block20_names.append(block)
-                acc.at[plan_id, block20] = int(1)
-
-        temp_pivot.columns = temp_pivot.columns.astype(str)
-        acc.columns = acc.columns.astype(str)
-
-        # for block in block20_names:
-        #     block = str(block)
-        #     acc.at[plan_id, block] = int(1)
-
-        temp_pivot.columns = temp_pivot.columns.astype(str)
-        acc.columns = acc.columns.astype(str)
-        temp_pivot = temp_pivot.append(acc, sort=True)
-        print("end of one row!")
-        i += 1
-    temp_pivot = temp_pivot.fillna(0)
-    return temp_pivot, block20_names
+    crosswalk = Crosswalk(nhgis_crosswalk_path=nhgis_crosswalk_path(state), cache_dir=cache_dir)
+    block10_table = LookupTable.from_frame(block10_pivot)
+    # 2010 blocks missing from the crosswalk can't be walked over
+    block10_ids = cast_unit_ids(pd.Series(block10_table.tiles)).astype(str)
+    known = np.flatnonzero(np.isin(pd.to_numeric(block10_ids, errors='coerce'), crosswalk.block_ids_2010))
+    if len(known) < len(block10_ids):
+        print(f"{len(block10_ids) - len(known)} 2010 blocks not in the NHGIS crosswalk, dropping them")
+    membership, block20_ids = crosswalk.translate_blocks(block10_table.matrix[:, known],
+                                                         block10_ids.iloc[known], mode)
+    block20_membership = binary_membership(membership)
+    metadata = block10_table.metadata.copy()
+    metadata.index = [name.split("-")[0] + "-1" for name in block10_pivot.index]
+    tiles = pd.Index(block20_ids.astype(str), dtype=object)
+    block20_names = list(tiles[np.unique(block20_membership.indices)])
+    return LookupTable(metadata, block20_membership, tiles).to_frame(), block20_names
 
 def shp_crosswalk_2010b_to_2020b(state: str, block10_pivot: pd.DataFrame, b20_shp):
     """
-
+    Takes in a state, a 2010 census block level lookup table and the state's 2020 block
+    shapefile, and stores in the shapefile's NUMAREAS column how many submitted areas
+    cover each 2020 block. Each 2010 block is sent to the 2020 block holding the largest
+    share of its area in the NHGIS crosswalk.
     """
     block20_shp = b20_shp
-    block20_shp['NUMAREAS'] = 0
-    crosswalk_path = "nhgis_blk2010_blk2020_ge_v0_26/" + state + "/nhgis_blk2010_blk2020_ge_v0_26.csv"
-    crosswalk_ref = pd.read_csv(crosswalk_path)
-    assignment = []
-    # generate list of tiles
-    tiles = crosswalk_ref['GEOID20'].to_list()
+    crosswalk = Crosswalk(nhgis_crosswalk_path=nhgis_crosswalk_path(state))
     individ_cols = ['submission_text', 'area_text', 'area_name']
-    cols = individ_cols + tiles
-    i = 0
-    for _idx, row in block10_pivot.iterrows():
-        plan_id = [row.name.split("-")[0] + "-1"]
-        temp_row = row
-        block10_names = []
-        block20_names = []
-        for key, value in row.items():
-            if key not in individ_cols and value == 1:
-                block10_names.append(key)
-                # store the corresponding 2020 block id
-                subset = crosswalk_ref[crosswalk_ref['GEOID10'] == int(key)]
-                block20 = int(subset[subset.PAREA == subset.PAREA.max()].GEOID20)
-                block20_names.append(block20)
-                index = block20_shp[block20_shp['GEOID20'] == str(block20)].index
-                block20_shp.at[index, 'NUMAREAS'] = block20_shp.loc[index]['NUMAREAS'] + 1
-
-        print("end of one row!")
-        i += 1
+    block10_names = [col for col in block10_pivot.columns if col not in individ_cols]
+    # number of areas covering each 2010 block
+    block10_counts = (block10_pivot[block10_names] == 1).sum(axis=0).to_numpy()
+    rows = geoid_positions(block10_names, crosswalk.block_ids_2010)
+    block20_counts = crosswalk.block_matrix('max-weight')[rows].T @ block10_counts
+    numareas = pd.Series(block20_counts, index=crosswalk.block_ids_2020)
+    block20_shp['NUMAREAS'] = (block20_shp['GEOID20'].astype(np.int64)
+                               .map(numareas).fillna(0).astype(int))
     return block20_shp
 
 # def crosswalk_2010b_to_2020b_and_store_shp(state: str, block10_pivot: pd.DataFrame, block20_shp) -> pd.DataFrame:
@@ -503,108 +489,27 @@ def shp_crosswalk_2010b_to_2020b(state: str, block10_pivot: pd.DataFrame, b20_sh
 
 
 def precinct_to_pivot(df, outfile = None):
-    # add a units col to the df
-    df['units'] = df['districtr_data'].apply(lambda x: x['plan']['units']['id'])
-    try:
-        state = df.iloc[0]['districtr_data']['plan']['place']['state']
-    except:
-        print(f"ERROR: {len(df)} COI SUBMISSIONS")
-        return None
-
-    unit = "precincts"
-    
-    fips = us.states.lookup(state).fips
-    
-    acc = pd.DataFrame(columns = ['id', 'plan_id', 'coi_id', 'tile_id', 'geometry'])
-        
-    # download appropriate shape
-    if unit == "blockgroups":
-        link = f'https://www2.census.gov/geo/pvs/tiger2010st/{fips}_{state.replace(" ", "_")}/{fips}/tl_2010_{fips}_bg10.zip'
-    elif unit == "blocks":
-        link = f'https://www2.census.gov/geo/pvs/tiger2010st/{fips}_{state.replace(" ", "_")}/{fips}/tl_2010_{fips}_tabblock10.zip'
-    else:
-        link = coi_maps.mggg_states[state]
-    shp = gpd.read_file(link)
-    
-
-    subset = df[df['units'] == unit]
-    if len(subset) == 0:
-        print(f"No COIs submitted on {unit} yet in {state}")
-        return
-
-    key = subset.iloc[0]['districtr_data']['plan']['idColumn']['key']
-    if state == 'Wisconsin':
-        key = "Code-2"
-
-
-    # cast everything to int (and do some error checking)
-    try:
-        shp[key] = shp[key].apply(int)
-    except KeyError:
-        if key == "GEOID":
-            try:
-                key = "GEOID10"
-                shp[key] = shp[key].apply(int)
-            except KeyError:
-                print("ERROR: GEOID and GEOID10 not in shapefile.")
-                return None
-        else:
-            print(f"ERROR: {key} not in shapefile.")
-            return None
-    except ValueError:
-        shp[key] = shp[key] # can't be turned to an int (not a GEOID)
-            
-    tiles = list(shp[key].apply(str))
-    cols = ['submission_text', 'area_text', 'area_name'] + tiles
-    pivot = pd.DataFrame(columns = cols)
-
-    # each COI is a row
-    for _idx, row in subset.iterrows():
-        # get all info
-        plan_id = row['plan_id']
-        row_key = row['districtr_data']['plan']['idColumn']['key']
-        if state == "Wisconsin" and row_key == "GEOID10" and unit == "wards":
-            continue
-
-        try:
-            asn = row['districtr_data']['plan']['assignment']
-        except KeyError: # empty plan
-            continue
-
-        sub_text = row['text']
-        parts = row['districtr_data']['plan']['parts']
-        titles = {p['id']: p['name'] for p in parts}
-        texts = {p['id']: (p['description'] if 'description' in p else "") for p in parts}
-
-        # make lists
-        assigned = asn.keys()
-        distinct_cois = {}
-        for tile in assigned:
-            tmp = asn[tile]
-            if not isinstance(tmp, list):
-                tmp = [tmp]
-            for coi in tmp:
-                if coi not in distinct_cois.keys():
-                    distinct_cois[coi] = {
-                        'sub_text': sub_text,
-                        'title': titles[coi] if coi in titles else "",
-                        'area_text': texts[coi] if coi in texts else "",
-                        'tiles': []
-                    }
-                distinct_cois[coi]['tiles'].append(tile)
-
-        
-        plan_ids = [f'{plan_id}-{d+1}' for d in distinct_cois.keys()]
-        acc = pd.DataFrame(index = plan_ids, columns = cols)
-        for (d, p) in zip(distinct_cois.keys(), plan_ids):
-            acc.at[p, 'submission_text'] = distinct_cois[d]['sub_text']
-            acc.at[p, 'area_text'] = distinct_cois[d]['area_text']
-            acc.at[p, 'area_name'] = distinct_cois[d]['title']
-            for t in distinct_cois[d]['tiles']:
-                acc.at[p, t] = 1
-        pivot = pivot.append(acc)
-        
-    pivot = pivot.fillna(0)
-    if outfile:
-        pivot.to_csv(outfile)
-    return pivot
\ No newline at end of file
+    """
+    Builds the COI lookup table of the submissions in `df` drawn on...
+    precincts (see coi_dataset.unit_to_pivot).
+    """
+    return coi_dataset.unit_to_pivot(df, "precincts", outfile)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generates a state's full COI lookup table, keeping each "
+                    "pipeline stage's output so an interrupted run can resume.")
+    parser.add_argument('state', help='portal state, e.g. ohio')
+    parser.add_argument('--outfile', default=None, help='where to write the lookup table (.csv for the wide csv)')
+    parser.add_argument('--plan-cache', default=None, help='PlanCache sqlite file')
+    parser.add_argument('--artifacts', default=DEFAULT_ARTIFACT_DIR,
+                        help='directory for stage outputs')
+    parser.add_argument('--processes', type=int, default=2)
+    args = parser.parse_args()
+    cache = PlanCache(args.plan_cache) if args.plan_cache else None
+    outfile = args.outfile or f'{args.state}_lookup_table{LOOKUP_SUFFIX}'
+    generate_full_lookup_table(args.state, outfile, cache,
+                               os.path.join(args.artifacts, args.state), args.processes)
+
+if __name__ == "__main__":
+    main()
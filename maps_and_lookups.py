@@ -6,6 +6,7 @@ And also all the COI pivoted 1/0 csvs
 
 from matplotlib.pyplot import text
 import submission_analysis.fetch as fetch
+import submission_analysis.sync as sync
 import coi_maps
 import coi_dataset
 import numpy as np
@@ -62,9 +63,15 @@ to_draw = {
     # 'Pennsylvania': ('statewide', 'pennsylvania', 'Pennsylvania'),
 }
 
+# read unit shapefiles only from a pre-populated geometry cache (no network)
+OFFLINE_GEOMETRY = False
+
 ## actual code
 # data is list of (geom, outfile) tuples
-def create_coi_maps(state, data):
+# if snapshot_root is given, the portal is synced into a local snapshot there
+# and only new submissions are downloaded; a PlanCache `cache` is used in
+# either case (in place of the snapshot's own plan cache when syncing)
+def create_coi_maps(state, data, cache=None, snapshot_root=None):
     if not isinstance(data, list):
         data = [data]
     link = state.lower().replace(" ", "")
@@ -87,7 +94,13 @@ def create_coi_maps(state, data):
 
 
     
-    _, coi_df, _ = fetch.submissions(ids, plan, cois, written)
+    if snapshot_root is None:
+        _, coi_df, _ = fetch.submissions(ids, plan, cois, written, cache=cache)
+    else:
+        _, coi_df, _ = sync.sync_submissions(os.path.join(snapshot_root, link),
+                                             ids, plan, cois, written, cache=cache)
+    if cache is not None:
+        print(f'plan cache: {cache.stats()}')
 
     # Need to drop these in Ohio for now
     # if state == "Ohio":
@@ -98,7 +111,8 @@ def create_coi_maps(state, data):
     textfile.write(f'----------- {state} -------------\n')
 
     print("Writing Cumulative Dataset")
-    coi_df['datetime'] = coi_df['datetime'].apply(np.datetime64)
+    # compare in naive UTC against the numpy dates below
+    coi_df['datetime'] = pd.to_datetime(coi_df['datetime'], utc=True).dt.tz_convert(None)
     cumulative = copy.deepcopy(coi_df[coi_df['datetime'] < monday])
     print(f"{len(cumulative)} submissions through monday")
     cumulative = coi_maps.assignment_to_shape(cumulative)
@@ -107,14 +121,14 @@ def create_coi_maps(state, data):
         textfile.write(f'No COI submissions yet in {state}')
         textfile.close()
         return
-    coi_dataset.assignment_to_pivot(coi_df, f'lookup_tables/{state}_{monday}.csv')
+    coi_dataset.assignment_to_pivot(coi_df, f'lookup_tables/{state}_{monday}.csv', sparse=True)
     print("Cumulative Dataset Written\n")
     
     print("Writing Weekly Dataset")
     weekly = coi_df[coi_df['datetime'] >= (monday - np.timedelta64(1, 'W'))]
     weekly = weekly[weekly['datetime'] < monday]
     weekly = copy.deepcopy(weekly)
-    coi_dataset.assignment_to_pivot(weekly, f'lookup_tables/{state}_weekly_{monday}.csv')
+    coi_dataset.assignment_to_pivot(weekly, f'lookup_tables/{state}_weekly_{monday}.csv', sparse=True)
     print(f"{len(weekly)} submissions in the last week")
     weekly = coi_maps.assignment_to_shape(weekly)
     print("Weekly Dataset Written\n")
@@ -163,12 +177,15 @@ def most_recent_monday(d):
 
 def main():
     monday = str(most_recent_monday(np.datetime64('today')))
+    # keep one snapshot of each portal across weekly runs
+    snapshot_root = os.path.abspath(sync.DEFAULT_SNAPSHOT_ROOT)
+    coi_maps.geometry_cache.offline = OFFLINE_GEOMETRY
     os.mkdir(monday)
     os.chdir(monday)
     os.mkdir("lookup_tables")
     for s in to_draw.keys():
         os.mkdir(s.lower().replace(" ", ""))
-        create_coi_maps(s, to_draw[s])
+        create_coi_maps(s, to_draw[s], snapshot_root=snapshot_root)
     os.chdir('..')
 
 if __name__ == "__main__":
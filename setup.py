@@ -11,7 +11,8 @@ requirements = [
     "geopandas",
     "shapely",
     "matplotlib",
-    "pathos"
+    "pathos",
+    "pyarrow"
 ]
 
 setup(
@@ -0,0 +1,251 @@
+'''
+A local stand-in for the submission portal API and districtr's planRead
+function, serving synthetic submissions so fetching can be tested and
+benchmarked offline.
+
+It serves the same routes as the portal:
+    /submissions/districtr-ids/<state>
+    /submissions/csv/<state>?type=<plan|coi|written>&length=<n>
+    /planRead?id=<plan id>
+
+Submissions are numbered 0..num_submissions - 1 (newest last, listed newest
+first like the portal), and each plan is generated from (seed, id), so a
+portal can grow between requests by raising `num_submissions`. planRead
+answers after `latency` seconds; a fraction `error_rate` of plans fail their
+first request with a 503, and a fraction `not_found_rate` are not found.
+The csv routes page with `start` (offset) and `length` parameters unless
+`paging` is off, in which case `start` is ignored. Submission indices in
+`removed` (moderated submissions) are left out of the ids and csv routes.
+
+To use:
+    with StandInPortal(num_submissions=500, latency=0.05) as portal:
+        fetch.submissions(*portal.endpoints('michigan'),
+                          plan_read_url=portal.plan_read_url)
+or run `python standin_portal.py --port 8000` to serve one until killed.
+'''
+import argparse
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime as dt, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+from submission_analysis.plan_cache import PLAN_FOUND_MSG
+
+FIRST_SUBMISSION = dt(2021, 5, 1, tzinfo=timezone.utc)
+CSV_COLUMNS = ['id', 'link', 'type', 'datetime', 'text', 'numberOfComments',
+               'districttype']
+
+
+def unit_hash(*keys) -> float:
+    """Maps `keys` to a deterministic pseudo-random number in [0, 1)."""
+    digest = hashlib.sha256(repr(keys).encode()).digest()
+    return int.from_bytes(digest[:8], 'little') / 2**64
+
+
+class StandInPortal:
+    def __init__(self, num_submissions: int = 100, coi_fraction: float = 0.5,
+                 num_written: int = 10, tiles_per_plan: int = 50,
+                 num_tiles: int = 5000, latency: float = 0.,
+                 error_rate: float = 0., not_found_rate: float = 0.,
+                 seed: int = 0, paging: bool = True, host: str = '127.0.0.1',
+                 port: int = 0):
+        self.num_submissions = num_submissions
+        self.coi_fraction = coi_fraction
+        self.num_written = num_written
+        self.tiles_per_plan = tiles_per_plan
+        self.num_tiles = num_tiles
+        self.latency = latency
+        self.error_rate = error_rate
+        self.not_found_rate = not_found_rate
+        self.seed = seed
+        self.paging = paging
+        self.removed = set()
+        self.csv_columns = list(CSV_COLUMNS)  # the columns the csv routes serve
+        self.csv_requests = 0
+        self.csv_rows_served = 0
+        self.plan_reads = []  # plan ids in the order planRead was called
+        self.lock = threading.Lock()
+        self._failed = set()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.url = f'http://{host}:{self.server.server_port}'
+        self.plan_read_url = self.url + '/planRead?id=%s'
+
+    def __enter__(self) -> 'StandInPortal':
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def endpoints(self, state: str = 'michigan') -> Tuple[str, str, str, str]:
+        """The ids, plan, coi and written csv urls (as passed to
+        fetch.submissions), in the same form as utils.submission_endpts."""
+        csv_url = f'{self.url}/submissions/csv/{state}'
+        return (f'{self.url}/submissions/districtr-ids/{state}',
+                csv_url + '?type=plan&length=10000',
+                csv_url + '?type=coi&length=10000',
+                csv_url + '?type=written&length=10000')
+
+    # fixture data
+
+    def submission_type(self, index: int) -> str:
+        return 'coi' if unit_hash(self.seed, 'type',
+                                  index) < self.coi_fraction else 'plan'
+
+    def is_found(self, plan_id: str) -> bool:
+        return unit_hash(self.seed, 'found', plan_id) >= self.not_found_rate
+
+    def fails_first(self, plan_id: str) -> bool:
+        return unit_hash(self.seed, 'error', plan_id) < self.error_rate
+
+    def plan(self, plan_id: str, state: str = 'Michigan') -> dict:
+        """The districtr planRead response for a submission."""
+        if not self.is_found(plan_id):
+            return {'msg': 'Plan not found'}
+        rng = np.random.default_rng([self.seed, int(plan_id)])
+        is_coi = self.submission_type(int(plan_id)) == 'coi'
+        num_parts = int(rng.integers(1, 4)) if is_coi else 4
+        tiles = 260010001001 + rng.choice(self.num_tiles, self.tiles_per_plan,
+                                          replace=False)
+        parts = rng.integers(0, num_parts, len(tiles))
+        return {
+            'msg': PLAN_FOUND_MSG,
+            'plan': {
+                'assignment': {str(t): int(p) for t, p in zip(tiles, parts)},
+                'parts': [{'id': p, 'name': f'Area {p + 1}',
+                           'description': f'Description of area {p + 1}'}
+                          for p in range(num_parts)],
+                'units': {'id': 'blockgroups'},
+                'place': {'state': state},
+                'idColumn': {'key': 'GEOID'},
+                'problem': {'type': 'community' if is_coi else 'districts'},
+            }
+        }
+
+    @staticmethod
+    def portal_datetime(index: int) -> str:
+        when = FIRST_SUBMISSION + timedelta(hours=index)
+        return when.strftime('%a %b %d %Y %H:%M:%S GMT+0000 '
+                             '(Coordinated Universal Time)')
+
+    def csv_rows(self, submission_type: str) -> List[list]:
+        """The portal csv rows of one submission type, newest first."""
+        if submission_type == 'written':
+            indices = range(self.num_written)
+            link = lambda index: ''
+        else:
+            indices = [index for index in range(self.num_submissions)
+                       if self.submission_type(index) == submission_type
+                       and index not in self.removed]
+            link = lambda index: f'https://districtr.org/plan/{index}?portal'
+        rows = []
+        for index in reversed(indices):
+            row_id = index if submission_type != 'written' else f'w{index}'
+            rows.append([row_id, link(index), submission_type,
+                         self.portal_datetime(index),
+                         f'Submission text {row_id}', index % 3,
+                         'ush' if submission_type == 'plan' else ''])
+        return rows
+
+    def csv_text(self, submission_type: str, start: int = 0,
+                 length: int = 10000) -> str:
+        if not self.paging:
+            start = 0
+        served = [CSV_COLUMNS.index(column) for column in self.csv_columns]
+        lines = [','.join(self.csv_columns)]
+        for row in self.csv_rows(submission_type)[start:start + length]:
+            lines.append(','.join(str(row[i]) for i in served))
+        return '\n'.join(lines) + '\n'
+
+    def ids_json(self) -> dict:
+        return {'ids': [{
+            'link': f'https://districtr.org/plan/{index}?portal',
+            'type': self.submission_type(index)
+        } for index in reversed(range(self.num_submissions))
+          if index not in self.removed]}
+
+    # http
+
+    def _handler(self):
+        portal = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key: values[0]
+                         for key, values in parse_qs(url.query).items()}
+                if url.path.startswith('/submissions/districtr-ids/'):
+                    self.send(json.dumps(portal.ids_json()))
+                elif url.path.startswith('/submissions/csv/'):
+                    body = portal.csv_text(query.get('type', 'plan'),
+                                           int(query.get('start', 0)),
+                                           int(query.get('length', 10000)))
+                    with portal.lock:
+                        portal.csv_requests += 1
+                        portal.csv_rows_served += body.count('\n') - 1
+                    self.send(body, 'text/csv')
+                elif url.path == '/planRead':
+                    self.plan_read(query['id'])
+                else:
+                    self.send_error(404)
+
+            def plan_read(self, plan_id):
+                with portal.lock:
+                    portal.plan_reads.append(plan_id)
+                    fail = (portal.fails_first(plan_id)
+                            and plan_id not in portal._failed)
+                    portal._failed.add(plan_id)
+                if portal.latency:
+                    time.sleep(portal.latency)
+                if fail:
+                    self.send_error(503)
+                    return
+                self.send(json.dumps(portal.plan(plan_id)))
+
+            def send(self, body, content_type='application/json'):
+                payload = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--submissions', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.)
+    parser.add_argument('--not-found-rate', type=float, default=0.)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    portal = StandInPortal(num_submissions=args.submissions,
+                           latency=args.latency, error_rate=args.error_rate,
+                           not_found_rate=args.not_found_rate, seed=args.seed,
+                           port=args.port)
+    print(f'Serving {args.submissions} submissions at {portal.url}')
+    portal.server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+"""Helpers shared by the benchmark scripts (benchmark_*.py)."""
+import subprocess
+from typing import Optional
+
+
+def current_commit() -> Optional[str]:
+    """
+    Returns the current git commit hash, or None outside a git checkout
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              capture_output=True,
+                              text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
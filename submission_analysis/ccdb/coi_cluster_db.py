@@ -14,6 +14,7 @@ import os
 import tqdm
 import copy
 import warnings
+from submission_analysis.lookup import LookupTable, read_lookup_table
 
 
 def matching_distance_between_maps(map_a, map_b, geoid_to_id,
@@ -125,18 +126,21 @@ class coi_cluster_database(object):
         js = json.load(open(graph_file_name))
         self.dual_graph = nx.readwrite.json_graph.adjacency_graph(
             js, attrs=dict(id="id", key=key_name))
-        self.coi_data = pandas.read_csv(lookup_table_file_name, index_col=0)
 
         geoids_in_graph = [str(v) for _, v in self.dual_graph.nodes(key_name)]
 
         if compressed_coi_data:
             # New format: lists of tiles for each row.
+            self.coi_data = pandas.read_csv(lookup_table_file_name, index_col=0)
             self.coi_data[tiles_col] = self.coi_data[tiles_col].apply(literal_eval)
             geoids_in_dataframe = sorted(
                 set.union(*(set(t) for t in self.coi_data[tiles_col])))
         else:
-            # Old format: binary encoding (each unit is a column).
-            geoids_in_dataframe = self.coi_data.iloc[:, 3:].columns
+            # Old format: binary encoding (each unit is a column), either as a
+            # wide csv or saved with LookupTable.save.
+            lookup_table = read_lookup_table(lookup_table_file_name)
+            self.coi_data = lookup_table.metadata
+            geoids_in_dataframe = lookup_table.tiles
 
         excess_columns = set(geoids_in_dataframe) - set(geoids_in_graph)
         if excess_columns:
@@ -149,8 +153,10 @@ class coi_cluster_database(object):
                     lambda tiles: [t for t in tiles if t not in excess_columns]
                 )
             else:
-                self.coi_data = pandas.DataFrame.drop(self.coi_data,
-                                                      columns=excess_columns)
+                keep = ~lookup_table.tiles.isin(excess_columns)
+                lookup_table = LookupTable(lookup_table.metadata,
+                                           lookup_table.matrix[:, keep],
+                                           lookup_table.tiles[keep])
 
         infinity_standin = len(self.dual_graph.nodes) + 1
 
@@ -197,8 +203,14 @@ class coi_cluster_database(object):
                 for tile in tiles:
                     cois_as_bool_matrix[idx, tile_indices[tile]] = True
         else:
-            cois_as_bool_matrix = np.array(
-                self.coi_data.iloc[:, 3:].to_numpy(), dtype=bool)
+            # columns in dual graph node order, like the distance rows
+            memberships = lookup_table.matrix.tocoo()
+            columns = pandas.Index(geoids_in_graph).get_indexer(
+                lookup_table.tiles)
+            cois_as_bool_matrix = np.zeros(
+                (len(lookup_table), len(geoids_in_graph)), dtype=bool)
+            cois_as_bool_matrix[memberships.row,
+                                columns[memberships.col]] = True
         rows = [cois_as_bool_matrix[i, :] for i in range(number_of_cois)]
         row_nums = range(number_of_cois)
         dists = [distances_matrix[row, :] for row in rows]
@@ -222,8 +234,10 @@ class coi_cluster_database(object):
         self.coi_total_dissimilarities = self.coi_total_dissimilarities + np.transpose(
             self.coi_total_dissimilarities)
         if not compressed_coi_data:
-            self.coi_location_data = self.coi_data.iloc[:, 3:]
-            self.coi_data = self.coi_data.iloc[:, :3]
+            self.coi_location_data = pandas.DataFrame.sparse.from_spmatrix(
+                lookup_table.matrix,
+                index=lookup_table.metadata.index,
+                columns=lookup_table.tiles)
         self.dendrogram = hierarchy.linkage(
             squareform(
                 np.nan_to_num(self.coi_total_dissimilarities,
@@ -1,43 +1,518 @@
+import hashlib
 import json
+import os
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-from collections import defaultdict
-from typing import Optional
+from scipy import sparse
+from typing import Callable, Dict, Iterable, Optional, Sequence, Set, Tuple
+
+BLOCK_COLUMNS = ['STATE', 'COUNTY', 'TRACT', 'BLK']
+# Number of trailing GEOID digits that identify a block within its block group.
+BLOCK_DIGITS_IN_GROUP = 3
+CSR_ARRAYS = ('block_group_ids', 'block_group_offsets', 'blocks_2020')
+NHGIS_ARRAYS = ('block_ids_2010', 'block_offsets', 'nhgis_blocks_2020',
+                'nhgis_weights')
+VTD_ARRAYS = ('vtd_ids', 'vtd_offsets', 'vtd_blocks_2020')
+SHARD_ARRAYS = CSR_ARRAYS + NHGIS_ARRAYS + VTD_ARRAYS
+# The NHGIS column used to weight 2010 → 2020 block pairs (share of the 2010
+# block's land area falling in the 2020 block).
+NHGIS_WEIGHT = 'PAREA'
+BLOCK_MATRIX_MODES = ('max-weight', 'fractional')
+
+
+def encode_block_geoids(state: np.ndarray, county: np.ndarray,
+                        tract: np.ndarray, block: np.ndarray) -> np.ndarray:
+    """Packs census block GEOID components into int64 GEOIDs.
+
+    The integer value of a GEOID is unchanged by this encoding, so
+    `str(geoid).zfill(15)` recovers the usual 15-character form."""
+    return (state.astype(np.int64) * 10**13 + county.astype(np.int64) * 10**10
+            + tract.astype(np.int64) * 10**4 + block.astype(np.int64))
+
+
+def file_digest(path: str) -> str:
+    """Returns the SHA-256 hex digest of the file at `path`."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_signature(path: str) -> str:
+    """Returns a SHA-256 hex digest of `path`'s absolute path, size and
+    modification time, which is much cheaper than `file_digest` and changes
+    whenever the file is rewritten."""
+    stat = os.stat(path)
+    signature = f'{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}'
+    return hashlib.sha256(signature.encode()).hexdigest()
+
+
+def compile_block_crosswalk(block_crosswalk_path: str) -> Dict[str, np.ndarray]:
+    """Compiles a Census 2010/2020 block relationship file into CSR arrays.
+
+    Returns a dict with the sorted 2010 block group GEOIDs
+    (`block_group_ids`), and, for the block group at position i, its 2020
+    block GEOIDs in `blocks_2020[block_group_offsets[i]:block_group_offsets[i + 1]]`
+    (sorted and deduplicated). All GEOIDs are int64.
+    """
+    columns = ([f'{col}_2010' for col in BLOCK_COLUMNS] +
+               [f'{col}_2020' for col in BLOCK_COLUMNS])
+    blocks_crosswalk = pd.read_csv(block_crosswalk_path,
+                                   sep='|',
+                                   usecols=columns,
+                                   dtype={col: np.int64
+                                          for col in columns})
+    block_groups_2010 = encode_block_geoids(
+        *(blocks_crosswalk[f'{col}_2010'].to_numpy()
+          for col in BLOCK_COLUMNS)) // 10**BLOCK_DIGITS_IN_GROUP
+    blocks_2020 = encode_block_geoids(
+        *(blocks_crosswalk[f'{col}_2020'].to_numpy()
+          for col in BLOCK_COLUMNS))
+
+    order = np.lexsort((blocks_2020, block_groups_2010))
+    block_groups_2010 = block_groups_2010[order]
+    blocks_2020 = blocks_2020[order]
+    distinct = np.ones(len(order), dtype=bool)
+    distinct[1:] = ((block_groups_2010[1:] != block_groups_2010[:-1]) |
+                    (blocks_2020[1:] != blocks_2020[:-1]))
+    block_groups_2010 = block_groups_2010[distinct]
+    blocks_2020 = blocks_2020[distinct]
+
+    block_group_ids, starts = np.unique(block_groups_2010, return_index=True)
+    return {
+        'block_group_ids': block_group_ids,
+        'block_group_offsets': np.append(starts, len(blocks_2020)),
+        'blocks_2020': blocks_2020,
+    }
+
+
+def save_arrays(arrays: Dict[str, np.ndarray], directory: str):
+    """Writes `arrays` as `.npy` files in `directory`.
+
+    The files are written to a temporary sibling directory that is renamed
+    into place, so readers never see a partially written cache."""
+    tmp_directory = f'{directory}.tmp{os.getpid()}'
+    os.makedirs(tmp_directory, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_directory, f'{name}.npy'), array)
+    try:
+        os.rename(tmp_directory, directory)
+    except OSError:
+        # Another process finished the same cache first.
+        for name in arrays:
+            os.remove(os.path.join(tmp_directory, f'{name}.npy'))
+        os.rmdir(tmp_directory)
+
+
+def load_arrays(directory: str, names: Iterable[str]) -> Dict[str, np.ndarray]:
+    """Memory-maps the `.npy` files written by `save_arrays`."""
+    return {
+        name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+        for name in names
+    }
+
+
+def compile_nhgis_crosswalk(nhgis_crosswalk_path: str,
+                            weight: str = NHGIS_WEIGHT) -> Dict[str, np.ndarray]:
+    """Compiles an NHGIS 2010 block → 2020 block crosswalk into CSR arrays.
+
+    Returns a dict with the sorted 2010 block GEOIDs (`block_ids_2010`) and,
+    for the block at position i, its 2020 block GEOIDs and the matching
+    `weight` column values in
+    `nhgis_blocks_2020[block_offsets[i]:block_offsets[i + 1]]` and
+    `nhgis_weights[block_offsets[i]:block_offsets[i + 1]]`.
+    """
+    nhgis = pd.read_csv(nhgis_crosswalk_path,
+                        usecols=['GEOID10', 'GEOID20', weight],
+                        dtype={
+                            'GEOID10': np.int64,
+                            'GEOID20': np.int64,
+                            weight: np.float64
+                        })
+    blocks_2010 = nhgis['GEOID10'].to_numpy()
+    blocks_2020 = nhgis['GEOID20'].to_numpy()
+    order = np.lexsort((blocks_2020, blocks_2010))
+    block_ids_2010, starts = np.unique(blocks_2010[order], return_index=True)
+    return {
+        'block_ids_2010': block_ids_2010,
+        'block_offsets': np.append(starts, len(order)),
+        'nhgis_blocks_2020': blocks_2020[order],
+        'nhgis_weights': nhgis[weight].to_numpy()[order],
+    }
+
+
+def compile_vtd_crosswalk(vtd_crosswalk_path: str) -> Dict[str, np.ndarray]:
+    """Compiles a JSON VTD → 2020 blocks crosswalk into CSR arrays.
+
+    Returns the sorted VTD ids (`vtd_ids`, a unicode array) and, for the VTD
+    at position i, its int64 2020 block GEOIDs in
+    `vtd_blocks_2020[vtd_offsets[i]:vtd_offsets[i + 1]]` (sorted and
+    deduplicated).
+    """
+    with open(vtd_crosswalk_path) as f:
+        vtd_to_blocks = json.load(f)
+    vtd_ids = sorted(vtd_to_blocks)
+    blocks = [
+        np.unique(np.array([int(block) for block in vtd_to_blocks[vtd]],
+                           dtype=np.int64)) for vtd in vtd_ids
+    ]
+    return {
+        'vtd_ids': np.array(vtd_ids, dtype=str),
+        'vtd_offsets': np.concatenate([[0], np.cumsum([len(b) for b in blocks])
+                                       ]).astype(np.int64),
+        'vtd_blocks_2020': np.concatenate(blocks + [np.empty(0, np.int64)]),
+    }
+
+
+EMPTY_BLOCK_CROSSWALK = {
+    'block_group_ids': np.empty(0, dtype=np.int64),
+    'block_group_offsets': np.zeros(1, dtype=np.int64),
+    'blocks_2020': np.empty(0, dtype=np.int64),
+}
+EMPTY_NHGIS_CROSSWALK = {
+    'block_ids_2010': np.empty(0, dtype=np.int64),
+    'block_offsets': np.zeros(1, dtype=np.int64),
+    'nhgis_blocks_2020': np.empty(0, dtype=np.int64),
+    'nhgis_weights': np.empty(0, dtype=np.float64),
+}
+EMPTY_VTD_CROSSWALK = {
+    'vtd_ids': np.empty(0, dtype=str),
+    'vtd_offsets': np.zeros(1, dtype=np.int64),
+    'vtd_blocks_2020': np.empty(0, dtype=np.int64),
+}
+
+
+def compiled_arrays(compile_fn: Callable[[str], Dict[str, np.ndarray]],
+                    path: str, names: Iterable[str],
+                    cache_dir: Optional[str] = None,
+                    verify: bool = False) -> Dict[str, np.ndarray]:
+    """Returns `compile_fn(path)`, memory-mapped from `cache_dir` if given.
+
+    Compiled arrays are cached under `path`'s location, size and
+    modification time (see `file_signature`), so a rewritten source file is
+    recompiled. With `verify`, they are cached under the SHA-256 digest of
+    its contents instead, which reads the whole file on every call but
+    survives copying the file (and its cache) elsewhere."""
+    if cache_dir is None:
+        return compile_fn(path)
+    key = file_digest(path) if verify else file_signature(path)
+    cache_path = os.path.join(cache_dir, key)
+    if not os.path.isdir(cache_path):
+        os.makedirs(cache_dir, exist_ok=True)
+        save_arrays(compile_fn(path), cache_path)
+    return load_arrays(cache_path, names)
+
+
+def geoid_positions(geoids: Sequence, vocabulary: np.ndarray) -> np.ndarray:
+    """Returns the positions of `geoids` in the sorted int64 `vocabulary`,
+    raising a KeyError that lists any GEOIDs that are missing."""
+    geoids = np.array([int(geoid) for geoid in geoids], dtype=np.int64)
+    positions = np.searchsorted(vocabulary, geoids)
+    positions = np.minimum(positions, max(len(vocabulary) - 1, 0))
+    if len(vocabulary) == 0:
+        missing = np.ones(len(geoids), dtype=bool)
+    else:
+        missing = vocabulary[positions] != geoids
+    if missing.any():
+        raise KeyError(geoids[missing].tolist())
+    return positions
+
+
+def binary_membership(membership) -> sparse.csr_matrix:
+    """Converts a (possibly dense) COI membership matrix to a 0/1 CSR matrix."""
+    membership = sparse.csr_matrix(membership)
+    membership.eliminate_zeros()
+    membership.data = np.ones_like(membership.data, dtype=np.int8)
+    return membership
 
 
 class Crosswalk:
+    """Maps 2010 block groups and VTDs to sets of 2020 census blocks.
+
+    The block crosswalk is held as CSR arrays over int64 GEOIDs (see
+    `compile_block_crosswalk`). If `cache_dir` is given, the compiled arrays
+    are stored there, keyed by each source file's path, size and
+    modification time (or by its SHA-256 digest with `verify_cache`), and
+    later constructions memory-map them instead of re-reading the file.
+
+    For whole lookup tables, `translate_block_groups` and `translate_vtds`
+    map a COI × unit membership matrix to a COI × 2020 block membership
+    matrix with a single sparse product. Its columns are `block_ids_2020`.
+    """
     def __init__(self,
-                 block_crosswalk_path: str,
-                 vtd_crosswalk_path: Optional[str] = None):
-        blocks_crosswalk = pd.read_csv(block_crosswalk_path, sep='|')
-        blocks_crosswalk['block_id_2010'] = (
-            blocks_crosswalk['STATE_2010'].astype(str) +
-            blocks_crosswalk['COUNTY_2010'].astype(str).str.zfill(3) +
-            blocks_crosswalk['TRACT_2010'].astype(str).str.zfill(6) +
-            blocks_crosswalk['BLK_2010'].astype(str).str.zfill(4))
-        blocks_crosswalk['block_id_2020'] = (
-            blocks_crosswalk['STATE_2020'].astype(str) +
-            blocks_crosswalk['COUNTY_2020'].astype(str).str.zfill(3) +
-            blocks_crosswalk['TRACT_2020'].astype(str).str.zfill(6) +
-            blocks_crosswalk['BLK_2020'].astype(str).str.zfill(4))
-
-        block_group_2010_to_blocks_2020 = defaultdict(set)
-        for block_2010, block_2020 in zip(blocks_crosswalk['block_id_2010'],
-                                          blocks_crosswalk['block_id_2020']):
-            block_group_2010_to_blocks_2020[block_2010[:12]].add(block_2020)
-        self.block_group_2010_to_blocks_2020 = dict(
-            block_group_2010_to_blocks_2020)
-
-        if vtd_crosswalk_path is None:
-            self.vtd_to_blocks_2020 = {}
-        else:
-            self.vtd_to_blocks_2020 = {
-                vtd: set(blocks)
-                for vtd, blocks in json.load(open(vtd_crosswalk_path)).items()
+                 block_crosswalk_path: Optional[str] = None,
+                 vtd_crosswalk_path: Optional[str] = None,
+                 cache_dir: Optional[str] = None,
+                 nhgis_crosswalk_path: Optional[str] = None,
+                 verify_cache: bool = False):
+        arrays = {}
+        for compile_fn, path, names, empty in [
+            (compile_block_crosswalk, block_crosswalk_path, CSR_ARRAYS,
+             EMPTY_BLOCK_CROSSWALK),
+            (compile_nhgis_crosswalk, nhgis_crosswalk_path, NHGIS_ARRAYS,
+             EMPTY_NHGIS_CROSSWALK),
+            (compile_vtd_crosswalk, vtd_crosswalk_path, VTD_ARRAYS,
+             EMPTY_VTD_CROSSWALK),
+        ]:
+            arrays.update(empty if path is None else compiled_arrays(
+                compile_fn, path, names, cache_dir, verify_cache))
+        self._set_arrays(arrays)
+
+    def _set_arrays(self, arrays: Dict[str, np.ndarray]):
+        for name in SHARD_ARRAYS:
+            setattr(self, name, arrays[name])
+        self._block_group_2010_to_blocks_2020 = None
+        self._vtd_to_blocks_2020 = None
+        self._vtd_positions = None
+        self._block_ids_2020 = None
+        self._block_group_matrix = None
+        self._block_matrices = {}
+        self._vtd_matrix = None
+
+    def save(self, directory: str):
+        """Writes the crosswalk's arrays to `directory` (see `load`)."""
+        save_arrays({name: getattr(self, name)
+                     for name in SHARD_ARRAYS}, directory)
+
+    @classmethod
+    def load(cls, directory: str) -> 'Crosswalk':
+        """Memory-maps a crosswalk written by `save`."""
+        crosswalk = cls.__new__(cls)
+        crosswalk._set_arrays(load_arrays(directory, SHARD_ARRAYS))
+        return crosswalk
+
+    @property
+    def vtd_to_blocks_2020(self) -> Dict[str, Set[str]]:
+        """The VTD crosswalk as a dict of sets of GEOID strings (built on
+        first access)."""
+        if self._vtd_to_blocks_2020 is None:
+            self._vtd_to_blocks_2020 = {
+                vtd: set(
+                    self._geoid_strings(self.vtd_blocks_2020[
+                        self.vtd_offsets[index]:self.vtd_offsets[index + 1]]))
+                for index, vtd in enumerate(self.vtd_ids.tolist())
             }
+        return self._vtd_to_blocks_2020
+
+    @property
+    def block_group_2010_to_blocks_2020(self) -> Dict[str, Set[str]]:
+        """The block crosswalk as a dict of sets of GEOID strings (built on
+        first access; prefer `blocks_for_block_group` for lookups)."""
+        if self._block_group_2010_to_blocks_2020 is None:
+            self._block_group_2010_to_blocks_2020 = {
+                str(bg).zfill(12): set(
+                    self._geoid_strings(self._block_group_slice(index)))
+                for index, bg in enumerate(self.block_group_ids.tolist())
+            }
+        return self._block_group_2010_to_blocks_2020
+
+    def _block_group_slice(self, index: int) -> np.ndarray:
+        return self.blocks_2020[self.block_group_offsets[index]:self.
+                                block_group_offsets[index + 1]]
+
+    @staticmethod
+    def _geoid_strings(geoids: np.ndarray) -> Iterable[str]:
+        return (str(geoid).zfill(15) for geoid in geoids.tolist())
+
+    def blocks_for_block_group(self, bg) -> np.ndarray:
+        """Returns the int64 2020 block GEOIDs of a 2010 block group."""
+        bg = int(bg)
+        index = np.searchsorted(self.block_group_ids, bg)
+        if index == len(self.block_group_ids) or self.block_group_ids[
+                index] != bg:
+            raise KeyError(bg)
+        return self._block_group_slice(index)
+
+    @property
+    def block_ids_2020(self) -> np.ndarray:
+        """Sorted int64 GEOIDs of every 2020 block in the crosswalk; these
+        label the columns of the translation matrices."""
+        if self._block_ids_2020 is None:
+            self._block_ids_2020 = np.unique(
+                np.concatenate([
+                    self.blocks_2020, self.nhgis_blocks_2020,
+                    self.vtd_blocks_2020
+                ]))
+        return self._block_ids_2020
+
+    def block_group_matrix(self) -> sparse.csr_matrix:
+        """The 0/1 (2010 block group × 2020 block) incidence matrix, with rows
+        in `block_group_ids` order."""
+        if self._block_group_matrix is None:
+            columns = np.searchsorted(self.block_ids_2020, self.blocks_2020)
+            self._block_group_matrix = sparse.csr_matrix(
+                (np.ones(len(columns), dtype=np.int8), columns,
+                 np.asarray(self.block_group_offsets)),
+                shape=(len(self.block_group_ids), len(self.block_ids_2020)))
+        return self._block_group_matrix
+
+    def block_matrix(self, mode: str = 'max-weight') -> sparse.csr_matrix:
+        """The (2010 block × 2020 block) NHGIS matrix, with rows in
+        `block_ids_2010` order.
+
+        In 'fractional' mode entries are the NHGIS weights. In 'max-weight'
+        mode each 2010 block has a single 1 at its highest-weight 2020 block
+        (the lowest GEOID on ties).
+        """
+        if mode not in BLOCK_MATRIX_MODES:
+            raise ValueError(f'Unknown crosswalk mode {mode!r}')
+        if mode not in self._block_matrices:
+            offsets = np.asarray(self.block_offsets)
+            weights = np.asarray(self.nhgis_weights)
+            columns = np.searchsorted(self.block_ids_2020,
+                                      self.nhgis_blocks_2020)
+            shape = (len(self.block_ids_2010), len(self.block_ids_2020))
+            if mode == 'fractional':
+                matrix = sparse.csr_matrix((weights, columns, offsets),
+                                           shape=shape)
+            else:
+                rows = np.repeat(np.arange(shape[0]), np.diff(offsets))
+                row_max = (np.maximum.reduceat(weights, offsets[:-1])
+                           if len(weights) else weights)
+                best = np.flatnonzero(weights == row_max[rows])
+                _, first = np.unique(rows[best], return_index=True)
+                matrix = sparse.csr_matrix(
+                    (np.ones(shape[0], dtype=np.int8), columns[best[first]],
+                     np.arange(shape[0] + 1)),
+                    shape=shape)
+            self._block_matrices[mode] = matrix
+        return self._block_matrices[mode]
+
+    def vtd_matrix(self) -> sparse.csr_matrix:
+        """The 0/1 (VTD × 2020 block) incidence matrix, with rows in
+        `vtd_ids` order."""
+        if self._vtd_matrix is None:
+            self._vtd_matrix = sparse.csr_matrix(
+                (np.ones(len(self.vtd_blocks_2020), dtype=np.int8),
+                 np.searchsorted(self.block_ids_2020, self.vtd_blocks_2020),
+                 np.asarray(self.vtd_offsets)),
+                shape=(len(self.vtd_ids), len(self.block_ids_2020)))
+        return self._vtd_matrix
+
+    @staticmethod
+    def _translate(membership, incidence: sparse.csr_matrix,
+                   rows: np.ndarray) -> sparse.csr_matrix:
+        translated = binary_membership(membership) @ incidence[rows]
+        return binary_membership(translated)
+
+    def translate_block_groups(
+            self, membership,
+            block_groups: Sequence) -> Tuple[sparse.csr_matrix, np.ndarray]:
+        """Translates a whole COI × 2010 block group membership matrix.
+
+        :param membership: A (COIs × block groups) 0/1 matrix (dense or
+          sparse), such as the tile columns of a lookup table.
+        :param block_groups: The block group GEOIDs labeling its columns.
+        :return: A 0/1 (COIs × 2020 blocks) CSR matrix and its column labels
+          (`block_ids_2020`).
+        """
+        rows = geoid_positions(block_groups, self.block_group_ids)
+        return (self._translate(membership, self.block_group_matrix(), rows),
+                self.block_ids_2020)
+
+    def translate_blocks(
+            self,
+            membership,
+            blocks: Sequence,
+            mode: str = 'max-weight') -> Tuple[sparse.csr_matrix, np.ndarray]:
+        """Translates a whole COI × 2010 block membership matrix through the
+        NHGIS crosswalk (see `block_matrix` for the modes).
+
+        In 'max-weight' mode the result is 0/1. In 'fractional' mode entry
+        (i, j) is the total weight COI i's 2010 blocks place on 2020 block j.
+        """
+        rows = geoid_positions(blocks, self.block_ids_2010)
+        translated = binary_membership(membership) @ self.block_matrix(
+            mode)[rows]
+        if mode == 'max-weight':
+            translated = binary_membership(translated)
+        return translated, self.block_ids_2020
+
+    def translate_vtds(self, membership,
+                       vtds: Sequence) -> Tuple[sparse.csr_matrix, np.ndarray]:
+        """Translates a whole COI × VTD membership matrix; see
+        `translate_block_groups`."""
+        if self._vtd_positions is None:
+            self._vtd_positions = {
+                vtd: index
+                for index, vtd in enumerate(self.vtd_ids.tolist())
+            }
+        rows = np.array([self._vtd_positions[vtd] for vtd in vtds],
+                        dtype=np.int64)
+        return (self._translate(membership, self.vtd_matrix(), rows),
+                self.block_ids_2020)
 
     def map_2010_block_groups(self, bgs):
-        return set.union(*(self.block_group_2010_to_blocks_2020[bg]
-                           for bg in bgs))
+        blocks = np.concatenate(
+            [self.blocks_for_block_group(bg) for bg in bgs])
+        return set(self._geoid_strings(np.unique(blocks)))
 
     def map_vtds(self, vtds):
         return set.union(*(self.vtd_to_blocks_2020[vtd] for vtd in vtds))
+
+
+class CrosswalkStore:
+    """Per-state crosswalks stored as memory-mapped shards under `root`.
+
+    Each state's `Crosswalk` is saved in `root/<state FIPS>` (see `add`) and
+    memory-mapped on first access. At most `max_resident` states are kept
+    open; the least recently used one is dropped when another is loaded.
+
+    >>> store = CrosswalkStore('crosswalks')
+    >>> store.add('26', Crosswalk(block_crosswalk_path, vtd_crosswalk_path))
+    >>> store['26'].map_2010_block_groups(bgs)
+    """
+    def __init__(self, root: str, max_resident: int = 4):
+        self.root = root
+        self.max_resident = max_resident
+        self._resident = OrderedDict()
+
+    @staticmethod
+    def _fips(state) -> str:
+        return str(int(state)).zfill(2)
+
+    def _shard_path(self, state) -> str:
+        return os.path.join(self.root, self._fips(state))
+
+    @property
+    def states(self) -> list:
+        """FIPS codes of the states with a stored shard."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if name.isdigit())
+
+    @property
+    def resident(self) -> list:
+        """FIPS codes of the currently loaded states, least recent first."""
+        return list(self._resident)
+
+    def add(self, state, crosswalk: Crosswalk):
+        """Stores `crosswalk` as the shard for `state`, replacing any
+        existing one."""
+        shard_path = self._shard_path(state)
+        self._resident.pop(self._fips(state), None)
+        if os.path.isdir(shard_path):
+            for name in SHARD_ARRAYS:
+                os.remove(os.path.join(shard_path, f'{name}.npy'))
+            os.rmdir(shard_path)
+        os.makedirs(self.root, exist_ok=True)
+        crosswalk.save(shard_path)
+
+    def __contains__(self, state) -> bool:
+        return os.path.isdir(self._shard_path(state))
+
+    def __getitem__(self, state) -> Crosswalk:
+        fips = self._fips(state)
+        if fips in self._resident:
+            self._resident.move_to_end(fips)
+            return self._resident[fips]
+        if fips not in self:
+            raise KeyError(state)
+        crosswalk = Crosswalk.load(self._shard_path(fips))
+        self._resident[fips] = crosswalk
+        while len(self._resident) > self.max_resident:
+            self._resident.popitem(last=False)
+        return crosswalk
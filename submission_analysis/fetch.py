@@ -7,10 +7,37 @@ import requests
 import json
 import csv
 import io
+import warnings
 import pydantic
 from pydantic import BaseModel
-from datetime import datetime as dt
-from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+from urllib3.util.retry import Retry
+from submission_analysis.plan_cache import PlanCache
+from submission_analysis.submission_store import SubmissionStore
+
+PLAN_READ_URL = "https://districtr.org/.netlify/functions/planRead?id=%s"
+# TODO: temp fix for the purposes of user-agent api call barrier
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_6) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.101 Safari/537.36'}
+# number of planRead calls in flight at once
+DEFAULT_CONCURRENCY = 16
+# (connect, read) timeout in seconds for each request
+DEFAULT_TIMEOUT = (10, 60)
+Timeout = Union[float, Tuple[float, float]]
+# portal datetimes look like JavaScript's Date.toString(); the timezone name
+# in parentheses is dropped and the GMT offset kept
+PORTAL_DATETIME_PATTERN = r'^(\w{3} \w{3} \d{1,2} \d{4} \d{1,2}:\d{2}:\d{2}) GMT([+-]\d{4})'
+PORTAL_DATETIME_FORMAT = '%a %b %d %Y %H:%M:%S %z'
+# query parameter giving the offset of a page of portal csv rows
+CSV_START_PARAM = 'start'
+# columns identifying a portal csv row, in order of preference
+CSV_KEY_COLUMNS = ('id', 'link')
+# portal csv columns that are always text, so their types need not be inferred
+PORTAL_CSV_DTYPES = {'link': str, 'type': str, 'datetime': str, 'text': str}
+# number of newly read plans written to the plan cache at a time
+CACHE_BATCH_SIZE = 256
 
 class Submission(pydantic.BaseModel):
     """
@@ -23,21 +50,55 @@ class Submission(pydantic.BaseModel):
     id: str
 
 def submissions(ids_url: str, plans_url: str, cois_url: str,
-               wr_url: str) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+               wr_url: str, concurrency: int = DEFAULT_CONCURRENCY,
+               plan_read_url: str = PLAN_READ_URL,
+               cache: Optional[PlanCache] = None) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
     Takes in endpoint for all districtr ids in a portal along with csv api  ...
     calls for plans, cois, and written submissions, and retrieves filled pd ...
     dataframes for each submission type with metadata and districtr assignments
     """
-    submissions = retrieve_submission_ids_json(ids_url)
-    submissions.sort(key=lambda x: str(x.id)) # sorts submission jsons by id
+    submissions = retrieve_submission_ids_json(ids_url, concurrency,
+                                               plan_read_url=plan_read_url,
+                                               cache=cache)
+    plans_df = csv_read(plans_url) # gathers plan metadata in df
+    cois_df = csv_read(cois_url) # gathers coi metadata in df
+    written_df = csv_read(wr_url) # gathers written metadata in df
+    return assemble_submissions(submissions, plans_df, cois_df, written_df)
+
+def submission_store(ids_url: str, concurrency: int = DEFAULT_CONCURRENCY,
+                     plan_read_url: str = PLAN_READ_URL,
+                     cache: Optional[PlanCache] = None,
+                     outdir: Optional[str] = None) -> SubmissionStore:
+    """
+    Takes in endpoint for all districtr ids in a portal, and returns its ...
+    districtr plans as normalized columnar tables (see submission_store), ...
+    saved as parquet in outdir if given
+    """
+    submissions = retrieve_submission_ids_json(ids_url, concurrency,
+                                               plan_read_url=plan_read_url,
+                                               cache=cache)
+    store = SubmissionStore.from_submissions(submissions)
+    if outdir is not None:
+        store.save(outdir)
+    return store
+
+def assemble_submissions(submissions: list, plans_df: pd.DataFrame,
+                         cois_df: pd.DataFrame, written_df: pd.DataFrame
+                         ) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Takes in the Submission objects of a portal and its raw plan, coi and ...
+    written csv metadata, and joins them into the dataframes returned by ...
+    submissions
+    """
+    submissions = sorted(submissions, key=lambda x: str(x.id)) # sorts submission jsons by id
     plan_submissions = [sub.districtr_plan for sub in submissions #filters plan
                                                     if sub.plan_type == "plan"]
     coi_submissions = [sub.districtr_plan for sub in submissions #filters cois
                                                     if sub.plan_type == "coi"]
-    plans_df = csv_read(plans_url) # gathers plan metadata in df
-    cois_df = csv_read(cois_url) # gathers coi metadata in df
-    written_df = csv_read(wr_url) # gathers written metadata in df
+    plans_df = plans_df.copy()
+    cois_df = cois_df.copy()
+    written_df = written_df.copy()
     assert len(plan_submissions) == len(plans_df)
     assert len(coi_submissions) == len(cois_df)
     # parse for plan id and add in submission dfs
@@ -51,73 +112,226 @@ def submissions(ids_url: str, plans_url: str, cois_url: str,
     # join in districtr json assignments into 'districtr_data column'
     plans_df['districtr_data'] = plan_submissions
     cois_df['districtr_data'] = coi_submissions
-    # make datetime fields parseable:
-    plans_df['datetime'] = plans_df['datetime'].map( lambda datetime: (
-        datetime.split("+")[0] + " +" + datetime.split("+")[1].split(" ")[0]))
-    cois_df['datetime'] = cois_df['datetime'].map( lambda datetime: (
-        datetime.split("+")[0] + " +" + datetime.split("+")[1].split(" ")[0]))
-    written_df['datetime'] = written_df['datetime'].map( lambda datetime: (
-        datetime.split("+")[0] + " +" + datetime.split("+")[1].split(" ")[0]))
-    # # convert datetime fields from str's to datetime objects in all dataframe
-    plans_df['datetime'] = plans_df['datetime'].map(lambda datetime: (
-                                dt.strptime(datetime, '%a %b %d %Y %X %Z %z')))
-    cois_df['datetime'] = cois_df['datetime'].map(lambda datetime: (
-                                dt.strptime(datetime, '%a %b %d %Y %X %Z %z')))
-    written_df['datetime'] = written_df['datetime'].map(lambda datetime: (
-                                dt.strptime(datetime, '%a %b %d %Y %X %Z %z')))
+    # convert portal datetime strings to tz-aware datetimes
+    plans_df['datetime'] = parse_portal_datetimes(plans_df['datetime'])
+    cois_df['datetime'] = parse_portal_datetimes(cois_df['datetime'])
+    written_df['datetime'] = parse_portal_datetimes(written_df['datetime'])
     # return relevant dataframes
     return plans_df, cois_df, written_df
 
-def plan_read(plan_id: int) -> dict: #(dict: json obj)#
+def parse_portal_datetimes(datetimes: pd.Series) -> pd.Series:
+    """
+    takes in a column of portal datetime strings, like ...
+    'Mon Jun 14 2021 16:05:12 GMT+0000 (Coordinated Universal Time)', and ...
+    returns them as tz-aware datetimes at their own GMT offset, as the ...
+    per-row strptime parse did (a column mixing offsets stays object dtype)
+    """
+    parts = datetimes.astype(str).str.extract(PORTAL_DATETIME_PATTERN)
+    return pd.to_datetime(parts[0] + " " + parts[1],
+                          format=PORTAL_DATETIME_FORMAT)
+
+def make_session(retries: int = 5, backoff_factor: float = 0.5,
+                 pool_size: int = DEFAULT_CONCURRENCY) -> requests.Session:
+    """
+    returns a requests session that keeps connections alive (up to pool_size...
+    per host) and retries failed GETs (connection errors, 429s and 5xxs) with...
+    exponential backoff
+    """
+    retry = Retry(total=retries, backoff_factor=backoff_factor,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(['GET']))
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size,
+                          pool_maxsize=pool_size)
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def plan_read(plan_id: int, session: Optional[requests.Session] = None,
+              plan_read_url: str = PLAN_READ_URL,
+              timeout: Timeout = DEFAULT_TIMEOUT) -> dict: #(dict: json obj)#
     """
     takes in plan_id string, makes api call w/ plan_id to the planRead funct...
     in netlify, and returns the data associated with the plan_id in JSON format
     """
-    url = "https://districtr.org/.netlify/functions/planRead?id=%s" % plan_id
-    r = requests.get(url)
+    url = plan_read_url % plan_id
+    r = (requests if session is None else session).get(url, timeout=timeout)
     data = json.loads(r.text)
     return data
 
-def retrieve_submission_ids_json(url: str) -> list: #list: list[Submission]
+def plan_reads(plan_ids: Iterable, concurrency: int = DEFAULT_CONCURRENCY,
+               session: Optional[requests.Session] = None,
+               plan_read_url: str = PLAN_READ_URL,
+               timeout: Timeout = DEFAULT_TIMEOUT,
+               cache: Optional[PlanCache] = None) -> List[dict]:
     """
-    retrieveSubmissionJson takes a url (an endpoint to a given state's...
-    submission portal), returns a list of filled Submission objects
+    calls plan_read for every id with up to `concurrency` requests in flight...
+    over one shared session, and returns the plans in the order of plan_ids.
+    If a cache is given, cached plans are not refetched and successfully ...
+    read plans are added to it
+    """
+    plan_ids = [str(plan_id) for plan_id in plan_ids]
+    plans = {} if cache is None else cache.get_many(plan_ids)
+    missing = [plan_id for plan_id in dict.fromkeys(plan_ids)
+               if plan_id not in plans]
+    if missing:
+        if session is None:
+            session = make_session(pool_size=concurrency)
+        batch = {}
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for plan_id, plan in zip(missing, executor.map(
+                    lambda plan_id: plan_read(plan_id, session, plan_read_url,
+                                              timeout), missing)):
+                plans[plan_id] = batch[plan_id] = plan
+                if cache is not None and len(batch) == CACHE_BATCH_SIZE:
+                    cache.put_many(batch)
+                    batch = {}
+        if cache is not None:
+            cache.put_many(batch)
+    return [plans[plan_id] for plan_id in plan_ids]
+
+def prefetch(plan_ids: Iterable, cache: PlanCache,
+             concurrency: int = DEFAULT_CONCURRENCY,
+             plan_read_url: str = PLAN_READ_URL) -> dict:
+    """
+    reads every plan not yet in the cache into it, and returns the cache's ...
+    hit/miss statistics
+    """
+    plan_reads(plan_ids, concurrency, plan_read_url=plan_read_url, cache=cache)
+    return cache.stats()
+
+def submission_ids(url: str, session: Optional[requests.Session] = None,
+                   timeout: Timeout = DEFAULT_TIMEOUT
+                   ) -> Tuple[List[str], List[str], List[str]]:
+    """
+    takes a url (an endpoint to a given state's submission portal), and ...
+    returns the districtr links, plan types and plan ids of its submissions
     """
-    # TODO: temp fix for the purposes of user-agent api call barrier
-    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_6) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.101 Safari/537.36'}  
-    r = requests.get(url, headers=headers)
+    if session is None:
+        session = make_session()
+    r = session.get(url, timeout=timeout)
     subs_json = json.loads(r.text)
-    submissions = []
-    for ids in subs_json['ids']:
-        # Phase 1, retrieve link, id, type of plan
-        plan_link = ids['link']
-        plan_id = plan_link.split("/")[-1].split("?")[0]
-        plan_type = ids['type']
-        # Phase 2, fill submission with phase 1 + the ditrictr plan(assignment)
-        submissions.append(
-                Submission(link=plan_link, plan_type=plan_type,
-                           id=plan_id, districtr_plan=plan_read(plan_id)))
-    return submissions
-
-def csv_read(url: str) -> pd.DataFrame:
+    links = [ids['link'] for ids in subs_json['ids']]
+    plan_types = [ids['type'] for ids in subs_json['ids']]
+    plan_ids = [link.split("/")[-1].split("?")[0] for link in links]
+    return links, plan_types, plan_ids
+
+def retrieve_submission_ids_json(url: str,
+                                 concurrency: int = DEFAULT_CONCURRENCY,
+                                 session: Optional[requests.Session] = None,
+                                 plan_read_url: str = PLAN_READ_URL,
+                                 timeout: Timeout = DEFAULT_TIMEOUT,
+                                 cache: Optional[PlanCache] = None) -> list: #list: list[Submission]
+    """
+    retrieveSubmissionJson takes a url (an endpoint to a given state's...
+    submission portal), returns a list of filled Submission objects. The ...
+    districtr plans are read concurrently (see plan_reads)
+    """
+    if session is None:
+        session = make_session(pool_size=concurrency)
+    # Phase 1, retrieve link, id, type of plan
+    links, plan_types, plan_ids = submission_ids(url, session, timeout)
+    # Phase 2, fill submission with phase 1 + the ditrictr plan(assignment)
+    plans = plan_reads(plan_ids, concurrency, session, plan_read_url, timeout,
+                       cache)
+    return [Submission(link=plan_link, plan_type=plan_type,
+                       id=plan_id, districtr_plan=plan)
+            for plan_link, plan_type, plan_id, plan
+            in zip(links, plan_types, plan_ids, plans)]
+
+def csv_pages(url: str, page_length: Optional[int] = None,
+              dtype: Optional[dict] = PORTAL_CSV_DTYPES,
+              session: Optional[requests.Session] = None,
+              timeout: Timeout = DEFAULT_TIMEOUT) -> Iterator[pd.DataFrame]:
+    """
+    takes in a portal csv url and yields its rows one page at a time, so ...
+    memory is bounded by the page size. Pages are requested with the url's ...
+    `start` and `length` parameters (page_length defaults to the url's ...
+    length); paging stops at a short page, or with a warning at a page with...
+    no unseen ids, or links (or, without either column, a page repeating the...
+    previous one): an endpoint that ignores `start`, whose remaining rows ...
+    cannot be read. Each response is parsed as it streams in
+    """
+    if session is None:
+        session = make_session()
+    parts = urlparse(url)
+    query = dict(parse_qsl(parts.query))
+    if page_length is None and 'length' not in query:
+        yield read_csv_response(session.get(url, stream=True, timeout=timeout),
+                                dtype)
+        return
+    # the first page is the url as given, unless a page length was asked for
+    page_url = url if page_length is None else None
+    page_length = page_length or int(query['length'])
+    start = int(query.get(CSV_START_PARAM, 0))
+    seen = set()
+    previous_digest = None
+    while True:
+        if page_url is None:
+            query.update({CSV_START_PARAM: start, 'length': page_length})
+            page_url = urlunparse(parts._replace(query=urlencode(query)))
+        page = read_csv_response(
+            session.get(page_url, stream=True, timeout=timeout), dtype)
+        page_url = None
+        num_rows = len(page)
+        key = next((column for column in CSV_KEY_COLUMNS if column in page), None)
+        if key is not None:
+            keys = page[key].astype(str)
+            new = ~keys.isin(seen).to_numpy()
+            seen.update(keys)
+            repeated = num_rows and not new.any()
+            page = page[new]
+        else:
+            digest = pd.util.hash_pandas_object(page, index=False).sum()
+            repeated = num_rows and digest == previous_digest
+            previous_digest = digest
+        if repeated:
+            warnings.warn(f'{url} repeated its rows at start={start} '
+                          f'(does it ignore `{CSV_START_PARAM}`?); rows '
+                          f'past the first {start} may be missing')
+            return
+        yield page
+        if num_rows < page_length:
+            return
+        start += page_length
+
+def read_csv_response(r: requests.Response, dtype: Optional[dict] = None
+                      ) -> pd.DataFrame:
+    """parses a streamed csv response without buffering its whole body"""
+    r.raise_for_status()
+    r.raw.decode_content = True
+    try:
+        return pd.read_csv(r.raw, dtype=dtype, encoding='utf-8')
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+    finally:
+        r.close()
+
+def csv_read(url: str, page_length: Optional[int] = None,
+             dtype: Optional[dict] = PORTAL_CSV_DTYPES) -> pd.DataFrame:
     """
     takes in a url (api endpt to query on given submission portal) to find  ...
     in csv form data from the portal, and returns a pandas dataframe filled ...
-    with the portal info
+    with the portal info. When a state has more rows than the url's length,...
+    the remaining rows are read page by page (see csv_pages)
     """
-    # TODO: temp fix for the purposes of user-agent api call barrier
-    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_6) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.101 Safari/537.36'}  
-    r = requests.get(url, headers=headers).content
-    read_file = pd.read_csv(io.StringIO(r.decode('utf-8')))
+    pages = list(csv_pages(url, page_length, dtype))
+    read_file = pd.concat(pages, ignore_index=True) if len(pages) > 1 else pages[0]
     return read_file
 
-def coi_submissions(ids_url: str, cois_url: str) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+def coi_submissions(ids_url: str, cois_url: str,
+                    concurrency: int = DEFAULT_CONCURRENCY,
+                    plan_read_url: str = PLAN_READ_URL,
+                    cache: Optional[PlanCache] = None) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
     Takes in endpoint for only coi districtr ids in a portal along with csv api ...
     calls for cois retrieves filled pd dataframes for each coi submission with...
     metadata and districtr assignments
     """
-    submissions = retrieve_submission_ids_json(ids_url)
+    submissions = retrieve_submission_ids_json(ids_url, concurrency,
+                                               plan_read_url=plan_read_url,
+                                               cache=cache)
     submissions.sort(key=lambda x: str(x.id)) # sorts submission jsons by id
     coi_submissions = [sub.districtr_plan for sub in submissions #filters cois
                                                     if sub.plan_type == "coi"]
@@ -130,11 +344,7 @@ def coi_submissions(ids_url: str, cois_url: str) -> Tuple[pd.DataFrame, pd.DataF
     cois_df = cois_df.sort_values(by=['plan_id'], ascending=True)
     # join in districtr json assignments into 'districtr_data column'
     cois_df['districtr_data'] = coi_submissions
-    # make datetime fields parseable:
-    cois_df['datetime'] = cois_df['datetime'].map( lambda datetime: (
-        datetime.split("+")[0] + " +" + datetime.split("+")[1].split(" ")[0]))
-    # # convert datetime fields from str's to datetime objects in all dataframe
-    cois_df['datetime'] = cois_df['datetime'].map(lambda datetime: (
-                                dt.strptime(datetime, '%a %b %d %Y %X %Z %z')))
+    # convert portal datetime strings to tz-aware datetimes
+    cois_df['datetime'] = parse_portal_datetimes(cois_df['datetime'])
     # return relevant dataframes
     return cois_df
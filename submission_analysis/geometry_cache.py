@@ -0,0 +1,93 @@
+"""Local GeoParquet copies of unit shapefiles.
+
+The pipeline reads the same Census TIGER and mggg-states shapefile zips
+(mostly over the network) in every map and lookup table step. A
+`GeometryCache` reads each shapefile once and keeps it as
+`<root>/<state>/<unit>-<link digest>.parquet`, which loads many times faster
+than re-parsing the zip. File names depend only on the link, state and unit,
+so a cache directory can be copied to a machine without network access and
+opened with `offline=True`, in which case a missing file is an error instead
+of a download.
+
+>>> cache = GeometryCache('geometry_cache')
+>>> shp = cache.read(coi_maps.unit_shapefile_link('Ohio', 'blockgroups'),
+...                  'Ohio', 'blockgroups', id_columns=['GEOID10'])
+"""
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyarrow.parquet as pq
+from typing import Iterable, Optional
+
+DEFAULT_GEOMETRY_CACHE_DIR = 'geometry_cache'
+# Number of link digest hex characters kept in cache file names.
+LINK_DIGEST_LENGTH = 16
+
+
+def cast_unit_ids(ids: pd.Series) -> pd.Series:
+    """Casts a shapefile id column to int64 (so GEOIDs lose leading zeros
+    and match districtr's tile ids); non-numeric ids are left as they are."""
+    try:
+        return ids.astype(np.int64)
+    except (ValueError, TypeError):
+        return ids
+
+
+class GeometryCache:
+    def __init__(self, root: str = DEFAULT_GEOMETRY_CACHE_DIR,
+                 offline: bool = False):
+        # absolute, so scripts that chdir keep using the same cache
+        self.root = os.path.abspath(root)
+        self.offline = offline
+
+    def path(self, link: str, state: Optional[str] = None,
+             unit: Optional[str] = None) -> str:
+        """The cache file for a shapefile link."""
+        digest = hashlib.sha256(link.encode()).hexdigest()[:LINK_DIGEST_LENGTH]
+        state_dir = (state or '_').lower().replace(' ', '_')
+        name = unit or os.path.splitext(os.path.basename(link.split('?')[0]))[0]
+        return os.path.join(self.root, state_dir, f'{name}-{digest}.parquet')
+
+    def fetch(self, link: str, state: Optional[str] = None,
+              unit: Optional[str] = None) -> str:
+        """Makes sure `link` is cached and returns its cache file."""
+        path = self.path(link, state, unit)
+        if os.path.exists(path):
+            return path
+        if self.offline:
+            raise FileNotFoundError(
+                f"{link} ({state} {unit}) is not in the geometry cache at "
+                f"{self.root} and the cache is offline")
+        shp = gpd.read_file(link)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp{os.getpid()}'
+        shp.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        return path
+
+    def read(self, link: str, state: Optional[str] = None,
+             unit: Optional[str] = None,
+             id_columns: Iterable[str] = ()) -> gpd.GeoDataFrame:
+        """
+        Reads a shapefile through the cache. Those of `id_columns` that are
+        present are cast to int64 where possible (see `cast_unit_ids`), so
+        callers can tell numeric ids by their dtype instead of casting them.
+        """
+        shp = gpd.read_parquet(self.fetch(link, state, unit))
+        for column in set(id_columns) & set(shp.columns):
+            shp[column] = cast_unit_ids(shp[column])
+        return shp
+
+    def read_attributes(self, link: str, state: Optional[str] = None,
+                        unit: Optional[str] = None) -> pd.DataFrame:
+        """Reads only the non-geometry columns of a cached shapefile."""
+        path = self.fetch(link, state, unit)
+        schema = pq.read_schema(path)
+        geo = json.loads((schema.metadata or {}).get(b'geo', b'{}'))
+        geometry_columns = set(geo.get('columns', {})) | {'geometry'}
+        columns = [name for name in schema.names
+                   if name not in geometry_columns]
+        return pq.read_table(path, columns=columns).to_pandas()
@@ -0,0 +1,73 @@
+"""The census geography hierarchy above 2010 blocks, from GEOIDs alone.
+
+Census blocks nest exactly in block groups, tracts, counties and states, and
+a block's GEOID starts with each of its ancestors' GEOIDs (2 digits for the
+state, 5 for the county, 11 for the tract, 12 for the block group). So the
+blocks in any of those units can be found from the block id column without
+touching geometry, and a whole COI × block group lookup table expands to
+blocks with one sparse product.
+
+>>> hierarchy = CensusHierarchy(blocks['GEOID10'])
+>>> block_membership = hierarchy.expand(bg_membership, bg_ids, 'blockgroup')
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from typing import Dict, Sequence
+from submission_analysis.crosswalk import binary_membership
+
+GEOID_LENGTHS = {
+    'state': 2,
+    'county': 5,
+    'tract': 11,
+    'blockgroup': 12,
+    'block': 15,
+}
+
+
+def int_geoids(ids: Sequence) -> np.ndarray:
+    """Casts GEOIDs to int64; ids that are not numeric become -1."""
+    numeric = pd.to_numeric(pd.Series(ids, dtype=object), errors='coerce')
+    return numeric.fillna(-1).to_numpy(dtype=np.int64)
+
+
+class CensusHierarchy:
+    def __init__(self, block_geoids: Sequence):
+        self.block_geoids = int_geoids(block_geoids)
+        self._parents: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.block_geoids)
+
+    def parents(self, level: str) -> np.ndarray:
+        """Each block's GEOID at `level` (as int64)."""
+        if level not in self._parents:
+            digits = GEOID_LENGTHS['block'] - GEOID_LENGTHS[level]
+            self._parents[level] = np.where(self.block_geoids >= 0,
+                                            self.block_geoids // 10**digits, -1)
+        return self._parents[level]
+
+    def expansion_matrix(self, ids: Sequence,
+                         level: str = 'blockgroup') -> sparse.csr_matrix:
+        """The 0/1 (`ids` × blocks) matrix of which blocks nest in which of
+        the units `ids` at `level`."""
+        geoids = int_geoids(ids)
+        # give non-numeric ids distinct keys that no block parent can match
+        geoids = np.where(geoids >= 0, geoids, -2 - np.arange(len(geoids)))
+        rows = pd.Index(geoids).get_indexer(self.parents(level))
+        blocks = np.flatnonzero(rows >= 0)
+        return sparse.csr_matrix(
+            (np.ones(len(blocks), dtype=np.int8), (rows[blocks], blocks)),
+            shape=(len(ids), len(self)))
+
+    def nested(self, ids: Sequence, level: str = 'blockgroup') -> np.ndarray:
+        """Whether each of `ids` contains at least one of the blocks."""
+        geoids = int_geoids(ids)
+        return (geoids >= 0) & np.isin(geoids, self.parents(level))
+
+    def expand(self, membership, ids: Sequence,
+               level: str = 'blockgroup') -> sparse.csr_matrix:
+        """Expands a (COIs × `ids`) membership matrix of units at `level`
+        to a 0/1 (COIs × blocks) CSR matrix."""
+        return binary_membership(
+            binary_membership(membership) @ self.expansion_matrix(ids, level))
@@ -0,0 +1,229 @@
+"""Sparse COI lookup tables.
+
+A lookup table has one row per drawn COI (indexed `<plan_id>-<part + 1>`)
+and one 0/1 column per tile, after three text columns (`submission_text`,
+`area_text`, `area_name`). Almost every cell is 0, so a `LookupTable` keeps
+the text columns in a `metadata` frame and the memberships in a CSR matrix
+over `tiles`, built in one shot from a `SubmissionStore`'s assignment rows.
+
+>>> table = LookupTable.from_store(SubmissionStore.from_frame(cois_df),
+...                                cois_df.set_index('plan_id')['text'], tiles)
+>>> table.to_frame()             # sparse-backed wide frame
+>>> table.to_csv('lookup.csv')   # the usual wide csv
+
+Tables are stored compactly with `save` as a directory (`ohio.lookup`)
+holding `metadata.parquet`, the CSR matrix (`matrix.npz`) and the tile ids
+(`tiles.npy`). `read_lookup_table` reads either that or a wide csv, and
+`convert_lookup_csv` converts existing wide csvs:
+
+    python -m submission_analysis.lookup ohio_lookup_table.csv
+"""
+import argparse
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from scipy import sparse
+from typing import Iterable, Optional
+from submission_analysis.submission_store import SubmissionStore
+
+METADATA_COLUMNS = ['submission_text', 'area_text', 'area_name']
+# Number of rows densified at a time when writing (or read at a time when
+# reading) the wide csv.
+CSV_CHUNK_ROWS = 256
+LOOKUP_SUFFIX = '.lookup'
+METADATA_FILE = 'metadata.parquet'
+MATRIX_FILE = 'matrix.npz'
+TILES_FILE = 'tiles.npy'
+
+
+@dataclass
+class LookupTable:
+    metadata: pd.DataFrame
+    matrix: sparse.csr_matrix
+    tiles: pd.Index
+
+    @staticmethod
+    def from_store(store: SubmissionStore,
+                   texts: Optional[pd.Series] = None,
+                   tiles: Iterable[str] = ()) -> 'LookupTable':
+        """
+        Builds a lookup table from the assignments in `store`. Rows follow
+        the store's plan order and, within a plan, the order in which each
+        part is first assigned. `texts` maps plan ids to submission text.
+        Columns are `tiles` followed by any assigned tiles missing from it,
+        in the order they are first seen.
+        """
+        asn = store.assignments
+        plan_ids = asn['plan_id'].astype(str).to_numpy()
+        parts = asn['part'].to_numpy(dtype=np.int64)
+        keys = pd.MultiIndex.from_arrays([plan_ids, parts])
+        first = ~keys.duplicated()
+        row_keys = keys[first]
+        rows = row_keys.get_indexer(keys)
+
+        tile_index = pd.Index(tiles, dtype=object).unique()
+        asn_tiles = asn['tile'].astype(str).to_numpy()
+        cols = tile_index.get_indexer(asn_tiles)
+        missing = cols < 0
+        if missing.any():
+            extra = pd.unique(asn_tiles[missing])
+            tile_index = tile_index.append(pd.Index(extra, dtype=object))
+            cols[missing] = tile_index.get_indexer(asn_tiles[missing])
+
+        matrix = sparse.coo_matrix(
+            (np.ones(len(rows), dtype=np.int8), (rows, cols)),
+            shape=(len(row_keys), len(tile_index))).tocsr()
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+
+        row_plans = row_keys.get_level_values(0)
+        row_parts = row_keys.get_level_values(1)
+        part_info = store.parts.dropna(subset=['part']).assign(
+            plan_id=lambda p: p['plan_id'].astype(str),
+            part=lambda p: p['part'].astype(np.int64)).drop_duplicates(
+                ['plan_id', 'part'], keep='last').set_index(['plan_id', 'part'])
+        info = part_info.reindex(row_keys)
+        if texts is not None:
+            texts = texts[~texts.index.duplicated()]
+            texts.index = texts.index.astype(str)
+            submission_text = texts.reindex(row_plans).to_numpy()
+        else:
+            submission_text = np.full(len(row_keys), "", dtype=object)
+        metadata = pd.DataFrame({
+            'submission_text': submission_text,
+            'area_text': info['description'].fillna("").to_numpy(),
+            'area_name': info['name'].fillna("").to_numpy(),
+        }, index=[f'{plan_id}-{part + 1}'
+                  for plan_id, part in zip(row_plans, row_parts)])
+        return LookupTable(metadata, matrix, tile_index)
+
+    @staticmethod
+    def from_frame(frame: pd.DataFrame) -> 'LookupTable':
+        """Reads a wide lookup frame (dense or sparse-backed); cells equal to
+        1 are memberships. Missing text columns are filled with ""."""
+        tiles = [column for column in frame.columns
+                 if column not in METADATA_COLUMNS]
+        values = frame[tiles]
+        if len(tiles) and all(isinstance(dtype, pd.SparseDtype)
+                              for dtype in values.dtypes):
+            matrix = values.sparse.to_coo().tocsr()
+            matrix.data = (matrix.data == 1).astype(np.int8)
+            matrix.eliminate_zeros()
+        else:
+            matrix = sparse.csr_matrix(values.to_numpy() == 1, dtype=np.int8)
+        metadata = pd.DataFrame({
+            column: frame[column] if column in frame else ""
+            for column in METADATA_COLUMNS
+        }, index=frame.index)
+        return LookupTable(metadata, matrix,
+                           pd.Index([str(tile) for tile in tiles], dtype=object))
+
+    @staticmethod
+    def from_csv(path: str, chunk_rows: int = CSV_CHUNK_ROWS) -> 'LookupTable':
+        """Reads a wide lookup csv `chunk_rows` rows at a time, so the dense
+        table is never in memory at once."""
+        chunks = [
+            LookupTable.from_frame(chunk) for chunk in pd.read_csv(
+                path, index_col=0, chunksize=chunk_rows)
+        ]
+        if not chunks:
+            return LookupTable.from_frame(pd.read_csv(path, index_col=0))
+        return LookupTable(
+            pd.concat([chunk.metadata for chunk in chunks]),
+            sparse.vstack([chunk.matrix for chunk in chunks],
+                          format='csr', dtype=np.int8), chunks[0].tiles)
+
+    @staticmethod
+    def load(directory: str) -> 'LookupTable':
+        """Reads a table written by `save`."""
+        metadata = pd.read_parquet(os.path.join(directory, METADATA_FILE))
+        matrix = sparse.load_npz(os.path.join(directory, MATRIX_FILE)).tocsr()
+        tiles = np.load(os.path.join(directory, TILES_FILE))
+        return LookupTable(metadata, matrix,
+                           pd.Index(tiles.astype(object), dtype=object))
+
+    def __len__(self) -> int:
+        return len(self.metadata)
+
+    def to_frame(self, sparse: bool = True) -> pd.DataFrame:
+        """The wide lookup frame; tile columns are sparse unless `sparse`
+        is False."""
+        if sparse:
+            tiles = pd.DataFrame.sparse.from_spmatrix(
+                self.matrix, index=self.metadata.index, columns=self.tiles)
+        else:
+            tiles = pd.DataFrame(self.matrix.toarray(),
+                                 index=self.metadata.index, columns=self.tiles)
+        return pd.concat([self.metadata, tiles], axis=1)
+
+    def to_csv(self, path: str, chunk_rows: int = CSV_CHUNK_ROWS):
+        """Writes the wide lookup csv, densifying `chunk_rows` rows at a
+        time."""
+        with open(path, 'w', newline='') as f:
+            if len(self) == 0:
+                pd.DataFrame(columns=METADATA_COLUMNS + list(self.tiles)).to_csv(f)
+            for start in range(0, len(self), chunk_rows):
+                stop = start + chunk_rows
+                chunk = pd.concat([
+                    self.metadata.iloc[start:stop],
+                    pd.DataFrame(self.matrix[start:stop].toarray(),
+                                 index=self.metadata.index[start:stop],
+                                 columns=self.tiles)
+                ], axis=1)
+                chunk.to_csv(f, header=start == 0)
+
+    def save(self, directory: str):
+        """Writes the compact format to `directory`, replacing it if it
+        exists. Files are written to a temporary sibling directory that is
+        renamed into place, so readers never see a partial table."""
+        tmp_directory = f'{directory}.tmp{os.getpid()}'
+        os.makedirs(tmp_directory, exist_ok=True)
+        self.metadata.to_parquet(os.path.join(tmp_directory, METADATA_FILE))
+        sparse.save_npz(os.path.join(tmp_directory, MATRIX_FILE),
+                        self.matrix.tocsr())
+        np.save(os.path.join(tmp_directory, TILES_FILE),
+                np.asarray(self.tiles, dtype=str))
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.rename(tmp_directory, directory)
+
+    def write(self, path: str):
+        """Writes the wide csv if `path` ends in .csv, and the compact
+        format otherwise."""
+        if path.lower().endswith('.csv'):
+            self.to_csv(path)
+        else:
+            self.save(path)
+
+
+def read_lookup_table(path: str,
+                      chunk_rows: int = CSV_CHUNK_ROWS) -> LookupTable:
+    """Reads a table saved with `LookupTable.save`, or a wide lookup csv."""
+    if os.path.isdir(path):
+        return LookupTable.load(path)
+    return LookupTable.from_csv(path, chunk_rows)
+
+
+def convert_lookup_csv(csv_path: str,
+                       directory: Optional[str] = None) -> str:
+    """Converts a wide lookup csv to the compact format, by default next to
+    it (`ohio_lookup_table.csv` → `ohio_lookup_table.lookup`), and returns
+    the directory written."""
+    if directory is None:
+        directory = os.path.splitext(csv_path)[0] + LOOKUP_SUFFIX
+    LookupTable.from_csv(csv_path).save(directory)
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Converts wide lookup table csvs to the compact format.')
+    parser.add_argument('csvs', nargs='+', help='wide lookup table csvs')
+    for csv_path in parser.parse_args().csvs:
+        print(f'{csv_path} -> {convert_lookup_csv(csv_path)}')
+
+
+if __name__ == '__main__':
+    main()
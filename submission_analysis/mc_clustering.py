@@ -1,8 +1,10 @@
 """Markov chain-based cluster refinement."""
-from copy import deepcopy
-from random import randrange, random, choice
-from typing import Callable, Dict, Set, Tuple, List
-from dataclasses import dataclass, field, InitVar
+import math
+import os
+import time
+from random import randrange, random, choice, getstate, setstate
+from typing import Callable, Dict, Set, Tuple, List, Optional
+from dataclasses import dataclass, field, fields, astuple, InitVar
 import numpy as np
 
 ChainParts = Dict[int, Set[int]]
@@ -15,40 +17,102 @@ ProposalFn = Callable[['ChainState'], 'ChainState']
 ScoreFn = Callable[['ChainState'], Score]
 ConstraintFn = Callable[['ChainState'], Probability]
 AcceptFn = Callable[['ChainState', 'ChainState'], Probability]
+StopFn = Callable[['ChainDiagnostics'], bool]
+ScheduleFn = Callable[['MarkovChain'], float]
 
 
 @dataclass(frozen=True)
 class ChainState:
-    """A state of a clustering Markov chain."""
+    """A state of a clustering Markov chain.
+
+    `proposal_ratio` is the Metropolis-Hastings correction
+    q(this state -> previous state) / q(previous state -> this state) for the
+    proposal that produced this state; it is 1 for symmetric proposals.
+
+    `size_counts` is a histogram of cluster sizes (size -> number of
+    clusters of that size) and `min_cluster_size` the smallest cluster size;
+    both are computed on construction and updated incrementally by `flip`.
+
+    States are never mutated after construction, so `flip` shares the sets
+    of untouched clusters with the new state.
+    """
     partitions: ChainParts
     assignment: ChainAssignment
     score_fns: Dict[str, ScoreFn]
     scores: Dict[str, Score] = field(default_factory=dict)
+    proposal_ratio: Probability = 1.
+    size_counts: Optional[Dict[int, int]] = None
+    min_cluster_size: Optional[int] = None
 
     def __post_init__(self):
+        if self.size_counts is None:
+            size_counts = {}
+            for indices in self.partitions.values():
+                size_counts[len(indices)] = size_counts.get(len(indices),
+                                                            0) + 1
+            object.__setattr__(self, 'size_counts', size_counts)
+            object.__setattr__(self, 'min_cluster_size', min(size_counts))
         for name, score_fn in self.score_fns.items():
             self.scores[name] = score_fn(self)
 
-    def flip(self, flips: Dict[int, int]) -> 'ChainState':
+    def flip(self,
+             flips: Dict[int, int],
+             proposal_ratio: Probability = 1.) -> 'ChainState':
         """Moves nodes between partitions."""
-        partitions = deepcopy(self.partitions)
-        assignment = deepcopy(self.assignment)
+        partitions = dict(self.partitions)
+        assignment = dict(self.assignment)
+        size_counts = dict(self.size_counts)
+        min_size = self.min_cluster_size
+        copied = set()
         for index, part in flips.items():
-            partitions[assignment[index]].remove(index)
+            source = assignment[index]
+            if source == part:
+                continue
+            for cluster in (source, part):
+                if cluster not in copied:
+                    partitions[cluster] = set(partitions[cluster])
+                    copied.add(cluster)
+            source_size = len(partitions[source])
+            target_size = len(partitions[part])
+            partitions[source].remove(index)
             partitions[part].add(index)
             assignment[index] = part
-        return self.__class__(partitions, assignment, self.score_fns)
+
+            # Each move changes two cluster sizes by one, so the minimum
+            # size changes by at most one.
+            for old_size, new_size in ((source_size, source_size - 1),
+                                       (target_size, target_size + 1)):
+                size_counts[old_size] -= 1
+                if size_counts[old_size] == 0:
+                    del size_counts[old_size]
+                size_counts[new_size] = size_counts.get(new_size, 0) + 1
+            if source_size - 1 < min_size:
+                min_size = source_size - 1
+            elif min_size not in size_counts:
+                min_size += 1
+        return self.__class__(partitions,
+                              assignment,
+                              self.score_fns,
+                              proposal_ratio=proposal_ratio,
+                              size_counts=size_counts,
+                              min_cluster_size=min_size)
 
     @staticmethod
-    def random(num_docs: int, num_clusters: int,
-               score_fns: Dict[str, ScoreFn]) -> 'ChainState':
-        """Generates a random partition of `num_docs` into `num_clusters`."""
-        assignment = {doc: randrange(num_clusters) for doc in range(num_docs)}
+    def from_assignment(assignment: ChainAssignment, num_clusters: int,
+                        score_fns: Dict[str, ScoreFn]) -> 'ChainState':
+        """Builds a state from a document -> cluster assignment."""
         partitions = {cluster: set() for cluster in range(num_clusters)}
         for doc, label in assignment.items():
             partitions[label].add(doc)
         return ChainState(partitions, assignment, score_fns)
 
+    @staticmethod
+    def random(num_docs: int, num_clusters: int,
+               score_fns: Dict[str, ScoreFn]) -> 'ChainState':
+        """Generates a random partition of `num_docs` into `num_clusters`."""
+        assignment = {doc: randrange(num_clusters) for doc in range(num_docs)}
+        return ChainState.from_assignment(assignment, num_clusters, score_fns)
+
 
 def single_flip_proposal(current: ChainState) -> ChainState:
     """Moves a single document to another cluster."""
@@ -61,9 +125,300 @@ def single_flip_proposal(current: ChainState) -> ChainState:
     return current.flip({index: next_partition})
 
 
+def nearest_neighbors(matrix: np.ndarray,
+                      k: int,
+                      similarity: bool = False,
+                      chunk_size: int = 1024) -> np.ndarray:
+    """Finds the `k` nearest documents to each document.
+
+    :param matrix: A pairwise distance (or similarity) matrix.
+    :param k: The number of neighbors to find per document.
+    :param similarity: If True, larger entries of `matrix` are nearer.
+    :param chunk_size: Rows processed at once (bounds temporary memory).
+    :return: A (number of documents × k) array of neighbor indices,
+      nearest first. A document is never its own neighbor.
+    """
+    num_docs = matrix.shape[0]
+    k = min(k, num_docs - 1)
+    assert k > 0
+    neighbors = np.empty((num_docs, k), dtype=np.int64)
+    for start in range(0, num_docs, chunk_size):
+        block = np.array(matrix[start:start + chunk_size], dtype=float)
+        if similarity:
+            block = -block
+        rows = np.arange(block.shape[0])
+        block[rows, rows + start] = np.inf
+        nearest = np.argpartition(block, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(block, nearest, axis=1),
+                           axis=1,
+                           kind='stable')
+        neighbors[start:start + chunk_size] = np.take_along_axis(
+            nearest, order, axis=1)
+    return neighbors
+
+
+def neighbor_flip_proposal(neighbors: np.ndarray,
+                           uniform_prob: float = 0.5,
+                           hastings: bool = True) -> ProposalFn:
+    """Creates a proposal that moves documents toward their neighbors.
+
+    A uniformly random document is moved into the cluster of one of its
+    neighbors, chosen uniformly among the distinct neighbor clusters other
+    than its own. With probability `uniform_prob` (or always, if all of its
+    neighbors already share its cluster) it is instead moved to a uniformly
+    random other cluster, which keeps the chain irreducible.
+
+    The proposal is not symmetric, so proposed states carry the
+    Metropolis-Hastings ratio in `proposal_ratio`. The correction heavily
+    penalizes moves out of clusters that hold none of a document's neighbors;
+    chains used purely as optimizers (rather than samplers) can disable it
+    with `hastings=False`.
+
+    :param neighbors: Neighbor indices, as returned by `nearest_neighbors`.
+    :param uniform_prob: Probability of falling back to a uniform move.
+    :param hastings: Whether to attach the Metropolis-Hastings correction.
+    """
+    neighbor_lists = [row.tolist() for row in neighbors]
+
+    def move_prob(candidates: Set[int], num_clusters: int,
+                  target: int) -> Probability:
+        uniform = 1 / (num_clusters - 1)
+        if not candidates:
+            return uniform
+        local = (target in candidates) / len(candidates)
+        return uniform_prob * uniform + (1 - uniform_prob) * local
+
+    def proposal_fn(current: ChainState) -> ChainState:
+        num_clusters = len(current.partitions)
+        assert num_clusters > 1
+        index = randrange(len(current.assignment))
+        curr_partition = current.assignment[index]
+        # Only `index` moves, and it is not its own neighbor, so the set of
+        # neighbor clusters is the same before and after the move.
+        neighbor_clusters = {
+            current.assignment[neighbor]
+            for neighbor in neighbor_lists[index]
+        }
+        candidates = neighbor_clusters - {curr_partition}
+        if candidates and random() >= uniform_prob:
+            next_partition = choice(sorted(candidates))
+        else:
+            next_partition = randrange(num_clusters - 1)
+            if next_partition >= curr_partition:
+                next_partition += 1
+        proposal_ratio = 1.
+        if hastings:
+            reverse_candidates = neighbor_clusters - {next_partition}
+            proposal_ratio = (
+                move_prob(reverse_candidates, num_clusters, curr_partition) /
+                move_prob(candidates, num_clusters, next_partition))
+        return current.flip({index: next_partition},
+                            proposal_ratio=proposal_ratio)
+
+    return proposal_fn
+
+
+@dataclass
+class RunningStats:
+    """Running mean, variance and lag-1 autocorrelation of a series.
+
+    Only a handful of sums are stored, so memory use is constant in the
+    length of the series. Values are shifted by the first observation before
+    they are accumulated to limit floating-point cancellation.
+    """
+    count: int = 0
+    shift: float = 0.
+    total: float = 0.
+    total_sq: float = 0.
+    total_lag: float = 0.
+    first: float = 0.
+    last: float = 0.
+
+    def push(self, value: float):
+        """Adds an observation."""
+        if self.count == 0:
+            self.shift = value
+        shifted = value - self.shift
+        if self.count == 0:
+            self.first = shifted
+        else:
+            self.total_lag += shifted * self.last
+        self.total += shifted
+        self.total_sq += shifted * shifted
+        self.last = shifted
+        self.count += 1
+
+    @property
+    def mean(self) -> float:
+        return self.shift + self.total / max(self.count, 1)
+
+    @property
+    def variance(self) -> float:
+        """The sample variance."""
+        if self.count < 2:
+            return 0.
+        centered_sq = self.total_sq - self.total**2 / self.count
+        return max(centered_sq, 0.) / (self.count - 1)
+
+    @property
+    def autocorrelation(self) -> float:
+        """The lag-1 autocorrelation."""
+        if self.count < 2:
+            return 0.
+        mean = self.total / self.count
+        centered_sq = self.total_sq - self.count * mean**2
+        if centered_sq <= 0:
+            return 1.
+        centered_lag = (self.total_lag - mean *
+                        (2 * self.total - self.first - self.last) +
+                        (self.count - 1) * mean**2)
+        return min(max(centered_lag / centered_sq, -1.), 1.)
+
+    @property
+    def effective_sample_size(self) -> float:
+        """Effective sample size under an AR(1) approximation of the series,
+        n (1 - ρ) / (1 + ρ), capped at n."""
+        rho = self.autocorrelation
+        if rho >= 1:
+            return 0.
+        return min(self.count * (1 - rho) / (1 + rho), float(self.count))
+
+
+@dataclass
+class ChainDiagnostics:
+    """Online convergence diagnostics for a `MarkovChain`.
+
+    Tracks the acceptance rate and `RunningStats` for every score, ignoring
+    the first `burn_in` steps.
+    """
+    burn_in: int = 0
+    steps: int = 0
+    samples: int = 0
+    accepted: int = 0
+    scores: Dict[str, RunningStats] = field(default_factory=dict)
+
+    def update(self, state: ChainState, accepted: bool):
+        """Records one step of the chain that ended in `state`."""
+        self.steps += 1
+        if self.steps <= self.burn_in:
+            return
+        self.samples += 1
+        self.accepted += accepted
+        for name, score in state.scores.items():
+            if name not in self.scores:
+                self.scores[name] = RunningStats()
+            self.scores[name].push(score)
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.accepted / max(self.samples, 1)
+
+    @property
+    def min_effective_sample_size(self) -> float:
+        """The smallest effective sample size over all scores."""
+        if not self.scores:
+            return 0.
+        return min(stats.effective_sample_size
+                   for stats in self.scores.values())
+
+
+def gelman_rubin(diagnostics: List[ChainDiagnostics], score: str) -> float:
+    """Computes the Gelman-Rubin potential scale reduction factor (R-hat)
+    of `score` across replica chains.
+
+    Values close to 1 indicate that the replicas have mixed. Returns infinity
+    until every replica has at least two samples.
+    """
+    stats = [diag.scores.get(score) for diag in diagnostics]
+    if len(stats) < 2 or any(s is None or s.count < 2 for s in stats):
+        return np.inf
+    n = np.mean([s.count for s in stats])
+    means = np.array([s.mean for s in stats])
+    within = np.mean([s.variance for s in stats])
+    between = n * means.var(ddof=1)
+    if within == 0:
+        return 1. if between == 0 else np.inf
+    pooled = (n - 1) / n * within + between / n
+    return float(np.sqrt(pooled / within))
+
+
+def ess_stopping_rule(min_ess: float,
+                      min_steps: int = 0,
+                      min_acceptance_rate: float = 0.) -> StopFn:
+    """Creates a stopping rule based on effective sample size.
+
+    The rule fires once at least `min_steps` steps have been taken, every
+    score has an effective sample size of at least `min_ess`, and (optionally)
+    the acceptance rate is at least `min_acceptance_rate` (which guards
+    against declaring a stuck chain converged)."""
+    def stop_fn(diagnostics: ChainDiagnostics) -> bool:
+        return (diagnostics.steps >= min_steps
+                and diagnostics.acceptance_rate >= min_acceptance_rate
+                and diagnostics.min_effective_sample_size >= min_ess)
+
+    return stop_fn
+
+
+def linear_schedule(beta_start: float, beta_end: float,
+                    num_steps: int) -> ScheduleFn:
+    """Creates an annealing schedule that moves β linearly from `beta_start`
+    to `beta_end` over `num_steps` steps, then holds it at `beta_end`."""
+    def schedule_fn(chain: 'MarkovChain') -> float:
+        progress = min(chain.step / num_steps, 1.)
+        return beta_start + (beta_end - beta_start) * progress
+
+    return schedule_fn
+
+
+def geometric_schedule(beta_start: float, beta_end: float,
+                       num_steps: int) -> ScheduleFn:
+    """Creates an annealing schedule that moves β geometrically from
+    `beta_start` to `beta_end` over `num_steps` steps, then holds it at
+    `beta_end`."""
+    ratio = beta_end / beta_start
+
+    def schedule_fn(chain: 'MarkovChain') -> float:
+        progress = min(chain.step / num_steps, 1.)
+        return beta_start * ratio**progress
+
+    return schedule_fn
+
+
+def adaptive_schedule(beta_start: float,
+                      target_rate: float,
+                      gain: float = 0.01) -> ScheduleFn:
+    """Creates a schedule that tunes β toward an acceptance rate.
+
+    After every accepted proposal, log β grows by `gain` × (1 - `target_rate`);
+    after every rejected one, it shrinks by `gain` × `target_rate`, so β
+    settles where the acceptance rate equals `target_rate`."""
+    def schedule_fn(chain: 'MarkovChain') -> float:
+        if chain.beta is None:
+            return beta_start
+        return chain.beta * math.exp(gain *
+                                     (chain.last_accepted - target_rate))
+
+    return schedule_fn
+
+
 @dataclass
 class MarkovChain:
-    """A Markov chain for clustering."""
+    """A Markov chain for clustering.
+
+    If `checkpoint_path` is set, the chain writes a checkpoint there at most
+    every `checkpoint_interval` seconds; see `checkpoint` and `resume`.
+    `objectives` lists (score name, flipped) pairs as in `accept_nd` and
+    determines which direction counts as "best" in `best_scores`.
+
+    Every step is recorded in `diagnostics`. If a `stopping_rule` is given,
+    the chain ends (and sets `converged`) as soon as the rule fires, even if
+    fewer than `length` steps have been taken.
+
+    If a `schedule` is given, it sets `beta` before every step, and `beta` is
+    passed to `accept_fn` as a third argument. So a schedule needs an
+    acceptance function that takes `beta`, like those built by `accept_nd`
+    (see `takes_beta`); other acceptance functions raise a `ValueError`.
+    """
     proposal_fn: ProposalFn
     score_fns: Dict[str, ScoreFn]
     accept_fn: AcceptFn
@@ -73,41 +428,223 @@ class MarkovChain:
     length: int
     step: int = 0
     state: ChainState = None
+    objectives: List[Tuple[str, bool]] = field(default_factory=list)
+    best_scores: Dict[str, Score] = field(default_factory=dict)
+    checkpoint_path: Optional[str] = None
+    checkpoint_interval: float = 30.
+    accepted: int = 0
+    diagnostics: ChainDiagnostics = field(default_factory=ChainDiagnostics)
+    stopping_rule: Optional[StopFn] = None
+    converged: bool = False
+    schedule: Optional[ScheduleFn] = None
+    beta: Optional[float] = None
+    last_accepted: bool = False
+    last_checkpoint: float = field(default=0., init=False, repr=False)
 
     def __post_init__(self):
-        self.state = ChainState.random(self.num_docs, self.num_clusters,
-                                       self.score_fns)
+        if self.state is None:
+            self.state = ChainState.random(self.num_docs, self.num_clusters,
+                                           self.score_fns)
+        self.check_schedule()
+        self.update_best_scores()
+        self.last_checkpoint = time.monotonic()
+
+    def check_schedule(self):
+        if self.schedule is not None and not takes_beta(self.accept_fn):
+            raise ValueError('A schedule needs an accept_fn that takes beta '
+                             '(see accept_nd and takes_beta)')
 
     def __iter__(self):
         return self
 
     def __next__(self):
-        if self.step == self.length:
+        if self.step == self.length or self.converged:
             raise StopIteration
         last_state = self.state
 
         proposal = self.proposal_fn(self.state)
-        acceptance_prob = self.accept_fn(self.state, proposal)
+        if self.schedule is None:
+            acceptance_prob = self.accept_fn(self.state, proposal)
+        else:
+            self.check_schedule()
+            self.beta = self.schedule(self)
+            acceptance_prob = self.accept_fn(self.state, proposal, self.beta)
+        acceptance_prob *= proposal.proposal_ratio
         for constraint in self.soft_constraints:
             acceptance_prob *= constraint(proposal)
-        if random() < acceptance_prob:
+        accepted = random() < acceptance_prob
+        if accepted:
             self.state = proposal
+            self.accepted += 1
+            self.update_best_scores()
 
         self.step += 1
+        self.last_accepted = accepted
+        self.diagnostics.update(self.state, accepted)
+        if self.stopping_rule is not None:
+            self.converged = self.stopping_rule(self.diagnostics)
+        if (self.checkpoint_path is not None and time.monotonic() -
+                self.last_checkpoint >= self.checkpoint_interval):
+            self.checkpoint(self.checkpoint_path)
         return last_state
 
+    def update_best_scores(self):
+        """Folds the current state's scores into `best_scores`."""
+        for name, flipped in self.objectives:
+            score = self.state.scores[name]
+            best = self.best_scores.get(name)
+            if best is None or (score > best if flipped else score < best):
+                self.best_scores[name] = score
+
+    def checkpoint(self, path: str):
+        """Saves the chain's position to `path` (a NumPy `.npz` archive).
+
+        The checkpoint holds the current assignment, the step and acceptance
+        counts, the best-seen scores, the convergence diagnostics, the
+        current β and the state of the `random` module, which drives every proposal and
+        acceptance draw. The file is written to a temporary path and moved
+        into place, so a job killed mid-write leaves the previous checkpoint
+        intact.
+        """
+        rng_version, rng_internal, rng_gauss = getstate()
+        assignment = np.fromiter(
+            (self.state.assignment[doc] for doc in range(self.num_docs)),
+            dtype=np.int32,
+            count=self.num_docs)
+        best_names = sorted(self.best_scores)
+        diagnostic_names = sorted(self.diagnostics.scores)
+        diagnostic_stats = np.array(
+            [astuple(self.diagnostics.scores[name])
+             for name in diagnostic_names],
+            dtype=float).reshape(len(diagnostic_names),
+                                 len(fields(RunningStats)))
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f,
+                     step=self.step,
+                     accepted=self.accepted,
+                     length=self.length,
+                     num_clusters=self.num_clusters,
+                     assignment=assignment,
+                     rng_version=rng_version,
+                     rng_internal=np.array(rng_internal, dtype=np.uint32),
+                     rng_gauss=np.nan if rng_gauss is None else rng_gauss,
+                     best_names=np.array(best_names, dtype=str),
+                     best_values=np.array(
+                         [self.best_scores[name] for name in best_names],
+                         dtype=float),
+                     converged=self.converged,
+                     beta=np.nan if self.beta is None else self.beta,
+                     last_accepted=self.last_accepted,
+                     diagnostic_counts=np.array([
+                         self.diagnostics.burn_in, self.diagnostics.steps,
+                         self.diagnostics.samples, self.diagnostics.accepted
+                     ]),
+                     diagnostic_names=np.array(diagnostic_names, dtype=str),
+                     diagnostic_stats=diagnostic_stats)
+        os.replace(tmp_path, path)
+        self.last_checkpoint = time.monotonic()
+
+    @classmethod
+    def resume(cls, path: str, proposal_fn: ProposalFn,
+               score_fns: Dict[str, ScoreFn], accept_fn: AcceptFn,
+               soft_constraints: List[ConstraintFn],
+               **kwargs) -> 'MarkovChain':
+        """Restores a chain from a checkpoint written by `checkpoint`.
+
+        Proposal, score, acceptance and constraint functions are closures and
+        are not stored in the checkpoint, so they must be supplied again with
+        the same configuration. Any other `MarkovChain` fields (such as
+        `objectives` or `checkpoint_path`) can be passed as keyword arguments.
+        The resumed chain continues exactly as the original run would have.
+        """
+        with np.load(path) as checkpoint:
+            num_clusters = int(checkpoint['num_clusters'])
+            assignment = dict(enumerate(checkpoint['assignment'].tolist()))
+            state = ChainState.from_assignment(assignment, num_clusters,
+                                               score_fns)
+            chain = cls(proposal_fn,
+                        score_fns,
+                        accept_fn,
+                        soft_constraints,
+                        num_docs=len(assignment),
+                        num_clusters=num_clusters,
+                        length=int(checkpoint['length']),
+                        step=int(checkpoint['step']),
+                        state=state,
+                        accepted=int(checkpoint['accepted']),
+                        **kwargs)
+            chain.best_scores = dict(
+                zip(checkpoint['best_names'].tolist(),
+                    checkpoint['best_values'].tolist()))
+            chain.converged = bool(checkpoint['converged'])
+            beta = float(checkpoint['beta'])
+            chain.beta = None if np.isnan(beta) else beta
+            chain.last_accepted = bool(checkpoint['last_accepted'])
+            burn_in, steps, samples, accepted = checkpoint[
+                'diagnostic_counts'].tolist()
+            chain.diagnostics = ChainDiagnostics(
+                burn_in, steps, samples, accepted, {
+                    name: RunningStats(int(values[0]), *values[1:])
+                    for name, values in zip(
+                        checkpoint['diagnostic_names'].tolist(),
+                        checkpoint['diagnostic_stats'].tolist())
+                })
+            rng_gauss = float(checkpoint['rng_gauss'])
+            setstate((int(checkpoint['rng_version']),
+                      tuple(checkpoint['rng_internal'].tolist()),
+                      None if np.isnan(rng_gauss) else rng_gauss))
+        return chain
+
+
+def run_replicas(chains: List[MarkovChain],
+                 max_rhat: float = 1.1,
+                 check_every: int = 100) -> bool:
+    """Runs replica chains in lock-step until they have mixed.
+
+    Every `check_every` steps, the Gelman-Rubin R-hat of each score is
+    computed across the replicas; the run stops once all of them are at most
+    `max_rhat` and every replica's own stopping rule (if any) has fired.
+    Otherwise, it stops when every replica has ended.
+
+    :return: Whether the replicas converged.
+    """
+    names = list(chains[0].score_fns)
+    # counted here rather than read off a chain, whose step stops moving
+    # once it has ended
+    iteration = 0
+    while True:
+        running = False
+        for chain in chains:
+            if chain.step < chain.length and not chain.converged:
+                next(chain)
+                running = True
+        iteration += 1
+        if iteration % check_every == 0 or not running:
+            satisfied = all(chain.converged or chain.stopping_rule is None
+                            for chain in chains)
+            diagnostics = [chain.diagnostics for chain in chains]
+            if satisfied and all(
+                    gelman_rubin(diagnostics, name) <= max_rhat
+                    for name in names):
+                return True
+        if not running:
+            return False
+
 
 def intracluster_score(dist_matrix: np.ndarray) -> ScoreFn:
     """Creates an average intracluster distance score from `distance_matrix."""
     def score_fn(state: ChainState) -> float:
-        score = 0
+        sums = []
         n_pairs = 0
         for indices in state.partitions.values():
-            for outer_index in indices:
-                for inner_index in indices:
-                    score += dist_matrix[outer_index, inner_index]
-                    n_pairs += 1
-        return score / max(n_pairs, 1)
+            indices = np.fromiter(indices, dtype=np.intp, count=len(indices))
+            # fsum is exactly rounded, so the score doesn't depend on set
+            # order (which differs between a chain and its resumed
+            # checkpoint).
+            sums.append(math.fsum(dist_matrix[np.ix_(indices, indices)].flat))
+            n_pairs += len(indices)**2
+        return math.fsum(sums) / max(n_pairs, 1)
 
     return score_fn
 
@@ -123,20 +660,36 @@ def accept_nd(scores: List[Tuple[str, bool]], beta: float) -> AcceptFn:
       `flipped`, its improvement ratio is (current score / proposal score);
       otherwise, its improvement ratio is (proposal score / current score).
     :param beta: Determines the propensity to reject (higher is pickier).
+      Chains with an annealing schedule override it on every step.
     :return: Probability of acceptance.
     """
-    def accept_fn(current: ChainState, proposed: ChainState) -> Probability:
-        min_ratio = min(
-            (proposed.scores[score] /
-             current.scores[score] if flipped else current.scores[score] /
-             proposed.scores[score]) for score, flipped in scores)
+    def accept_fn(current: ChainState,
+                  proposed: ChainState,
+                  beta: float = beta) -> Probability:
+        min_ratio = math.inf
+        for score, flipped in scores:
+            if flipped:
+                ratio = proposed.scores[score] / current.scores[score]
+            else:
+                ratio = current.scores[score] / proposed.scores[score]
+            if ratio < min_ratio:
+                min_ratio = ratio
         if min_ratio >= 1:
             return 1.
-        return np.exp(-beta / min_ratio)
+        # math.exp is much cheaper than np.exp on a Python float.
+        return math.exp(-beta / min_ratio)
 
+    accept_fn.takes_beta = True
     return accept_fn
 
 
+def takes_beta(accept_fn: AcceptFn) -> bool:
+    """Whether `accept_fn` takes β as a third argument, as the functions
+    built by `accept_nd` do. Other acceptance functions can declare it by
+    setting a `takes_beta` attribute."""
+    return getattr(accept_fn, 'takes_beta', False)
+
+
 def cluster_size_soft_constraint(ideal_cluster_size: int) -> AcceptFn:
     """Creates a soft constraint based on cluster size.
 
@@ -144,50 +697,141 @@ def cluster_size_soft_constraint(ideal_cluster_size: int) -> AcceptFn:
     accept with probability 1; otherwise, we accept with
     probability (min cluster size / `ideal_cluster_size`)."""
     def constraint_fn(state: ChainState) -> Probability:
-        min_cluster_size = len(min(state.partitions.values(), key=len))
-        if min_cluster_size >= ideal_cluster_size:
+        if state.min_cluster_size >= ideal_cluster_size:
             return 1.
-        return min_cluster_size / ideal_cluster_size
+        return state.min_cluster_size / ideal_cluster_size
 
     return constraint_fn
 
 
-def chain_1d(distance_matrix: np.ndarray, label: str, flipped: bool,
-             beta: float, num_clusters: int, length: int) -> MarkovChain:
-    """Creates a chain that optimizes a single score."""
+def checkpointed_chain(proposal_fn: ProposalFn, score_fns: Dict[str, ScoreFn],
+                       accept_fn: AcceptFn,
+                       soft_constraints: List[ConstraintFn], num_docs: int,
+                       num_clusters: int, length: int,
+                       objectives: List[Tuple[str, bool]],
+                       checkpoint_path: Optional[str] = None,
+                       schedule: Optional[ScheduleFn] = None,
+                       stopping_rule: Optional[StopFn] = None) -> MarkovChain:
+    """Creates a chain, resuming from `checkpoint_path` if it exists.
+
+    Rerunning a preempted job with the same arguments therefore picks up
+    where the last checkpoint left off. `schedule` and `stopping_rule` are
+    as in `MarkovChain`."""
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        return MarkovChain.resume(checkpoint_path,
+                                  proposal_fn,
+                                  score_fns,
+                                  accept_fn,
+                                  soft_constraints,
+                                  objectives=objectives,
+                                  checkpoint_path=checkpoint_path,
+                                  schedule=schedule,
+                                  stopping_rule=stopping_rule)
+    return MarkovChain(proposal_fn,
+                       score_fns,
+                       accept_fn,
+                       soft_constraints,
+                       num_docs,
+                       num_clusters,
+                       length,
+                       objectives=objectives,
+                       checkpoint_path=checkpoint_path,
+                       schedule=schedule,
+                       stopping_rule=stopping_rule)
+
+
+def chain_1d(distance_matrix: np.ndarray,
+             label: str,
+             flipped: bool,
+             beta: float,
+             num_clusters: int,
+             length: int,
+             checkpoint_path: Optional[str] = None,
+             proposal_fn: ProposalFn = single_flip_proposal,
+             schedule: Optional[ScheduleFn] = None,
+             stopping_rule: Optional[StopFn] = None) -> MarkovChain:
+    """Creates a chain that optimizes a single score.
+
+    A `schedule` anneals `beta` (which is then only the starting value if
+    the schedule ignores it); `stopping_rule` can end the chain early."""
     num_docs = distance_matrix.shape[0]
     score_fns = {label: intracluster_score(distance_matrix)}
-    accept_fn = accept_nd([(label, flipped)], beta)
+    objectives = [(label, flipped)]
+    accept_fn = accept_nd(objectives, beta)
     soft_constraints = [cluster_size_soft_constraint(num_docs / num_clusters)]
-    return MarkovChain(single_flip_proposal, score_fns, accept_fn,
-                       soft_constraints, num_docs, num_clusters, length)
-
-
-def geo_chain(distance_matrix: np.ndarray, beta: float, num_clusters: int,
-              length: int) -> MarkovChain:
-    """Creates a chain that minimizes intracluster geographical distances."""
-    return chain_1d(distance_matrix, 'geo', False, beta, num_clusters, length)
-
-
-def semantic_chain(similarity_matrix: np.ndarray, beta: float,
-                   num_clusters: int, length: int) -> MarkovChain:
-    """Creates a chain that maximizes intracluster semantic similarities."""
+    return checkpointed_chain(proposal_fn, score_fns, accept_fn,
+                              soft_constraints, num_docs, num_clusters, length,
+                              objectives, checkpoint_path, schedule,
+                              stopping_rule)
+
+
+def geo_proposal(distance_matrix: np.ndarray,
+                 neighbors: Optional[int]) -> ProposalFn:
+    """Uniform single flips, or neighbor flips over `neighbors` nearest
+    documents when `neighbors` is given."""
+    if neighbors is None:
+        return single_flip_proposal
+    return neighbor_flip_proposal(nearest_neighbors(distance_matrix,
+                                                    neighbors))
+
+
+def geo_chain(distance_matrix: np.ndarray,
+              beta: float,
+              num_clusters: int,
+              length: int,
+              checkpoint_path: Optional[str] = None,
+              neighbors: Optional[int] = None,
+              schedule: Optional[ScheduleFn] = None,
+              stopping_rule: Optional[StopFn] = None) -> MarkovChain:
+    """Creates a chain that minimizes intracluster geographical distances.
+
+    If `neighbors` is given, proposals move documents into clusters of their
+    `neighbors` nearest documents (see `neighbor_flip_proposal`). `schedule`
+    and `stopping_rule` are as in `chain_1d`."""
+    return chain_1d(distance_matrix, 'geo', False, beta, num_clusters, length,
+                    checkpoint_path, geo_proposal(distance_matrix, neighbors),
+                    schedule, stopping_rule)
+
+
+def semantic_chain(similarity_matrix: np.ndarray,
+                   beta: float,
+                   num_clusters: int,
+                   length: int,
+                   checkpoint_path: Optional[str] = None,
+                   schedule: Optional[ScheduleFn] = None,
+                   stopping_rule: Optional[StopFn] = None) -> MarkovChain:
+    """Creates a chain that maximizes intracluster semantic similarities.
+
+    `schedule` and `stopping_rule` are as in `chain_1d`."""
     return chain_1d(similarity_matrix, 'semantic', True, beta, num_clusters,
-                    length)
+                    length, checkpoint_path, schedule=schedule,
+                    stopping_rule=stopping_rule)
 
 
 def geo_semantic_chain(distance_matrix: np.ndarray,
-                       similarity_matrix: np.ndarray, beta: float,
-                       num_clusters: int, length: int) -> MarkovChain:
+                       similarity_matrix: np.ndarray,
+                       beta: float,
+                       num_clusters: int,
+                       length: int,
+                       checkpoint_path: Optional[str] = None,
+                       neighbors: Optional[int] = None,
+                       schedule: Optional[ScheduleFn] = None,
+                       stopping_rule: Optional[StopFn] = None) -> MarkovChain:
     """Creates a chain that simultaneusly minimizes intracluster geographical
-    distances and maximizes intracluster semantic similarities."""
+    distances and maximizes intracluster semantic similarities.
+
+    `neighbors` enables geographic neighbor proposals, as in `geo_chain`;
+    `schedule` and `stopping_rule` are as in `chain_1d`."""
     assert distance_matrix.shape == similarity_matrix.shape
     num_docs = similarity_matrix.shape[0]
     score_fns = {
         'geo': intracluster_score(distance_matrix),
         'semantic': intracluster_score(similarity_matrix)
     }
-    accept_fn = accept_nd([('geo', False), ('semantic', True)], beta)
+    objectives = [('geo', False), ('semantic', True)]
+    accept_fn = accept_nd(objectives, beta)
     soft_constraints = [cluster_size_soft_constraint(num_docs / num_clusters)]
-    return MarkovChain(single_flip_proposal, score_fns, accept_fn,
-                       soft_constraints, num_docs, num_clusters, length)
+    return checkpointed_chain(geo_proposal(distance_matrix, neighbors),
+                              score_fns, accept_fn, soft_constraints, num_docs,
+                              num_clusters, length, objectives,
+                              checkpoint_path, schedule, stopping_rule)
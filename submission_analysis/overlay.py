@@ -0,0 +1,132 @@
+"""Geometric incidence matrices between two unit layers.
+
+Translating COIs from one unit type to another that does not nest in it
+(precincts to block groups, say) needs the geometric overlay of the two
+layers. `overlay_incidence` computes it once with a single bulk spatial
+index query, as a sparse (source units × target units) 0/1 matrix, so a
+whole lookup table is translated with one sparse product. Matrices are
+cached on disk by `cached_incidence`, keyed by a description of their
+inputs and by the source and target ids they must have.
+
+>>> incidence = cached_incidence('incidence_cache', {'state': 'ohio', ...},
+...     lambda: overlay_incidence(precincts, bgs, precincts['VTD'],
+...                               bgs['GEOID10'], min_overlap=0.01),
+...     precincts['VTD'], bgs['GEOID10'])
+>>> bg_membership = incidence.translate(precinct_membership, precinct_ids)
+"""
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from dataclasses import dataclass
+from scipy import sparse
+from typing import Callable, Optional, Sequence
+from submission_analysis.crosswalk import (binary_membership, load_arrays,
+                                           save_arrays)
+
+DEFAULT_INCIDENCE_CACHE_DIR = 'incidence_cache'
+INCIDENCE_ARRAYS = ('data', 'indices', 'indptr', 'shape', 'source_ids',
+                    'target_ids')
+
+
+@dataclass
+class Incidence:
+    matrix: sparse.csr_matrix
+    source_ids: np.ndarray
+    target_ids: np.ndarray
+
+    def translate(self, membership, ids: Sequence) -> sparse.csr_matrix:
+        """
+        Translates a (COIs × source units) membership matrix whose columns
+        are labeled `ids` to a 0/1 (COIs × `target_ids`) CSR matrix. Columns
+        whose ids are not source units are dropped.
+        """
+        rows = pd.Index(self.source_ids).get_indexer(
+            np.asarray(ids, dtype=str))
+        known = np.flatnonzero(rows >= 0)
+        membership = binary_membership(membership)[:, known]
+        return binary_membership(membership @ self.matrix[rows[known]])
+
+    def save(self, directory: str):
+        save_arrays({
+            'data': self.matrix.data,
+            'indices': self.matrix.indices,
+            'indptr': self.matrix.indptr,
+            'shape': np.array(self.matrix.shape),
+            'source_ids': self.source_ids,
+            'target_ids': self.target_ids,
+        }, directory)
+
+    @staticmethod
+    def load(directory: str) -> 'Incidence':
+        arrays = load_arrays(directory, INCIDENCE_ARRAYS)
+        matrix = sparse.csr_matrix(
+            (arrays['data'], arrays['indices'], arrays['indptr']),
+            shape=tuple(arrays['shape']))
+        return Incidence(matrix, arrays['source_ids'], arrays['target_ids'])
+
+
+def overlay_incidence(sources: gpd.GeoDataFrame, targets: gpd.GeoDataFrame,
+                      source_ids: Sequence, target_ids: Sequence,
+                      min_overlap: float = 0.) -> Incidence:
+    """
+    Returns which `targets` each of `sources` intersects. Sources sharing
+    an id are merged into one row. With `min_overlap` > 0, a pair only
+    counts if their intersection covers at least that fraction of the
+    target's area (so units that merely touch are left out).
+    """
+    targets = targets.to_crs(sources.crs)
+    source_rows, target_cols = targets.sindex.query(sources.geometry,
+                                                    predicate='intersects')
+    if min_overlap > 0:
+        source_geoms = sources.geometry.values[source_rows]
+        target_geoms = targets.geometry.values[target_cols]
+        overlap = shapely.area(shapely.intersection(source_geoms, target_geoms))
+        keep = overlap >= min_overlap * shapely.area(target_geoms)
+        source_rows, target_cols = source_rows[keep], target_cols[keep]
+    codes, unique_ids = pd.factorize(pd.Series(source_ids).astype(str))
+    matrix = sparse.coo_matrix(
+        (np.ones(len(source_rows), dtype=np.int8),
+         (codes[source_rows], target_cols)),
+        shape=(len(unique_ids), len(targets))).tocsr()
+    return Incidence(binary_membership(matrix),
+                     np.asarray(unique_ids, dtype=str),
+                     np.asarray(pd.Series(target_ids).astype(str), dtype=str))
+
+
+def cached_incidence(cache_dir: str, key: dict,
+                     build: Callable[[], Incidence],
+                     source_ids: Optional[Sequence] = None,
+                     target_ids: Optional[Sequence] = None) -> Incidence:
+    """
+    Returns `build()`, cached in `cache_dir` under the SHA-256 digest of
+    `key` (a JSON-serializable description of the inputs) and of the given
+    `source_ids` and `target_ids`. A cached matrix whose ids don't match
+    those given (say, because a shapefile changed under the same link) is
+    rebuilt.
+    """
+    # the ids as overlay_incidence keeps them (sources merged by id)
+    ids = {}
+    if source_ids is not None:
+        ids['source_ids'] = pd.unique(pd.Series(source_ids).astype(str))
+    if target_ids is not None:
+        ids['target_ids'] = pd.Series(target_ids).astype(str).to_numpy()
+    hasher = hashlib.sha256(json.dumps(key, sort_keys=True).encode())
+    for name, values in ids.items():
+        hasher.update(f'\0{name}\0'.encode())
+        hasher.update('\0'.join(values).encode())
+    path = os.path.join(cache_dir, hasher.hexdigest())
+    if os.path.isdir(path):
+        incidence = Incidence.load(path)
+        if all(np.array_equal(getattr(incidence, name), values.astype(str))
+               for name, values in ids.items()):
+            return incidence
+        shutil.rmtree(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    incidence = build()
+    incidence.save(path)
+    return incidence
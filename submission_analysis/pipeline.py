@@ -0,0 +1,174 @@
+"""A small stage-graph runner with content-hashed artifacts on disk.
+
+A pipeline is a list of `Stage`s, each a function of the outputs of earlier
+stages (`inputs`) and some keyword `params`. With an `artifact_dir`, every
+output is pickled to `<artifact_dir>/<stage>-<key>.pkl`, where the key
+hashes the stage's name, params and `version`, the source of the module
+defining its function (and of any `depends` modules or functions), and the
+content digests of its inputs. A rerun skips every stage whose artifact is already there, so a job
+that dies late resumes from the last finished stage, and a change anywhere
+only reruns the stages downstream of it. `volatile` stages (fetching a live
+portal, say) always run; if their output is unchanged, the stages after them
+are still skipped.
+
+Stages whose inputs are ready run together, in parallel when `processes`
+is above 1.
+
+>>> pipeline = Pipeline([
+...     Stage('fetch', fetch_cois, params={'state': 'ohio'}, volatile=True),
+...     Stage('pivot', pivot_cois, inputs=('fetch', ))
+... ], artifact_dir='artifacts', processes=2)
+>>> pipeline.run(['pivot'])['pivot']
+"""
+import hashlib
+import inspect
+import json
+import os
+import pickle
+from dataclasses import dataclass, field
+from types import ModuleType
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from pathos.multiprocessing import ProcessPool as Pool
+
+DEFAULT_ARTIFACT_DIR = 'pipeline_artifacts'
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable
+    inputs: Tuple[str, ...] = ()
+    params: Dict[str, Any] = field(default_factory=dict)
+    volatile: bool = False
+    depends: Tuple[Union[ModuleType, Callable], ...] = ()
+    version: str = ''
+
+    def code_digest(self) -> str:
+        """A digest of the source of the module defining the stage function
+        and of its `depends`, so edits to them (helpers included) invalidate
+        the stage's artifacts. Changes they can't see, like an edited data
+        file, need a new `version`."""
+        digest = hashlib.sha256(self.version.encode())
+        module = inspect.getmodule(self.fn)
+        for code in (self.fn if module is None else module, ) + self.depends:
+            try:
+                source = inspect.getsource(code)
+            except (OSError, TypeError):
+                source = getattr(code, '__qualname__', repr(code))
+            digest.update(source.encode())
+        return digest.hexdigest()
+
+
+def run_stage(fn: Callable, args: list, params: dict):
+    return fn(*args, **params)
+
+
+class Pipeline:
+    def __init__(self, stages: Iterable[Stage],
+                 artifact_dir: Optional[str] = None, processes: int = 1):
+        self.stages = {stage.name: stage for stage in stages}
+        for stage in self.stages.values():
+            missing = [name for name in stage.inputs if name not in self.stages]
+            if missing:
+                raise KeyError(f'{stage.name} depends on unknown stages {missing}')
+        self.artifact_dir = artifact_dir
+        self.processes = processes
+        self.ran = []      # stages computed by the last run
+        self.skipped = []  # stages found up to date by the last run
+
+    def waves(self, targets: Optional[Iterable[str]] = None) -> List[List[Stage]]:
+        """The stages needed for `targets` (default: all), grouped so each
+        group only depends on earlier groups."""
+        needed = set()
+        pending = list(self.stages if targets is None else targets)
+        while pending:
+            name = pending.pop()
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self.stages[name].inputs)
+        waves, done = [], set()
+        while len(done) < len(needed):
+            wave = [stage for name, stage in self.stages.items()
+                    if name in needed and name not in done
+                    and all(parent in done for parent in stage.inputs)]
+            if not wave:
+                raise ValueError('Pipeline stages form a cycle')
+            waves.append(wave)
+            done.update(stage.name for stage in wave)
+        return waves
+
+    def key(self, stage: Stage, digests: Dict[str, str]) -> str:
+        description = json.dumps({
+            'name': stage.name,
+            'code': stage.code_digest(),
+            'params': stage.params,
+            'inputs': [digests[name] for name in stage.inputs],
+        }, sort_keys=True, default=repr)
+        return hashlib.sha256(description.encode()).hexdigest()[:16]
+
+    def artifact_path(self, stage: Stage, key: str) -> str:
+        return os.path.join(self.artifact_dir, f'{stage.name}-{key}.pkl')
+
+    def _save(self, path: str, value) -> str:
+        """Pickles `value` to `path` (atomically) and returns its digest."""
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = hashlib.sha256(data).hexdigest()
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        for target, payload in ((path, data), (f'{path}.sha256', digest.encode())):
+            tmp_path = f'{target}.tmp{os.getpid()}'
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, target)
+        return digest
+
+    @staticmethod
+    def _load(path: str):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def run(self, targets: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Runs (or skips) the stages needed for `targets` and returns the
+        outputs of `targets` (default: every stage)."""
+        targets = list(self.stages if targets is None else targets)
+        values, digests, paths = {}, {}, {}
+        self.ran, self.skipped = [], []
+
+        def value(name):
+            if name not in values:
+                values[name] = self._load(paths[name])
+            return values[name]
+
+        for wave in self.waves(targets):
+            todo = []
+            for stage in wave:
+                key = self.key(stage, digests) if self.artifact_dir else None
+                path = self.artifact_path(stage, key) if self.artifact_dir else None
+                if (path is not None and not stage.volatile
+                        and os.path.exists(f'{path}.sha256')):
+                    with open(f'{path}.sha256') as f:
+                        digests[stage.name] = f.read()
+                    paths[stage.name] = path
+                    self.skipped.append(stage.name)
+                    print(f'{stage.name}: up to date')
+                else:
+                    todo.append((stage, path))
+            calls = [(stage.fn, [value(name) for name in stage.inputs],
+                      stage.params) for stage, _ in todo]
+            if self.processes > 1 and len(calls) > 1:
+                pool = Pool(nodes=min(self.processes, len(calls)))
+                try:
+                    outputs = pool.map(run_stage, *zip(*calls))
+                finally:
+                    pool.close()
+                    pool.join()
+                    pool.clear()
+            else:
+                outputs = [run_stage(*call) for call in calls]
+            for (stage, path), output in zip(todo, outputs):
+                print(f'{stage.name}: done')
+                self.ran.append(stage.name)
+                values[stage.name] = output
+                if path is not None:
+                    digests[stage.name] = self._save(path, output)
+                    paths[stage.name] = path
+        return {name: value(name) for name in targets}
@@ -0,0 +1,103 @@
+"""Lookup tables for submissions drawn on any unit type.
+
+Districtr submissions can be drawn on block groups, blocks, precincts or
+wards. `unit_lookup_tables` flattens a state's submissions once, buckets them
+by `units.id` and builds one sparse `LookupTable` per unit type against that
+unit's tile ids. Tile ids come from a `UnitIndex`, which reads each unit
+shapefile once and keeps only its id columns, so repeated pivots (cumulative
+and weekly tables, preferred units and precincts) share the download.
+
+>>> index = UnitIndex(coi_maps.unit_shapefile_link, coi_maps.geometry_cache)
+>>> tables = unit_lookup_tables(cois_df, index)
+>>> tables['blockgroups'].to_frame()
+"""
+import pandas as pd
+import geopandas as gpd
+from typing import Callable, Dict, Iterable, Optional
+from submission_analysis.geometry_cache import GeometryCache, cast_unit_ids
+from submission_analysis.lookup import LookupTable
+from submission_analysis.submission_store import SubmissionStore
+
+
+def unit_id_key(state: str, key: str) -> str:
+    """The shapefile column holding a unit's ids for districtr `key`."""
+    return "Code-2" if state == 'Wisconsin' else key
+
+
+class UnitIndex:
+    """
+    A cache of unit tile ids, keyed by (state, unit, id column).
+    `shapefile_link(state, unit)` gives the shapefile to read for a unit,
+    which is read through `geometry_cache` if one is given.
+    """
+    def __init__(self, shapefile_link: Callable[[str, str], str],
+                 geometry_cache: Optional[GeometryCache] = None):
+        self.shapefile_link = shapefile_link
+        self.geometry_cache = geometry_cache
+        self._attributes = {}
+        self._tiles = {}
+
+    def attributes(self, state: str, unit: str) -> pd.DataFrame:
+        """The non-geometry columns of a unit's shapefile."""
+        if (state, unit) not in self._attributes:
+            link = self.shapefile_link(state, unit)
+            if self.geometry_cache is not None:
+                attributes = self.geometry_cache.read_attributes(link, state, unit)
+            else:
+                attributes = pd.DataFrame(gpd.read_file(link).drop(
+                    columns='geometry', errors='ignore'))
+            self._attributes[state, unit] = attributes
+        return self._attributes[state, unit]
+
+    def tiles(self, state: str, unit: str, key: str) -> Optional[pd.Index]:
+        """
+        Returns a unit's tile ids (as strings) from its `key` column, falling
+        back from GEOID to GEOID10, or None if the shapefile has no such
+        column.
+        """
+        if (state, unit, key) not in self._tiles:
+            attributes = self.attributes(state, unit)
+            column = key
+            if column not in attributes and column == "GEOID":
+                column = "GEOID10"
+            if column not in attributes:
+                return None
+            tiles = pd.Index(cast_unit_ids(attributes[column]).astype(str))
+            self._tiles[state, unit, key] = tiles
+        return self._tiles[state, unit, key]
+
+
+def unit_lookup_tables(df: pd.DataFrame, index: UnitIndex,
+                       units: Optional[Iterable[str]] = None
+                       ) -> Dict[str, LookupTable]:
+    """
+    Builds a lookup table for each unit type the submissions in `df` were
+    drawn on (only for `units`, if given). Each unit's tile column is the
+    shapefile column named by its first submission's `idColumn`. Units whose
+    shapefile lacks that column are left out.
+    """
+    store = SubmissionStore.from_frame(df)
+    submissions = store.submissions
+    states = submissions['state'].dropna()
+    if len(states) == 0:
+        return {}
+    state = states.iloc[0]
+    texts = df.set_index('plan_id')['text'] if 'text' in df else None
+    buckets = dict(tuple(submissions.groupby('units', observed=True,
+                                             sort=False)))
+    tables = {}
+    for unit in (buckets if units is None else units):
+        if unit not in buckets:
+            print(f"No COIs submitted on {unit} yet in {state}")
+            continue
+        bucket = buckets[unit]
+        if state == "Wisconsin" and unit == "wards":
+            bucket = bucket[bucket['id_column'] != "GEOID10"]
+        key = unit_id_key(state, buckets[unit]['id_column'].iloc[0])
+        tiles = index.tiles(state, unit, key)
+        if tiles is None:
+            print(f"ERROR: {key} not in shapefile.")
+            continue
+        tables[unit] = LookupTable.from_store(store.select(bucket['plan_id']),
+                                              texts, tiles)
+    return tables
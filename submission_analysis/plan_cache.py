@@ -0,0 +1,91 @@
+"""Persistent on-disk store of districtr plan JSON keyed by plan id.
+
+Submitted plans never change, so once a plan has been read successfully it
+can be served from disk on every later run. Plans are stored zlib-compressed
+in a single sqlite file; failed reads are never cached, so they are retried
+on the next run.
+
+>>> cache = PlanCache('plans.sqlite')
+>>> plans_df, cois_df, written_df = fetch.submissions(..., cache=cache)
+>>> cache.stats()
+{'plans': 1523, 'hits': 1519, 'misses': 4, 'hit_rate': 0.997...}
+"""
+import json
+import sqlite3
+import zlib
+from typing import Dict, Iterable
+
+DEFAULT_PLAN_CACHE_PATH = 'plan_cache.sqlite'
+# districtr's planRead message for plans that were found.
+PLAN_FOUND_MSG = 'Plan successfully found'
+# sqlite's default limit on the number of host parameters in one statement.
+MAX_SQL_PARAMS = 999
+
+
+def is_found(plan: dict) -> bool:
+    """Returns whether a planRead response holds a plan (and so is cacheable)."""
+    return isinstance(plan, dict) and plan.get('msg') == PLAN_FOUND_MSG
+
+
+class PlanCache:
+    """A sqlite-backed plan id → districtr plan JSON store.
+
+    Hits and misses of `get_many` are counted so a run can report how much of
+    its fetching the cache saved.
+    """
+    def __init__(self, path: str = DEFAULT_PLAN_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS plans '
+                                '(id TEXT PRIMARY KEY, data BLOB NOT NULL)')
+        self.connection.commit()
+
+    def __len__(self) -> int:
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM plans').fetchone()[0]
+
+    def __contains__(self, plan_id) -> bool:
+        return self.connection.execute('SELECT 1 FROM plans WHERE id = ?',
+                                       (str(plan_id), )).fetchone() is not None
+
+    def get_many(self, plan_ids: Iterable) -> Dict[str, dict]:
+        """Returns the cached plans among `plan_ids`, keyed by id."""
+        plan_ids = list(dict.fromkeys(str(plan_id) for plan_id in plan_ids))
+        plans = {}
+        for start in range(0, len(plan_ids), MAX_SQL_PARAMS):
+            chunk = plan_ids[start:start + MAX_SQL_PARAMS]
+            rows = self.connection.execute(
+                'SELECT id, data FROM plans WHERE id IN ({})'.format(
+                    ','.join('?' * len(chunk))), chunk)
+            for plan_id, data in rows:
+                plans[plan_id] = json.loads(zlib.decompress(data))
+        self.hits += len(plans)
+        self.misses += len(plan_ids) - len(plans)
+        return plans
+
+    def put_many(self, plans: Dict[str, dict]) -> int:
+        """Stores the successfully read plans in `plans`; returns how many."""
+        rows = [(str(plan_id), zlib.compress(json.dumps(plan).encode()))
+                for plan_id, plan in plans.items() if is_found(plan)]
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO plans (id, data) VALUES (?, ?)', rows)
+        return len(rows)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+    def stats(self) -> dict:
+        return {
+            'plans': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+        }
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,240 @@
+"""Normalized columnar tables of districtr submissions.
+
+`fetch` returns each districtr plan as a nested JSON dict in a
+`districtr_data` column. A `SubmissionStore` flattens those dicts once into
+three tables that can be joined and grouped instead of walked row by row:
+
+* `submissions`: one row per plan (`plan_id`, `plan_type`, `msg`, `state`,
+  `units`, `id_column`, `has_assignment`, `num_parts`).
+* `parts`: one row per drawn part (`plan_id`, `part`, `position` in the
+  plan's part list, `name`, `description`).
+* `assignments`: one row per (tile, part) pair (`plan_id`, `tile`, `part`,
+  and `rank`, the part's position when a tile is assigned to several).
+
+`plan_id`, `tile` and the low-cardinality submission columns are
+categoricals. The tables are saved as parquet files in one directory.
+
+`classify` sorts the plans into invalid reads, COIs, single-district plans
+(pseudo-COIs) and plans from these tables, and `submission_kinds` tags the
+rows of a submissions frame with it.
+
+>>> store = SubmissionStore.from_frame(cois_df)
+>>> store.assignments.groupby('plan_id')['tile'].nunique()
+>>> plans_df[submission_kinds(plans_df) == 'pseudo_coi']
+"""
+import os
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from itertools import chain
+from typing import Iterable, List, Optional, Tuple
+from submission_analysis.plan_cache import PLAN_FOUND_MSG
+
+STORE_TABLES = ('submissions', 'parts', 'assignments')
+CATEGORICAL_COLUMNS = {
+    'submissions': ['plan_type', 'msg', 'state', 'units', 'id_column'],
+    'parts': ['plan_id'],
+    'assignments': ['plan_id', 'tile'],
+}
+# What `classify` tags each plan as.
+SUBMISSION_KINDS = ['invalid', 'coi', 'pseudo_coi', 'plan']
+
+
+def flatten_assignment(assignment: dict
+                       ) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """The tiles, parts and ranks of the (tile, part) pairs of a districtr
+    assignment; unassigned (None) parts are skipped."""
+    tiles = list(assignment)
+    try:
+        # the usual case: every tile is assigned to exactly one part
+        parts = np.fromiter(assignment.values(), dtype=np.int64,
+                            count=len(tiles))
+        return tiles, parts, np.zeros(len(tiles), dtype=np.int16)
+    except (TypeError, ValueError):
+        pass
+    values = [value if isinstance(value, list) else [value]
+              for value in assignment.values()]
+    lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+    parts = np.array(list(chain.from_iterable(values)), dtype=object)
+    # each part's position in its tile's list
+    ranks = np.arange(len(parts)) - np.repeat(np.cumsum(lengths) - lengths,
+                                              lengths)
+    assigned = np.not_equal(parts, None)
+    pair_tiles = np.repeat(np.array(tiles, dtype=object), lengths)[assigned]
+    return (pair_tiles.tolist(), parts[assigned].astype(np.int64),
+            ranks[assigned].astype(np.int16))
+
+
+@dataclass
+class SubmissionStore:
+    submissions: pd.DataFrame
+    parts: pd.DataFrame
+    assignments: pd.DataFrame
+
+    @staticmethod
+    def from_plans(plan_ids: Iterable[str],
+                   plans: Iterable[dict],
+                   plan_types: Optional[Iterable[str]] = None
+                   ) -> 'SubmissionStore':
+        """Flattens districtr planRead responses (as returned by
+        `fetch.plan_read`) into a store."""
+        plan_ids = [str(plan_id) for plan_id in plan_ids]
+        plans = list(plans)
+        if plan_types is None:
+            plan_types = [None] * len(plan_ids)
+        submissions = []
+        part_cols = {'plan_id': [], 'part': [], 'position': [], 'name': [],
+                     'description': []}
+        # per-plan chunks of the assignment columns
+        asn_counts, asn_tiles, asn_parts, asn_ranks = [], [], [], []
+        for plan_id, plan_type, response in zip(plan_ids, plan_types, plans):
+            response = response if isinstance(response, dict) else {}
+            plan = response.get('plan') or {}
+            parts = plan.get('parts') or []
+            assignment = plan.get('assignment')
+            submissions.append({
+                'plan_id': plan_id,
+                'plan_type': plan_type,
+                'msg': response.get('msg'),
+                'state': (plan.get('place') or {}).get('state'),
+                'units': (plan.get('units') or {}).get('id'),
+                'id_column': (plan.get('idColumn') or {}).get('key'),
+                'has_assignment': assignment is not None,
+                'num_parts': len(parts),
+            })
+            for position, part in enumerate(parts):
+                part_cols['plan_id'].append(plan_id)
+                part_cols['part'].append(part.get('id'))
+                part_cols['position'].append(position)
+                part_cols['name'].append(part.get('name', ""))
+                part_cols['description'].append(part.get('description', ""))
+            tiles, tile_parts, ranks = flatten_assignment(assignment or {})
+            asn_counts.append(len(tiles))
+            asn_tiles.extend(tiles)
+            asn_parts.append(tile_parts)
+            asn_ranks.append(ranks)
+
+        # plan ids are shared by every assignment row of a plan, so they are
+        # built as categorical codes rather than one string per row
+        unique_plan_ids = pd.Index(plan_ids).unique()
+        asn_plan_ids = pd.Categorical.from_codes(
+            np.repeat(unique_plan_ids.get_indexer(plan_ids), asn_counts),
+            categories=unique_plan_ids)
+        store = SubmissionStore(
+            submissions=pd.DataFrame(
+                submissions,
+                columns=['plan_id', 'plan_type', 'msg', 'state', 'units',
+                         'id_column', 'has_assignment', 'num_parts']),
+            parts=pd.DataFrame(part_cols),
+            assignments=pd.DataFrame({
+                'plan_id': asn_plan_ids,
+                'tile': pd.Series(asn_tiles, dtype=str),
+                'part': np.concatenate(asn_parts + [np.empty(0, np.int64)]),
+                'rank': np.concatenate(asn_ranks + [np.empty(0, np.int16)]),
+            }))
+        store.parts['part'] = pd.to_numeric(store.parts['part'],
+                                            errors='coerce').astype('Int64')
+        store.parts['position'] = store.parts['position'].astype(np.int32)
+        return store.categorize()
+
+    @staticmethod
+    def from_submissions(submissions: Iterable) -> 'SubmissionStore':
+        """Builds a store from `fetch.Submission` objects."""
+        submissions = list(submissions)
+        return SubmissionStore.from_plans(
+            [sub.id for sub in submissions],
+            [sub.districtr_plan for sub in submissions],
+            [sub.plan_type for sub in submissions])
+
+    @staticmethod
+    def from_frame(df: pd.DataFrame) -> 'SubmissionStore':
+        """Builds a store from the `plan_id` and `districtr_data` columns of
+        a `fetch.submissions` frame (rows without districtr data are
+        skipped)."""
+        has_plan = df['districtr_data'].map(lambda plan: isinstance(
+            plan, dict)) if 'districtr_data' in df else pd.Series(
+                False, index=df.index)
+        subset = df[has_plan]
+        return SubmissionStore.from_plans(
+            subset['plan_id'], subset['districtr_data'],
+            subset['type'] if 'type' in subset else None)
+
+    def categorize(self) -> 'SubmissionStore':
+        """Casts the store's categorical columns (in place); returns self."""
+        for table, columns in CATEGORICAL_COLUMNS.items():
+            df = getattr(self, table)
+            for column in columns:
+                df[column] = df[column].astype('category')
+        # share one plan_id vocabulary across tables so joins stay categorical
+        plan_ids = pd.Index(self.submissions['plan_id'].astype(str).unique())
+        for table in STORE_TABLES:
+            df = getattr(self, table)
+            if not (isinstance(df['plan_id'].dtype, pd.CategoricalDtype)
+                    and df['plan_id'].cat.categories.equals(plan_ids)):
+                df['plan_id'] = pd.Categorical(df['plan_id'].astype(str),
+                                               categories=plan_ids)
+        return self
+
+    def save(self, directory: str):
+        """Writes the tables as `<table>.parquet` files in `directory`."""
+        os.makedirs(directory, exist_ok=True)
+        for table in STORE_TABLES:
+            getattr(self, table).to_parquet(
+                os.path.join(directory, f'{table}.parquet'), index=False)
+
+    @staticmethod
+    def load(directory: str) -> 'SubmissionStore':
+        """Reads a store written by `save`."""
+        return SubmissionStore(**{
+            table: pd.read_parquet(os.path.join(directory, f'{table}.parquet'))
+            for table in STORE_TABLES
+        })
+
+    def select(self, plan_ids: Iterable[str]) -> 'SubmissionStore':
+        """The store restricted to `plan_ids` (rows keep their order)."""
+        plan_ids = pd.Index([str(plan_id) for plan_id in plan_ids])
+        return SubmissionStore(**{
+            table: getattr(self, table)[getattr(self, table)['plan_id'].astype(
+                str).isin(plan_ids)].reset_index(drop=True)
+            for table in STORE_TABLES
+        })
+
+    def first_parts(self) -> pd.DataFrame:
+        """The assignment rows giving each tile's first (or only) part."""
+        return self.assignments[self.assignments['rank'] == 0]
+
+    def classify(self) -> pd.DataFrame:
+        """One row per plan, indexed by plan id: whether districtr found it
+        (`valid`), how many distinct parts its tiles are (first) assigned
+        to (`districts`), and its `kind`: 'invalid' (not found), 'coi',
+        'pseudo_coi' (a plan drawn as a single district) or 'plan'. Found
+        plans of any other type have no kind."""
+        subs = self.submissions
+        plan_ids = pd.Index(subs['plan_id'].astype(str), name='plan_id')
+        first = self.first_parts()[['plan_id', 'part']].drop_duplicates()
+        districts = first['plan_id'].value_counts()
+        districts.index = districts.index.astype(str)
+        districts = districts.reindex(plan_ids).fillna(0).to_numpy(
+            dtype=np.int64)
+        valid = (subs['msg'].astype(object) == PLAN_FOUND_MSG).to_numpy()
+        plan_types = subs['plan_type'].astype(object).to_numpy()
+        is_plan = plan_types == 'plan'
+        kinds = np.select(
+            [~valid, plan_types == 'coi', is_plan & (districts == 1), is_plan],
+            SUBMISSION_KINDS, default=None)
+        return pd.DataFrame({
+            'valid': valid,
+            'districts': districts,
+            'kind': pd.Categorical(kinds, categories=SUBMISSION_KINDS),
+        }, index=plan_ids)
+
+
+def submission_kinds(df: pd.DataFrame) -> pd.Series:
+    """The `classify` kind of each row of a `fetch.submissions` frame;
+    rows without districtr data are 'invalid'."""
+    classes = SubmissionStore.from_frame(df).classify()
+    kinds = classes['kind'][~classes.index.duplicated()]
+    plan_ids = df['plan_id'].astype(str)
+    return pd.Series(kinds.reindex(plan_ids).to_numpy(), index=df.index,
+                     dtype=kinds.dtype).mask(~plan_ids.isin(kinds.index),
+                                             'invalid')
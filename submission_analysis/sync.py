@@ -0,0 +1,138 @@
+"""Incremental portal sync against a local per-state snapshot.
+
+A snapshot directory holds the raw plan, coi and written csv rows of one
+state's portal (`plan.csv`, `coi.csv`, `written.csv`) and the districtr JSON
+of its submissions (`plans.sqlite`, a `PlanCache`). Each sync reads the
+portal's id list and csv endpoints, calls planRead only for ids whose JSON is
+not in the snapshot, and merges the csv rows into the snapshot by `id`, so
+rows that have aged out of the endpoints' `length` window are kept. The csv
+endpoints list the newest rows first, so once there is a snapshot they are
+read `SYNC_PAGE_LENGTH` rows at a time, and paging stops once a page
+reaches back past the newest `datetime` already in the snapshot. Rows of plans and
+cois that are no longer listed by the id endpoint (moderated or removed)
+are dropped. The result is assembled exactly like `fetch.submissions`.
+
+>>> plans_df, cois_df, written_df = sync_submissions(
+...     'snapshots/ohio', *utils.submission_endpts('ohio')[:4])
+"""
+import json
+import os
+import pandas as pd
+from typing import Iterable, Optional, Tuple
+import submission_analysis.fetch as fetch
+from submission_analysis.plan_cache import PlanCache
+
+DEFAULT_SNAPSHOT_ROOT = 'snapshots'
+SNAPSHOT_TABLES = ('plan', 'coi', 'written')
+PLAN_CACHE_FILE = 'plans.sqlite'
+SNAPSHOT_META_FILE = 'snapshot.json'
+# rows per csv page when only rows newer than the snapshot are needed
+SYNC_PAGE_LENGTH = 100
+
+
+def merge_rows(snapshot_df: Optional[pd.DataFrame],
+               new_df: pd.DataFrame) -> pd.DataFrame:
+    """Merges freshly read csv rows into snapshot rows by `id`; fresh rows
+    replace stale copies (comment counts change over time)."""
+    if snapshot_df is None or len(snapshot_df) == 0:
+        return new_df.reset_index(drop=True)
+    kept = snapshot_df[~snapshot_df['id'].astype(str).isin(
+        new_df['id'].astype(str))]
+    return pd.concat([kept, new_df], ignore_index=True)
+
+
+def newest_datetime(df: Optional[pd.DataFrame]) -> Optional[pd.Timestamp]:
+    """The newest portal `datetime` among snapshot rows, if any."""
+    if df is None or len(df) == 0 or 'datetime' not in df:
+        return None
+    newest = fetch.parse_portal_datetimes(df['datetime']).max()
+    return None if pd.isna(newest) else newest
+
+
+def read_new_rows(url: str, since: Optional[pd.Timestamp] = None,
+                  session=None,
+                  page_length: int = SYNC_PAGE_LENGTH) -> pd.DataFrame:
+    """Reads a portal csv endpoint newest page first, `page_length` rows at
+    a time, stopping after the first page with a row older than `since`
+    (the snapshot already holds everything before it). Without `since`,
+    the whole endpoint is read in pages of the url's own length."""
+    pages = []
+    for page in fetch.csv_pages(url, page_length if since is not None else None,
+                                session=session):
+        pages.append(page)
+        if since is not None and 'datetime' in page and (
+                fetch.parse_portal_datetimes(page['datetime']) < since).any():
+            break
+    return pd.concat(pages, ignore_index=True) if len(pages) > 1 else pages[0]
+
+
+def listed_rows(df: pd.DataFrame, plan_ids: Iterable[str]) -> pd.DataFrame:
+    """The rows of `df` whose districtr link is one of `plan_ids`."""
+    if len(df) == 0 or 'link' not in df:
+        return df
+    link_ids = df['link'].astype(str).map(
+        lambda link: link.split("/")[-1].split("?")[0])
+    return df[link_ids.isin(set(plan_ids))].reset_index(drop=True)
+
+
+def write_csv(df: pd.DataFrame, path: str):
+    """Writes `df` to `path` via a temporary file, so an interrupted sync
+    leaves the previous snapshot intact."""
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot_table(snapshot_dir: str, table: str) -> Optional[pd.DataFrame]:
+    path = os.path.join(snapshot_dir, f'{table}.csv')
+    return pd.read_csv(path) if os.path.exists(path) else None
+
+
+def sync_submissions(snapshot_dir: str, ids_url: str, plans_url: str,
+                     cois_url: str, wr_url: str,
+                     concurrency: int = fetch.DEFAULT_CONCURRENCY,
+                     plan_read_url: str = fetch.PLAN_READ_URL,
+                     page_length: int = SYNC_PAGE_LENGTH,
+                     cache: Optional[PlanCache] = None
+                     ) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Brings the snapshot in `snapshot_dir` up to date with a portal and ...
+    returns the same (plans_df, cois_df, written_df) as fetch.submissions....
+    Plans are kept in the snapshot's own PlanCache unless `cache` is given.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    own_cache = cache is None
+    if own_cache:
+        cache = PlanCache(os.path.join(snapshot_dir, PLAN_CACHE_FILE))
+    session = fetch.make_session(pool_size=concurrency)
+    links, plan_types, plan_ids = fetch.submission_ids(ids_url, session)
+    plans = fetch.plan_reads(plan_ids, concurrency, session, plan_read_url,
+                             cache=cache)
+    submissions = [
+        fetch.Submission(link=link, plan_type=plan_type, id=plan_id,
+                         districtr_plan=plan)
+        for link, plan_type, plan_id, plan
+        in zip(links, plan_types, plan_ids, plans)
+    ]
+
+    tables = {}
+    for table, url in zip(SNAPSHOT_TABLES, (plans_url, cois_url, wr_url)):
+        snapshot_df = read_snapshot_table(snapshot_dir, table)
+        tables[table] = merge_rows(
+            snapshot_df,
+            read_new_rows(url, newest_datetime(snapshot_df), session,
+                          page_length))
+        if table != 'written':
+            # written submissions have no districtr plan to be listed by
+            tables[table] = listed_rows(tables[table], plan_ids)
+        write_csv(tables[table], os.path.join(snapshot_dir, f'{table}.csv'))
+    meta = {
+        'rows': {table: len(df) for table, df in tables.items()},
+        'plan_cache': cache.stats(),
+    }
+    with open(os.path.join(snapshot_dir, SNAPSHOT_META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+    if own_cache:
+        cache.close()
+    return fetch.assemble_submissions(submissions, tables['plan'],
+                                      tables['coi'], tables['written'])
@@ -2,6 +2,28 @@ import coi_final_report as coi_report
 import utils as utils
 import pandas as pd
 
+def districtr_row(row_id, plan_type, parts, assignment):
+    return {'id': row_id, 'type': plan_type, 'plan_id': f'p{row_id}',
+            'districtr_data': {'plan': {'parts': parts,
+                                        'assignment': assignment}}}
+
+def test_join_area_text_splits_multi_area_cois():
+    df = pd.DataFrame([
+        districtr_row(1, 'plan', [], {'a': 0, 'b': [0, 1]}),
+        districtr_row(2, 'plan', [], {'a': 0, 'b': 1}),
+        districtr_row(3, 'coi', [{'id': 0, 'name': 'A', 'description': 'x'},
+                                 {'id': 1, 'name': 'B'}], {'a': 0, 'b': 1}),
+        districtr_row(4, 'coi', [{'id': 0, 'name': 'C'}], {'a': 0}),
+        {'id': 5, 'type': 'written', 'plan_id': None, 'districtr_data': None},
+    ])
+    joined = coi_report.join_area_text(df)
+    assert list(joined['id']) == [1, 2, 4, 5, '3-1', '3-2']
+    assert list(joined['area_name'].fillna('-')) == ['-', '-', 'C', '-', 'A', 'B']
+    assert list(joined['area_text'].fillna('-')) == ['-', '-', '', '-', 'x', '']
+    assert list(joined['num_areas'].fillna(0)) == [1, 0, 1, 0, 2, 2]
+    assert list(joined['pseudo_coi'].fillna(False)) == [True, False, False,
+                                                        False, False, False]
+
 def test_join_area_text():
     # df = pd.read_csv("test_MI_data.csv")
     # state = "michigan"
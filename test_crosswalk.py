@@ -0,0 +1,180 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from submission_analysis.crosswalk import Crosswalk, CrosswalkStore, file_digest
+
+
+def write_block_crosswalk(path, num_rows=500, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        'STATE_2010': 6,
+        'COUNTY_2010': rng.integers(1, 4, num_rows),
+        'TRACT_2010': rng.integers(100, 103, num_rows),
+        'BLK_2010': rng.integers(1000, 3000, num_rows),
+        'STATE_2020': 6,
+        'COUNTY_2020': rng.integers(1, 4, num_rows),
+        'TRACT_2020': rng.integers(100, 103, num_rows),
+        'BLK_2020': rng.integers(1000, 3000, num_rows),
+        'AREALAND_INT': rng.integers(0, 1000, num_rows),
+    })
+    frame.to_csv(path, sep='|', index=False)
+    return frame
+
+
+def block_ids(frame, year):
+    return (frame[f'STATE_{year}'].astype(str).str.zfill(2) +
+            frame[f'COUNTY_{year}'].astype(str).str.zfill(3) +
+            frame[f'TRACT_{year}'].astype(str).str.zfill(6) +
+            frame[f'BLK_{year}'].astype(str).str.zfill(4))
+
+
+def test_block_groups_match_string_construction(tmp_path):
+    path = str(tmp_path / 'blocks.txt')
+    frame = write_block_crosswalk(path)
+    expected = {}
+    for block_2010, block_2020 in zip(block_ids(frame, 2010),
+                                      block_ids(frame, 2020)):
+        expected.setdefault(block_2010[:12], set()).add(block_2020)
+
+    crosswalk = Crosswalk(path)
+    assert crosswalk.block_group_2010_to_blocks_2020 == expected
+    some_bgs = sorted(expected)[:3]
+    assert crosswalk.map_2010_block_groups(some_bgs) == set.union(
+        *(expected[bg] for bg in some_bgs))
+
+
+def test_cache_is_reused(tmp_path):
+    path = str(tmp_path / 'blocks.txt')
+    write_block_crosswalk(path)
+    cache_dir = str(tmp_path / 'cache')
+    first = Crosswalk(path, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    second = Crosswalk(path, cache_dir=cache_dir)
+    assert isinstance(second.blocks_2020, np.memmap)
+    assert (first.block_group_2010_to_blocks_2020 ==
+            second.block_group_2010_to_blocks_2020)
+
+    # rewriting the file recompiles it; verifying keys on its contents
+    write_block_crosswalk(path, seed=1)
+    os.utime(path, ns=(0, 0))
+    third = Crosswalk(path, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 2
+    assert (third.block_group_2010_to_blocks_2020 !=
+            first.block_group_2010_to_blocks_2020)
+    verified = Crosswalk(path, cache_dir=cache_dir, verify_cache=True)
+    assert file_digest(path) in os.listdir(cache_dir)
+    assert (verified.block_group_2010_to_blocks_2020 ==
+            third.block_group_2010_to_blocks_2020)
+
+
+def test_bulk_translation_matches_per_coi_unions(tmp_path):
+    path = str(tmp_path / 'blocks.txt')
+    frame = write_block_crosswalk(path, seed=1)
+    bg_ids = sorted(set(block_ids(frame, 2010).str[:12]))
+    vtd_path = str(tmp_path / 'vtds.json')
+    vtds = {
+        'A': [bid for bid in block_ids(frame, 2020)[:5]],
+        'B': [bid for bid in block_ids(frame, 2020)[5:12]],
+    }
+    with open(vtd_path, 'w') as f:
+        json.dump(vtds, f)
+    crosswalk = Crosswalk(path, vtd_path)
+
+    rng = np.random.default_rng(2)
+    membership = rng.random((6, len(bg_ids))) < 0.3
+    translated, blocks = crosswalk.translate_block_groups(membership, bg_ids)
+    assert translated.shape == (6, len(blocks))
+    for row, coi in zip(translated, membership):
+        expected = crosswalk.map_2010_block_groups(
+            [bg for bg, member in zip(bg_ids, coi) if member])
+        assert {str(b).zfill(15) for b in blocks[row.indices]} == expected
+
+    translated, blocks = crosswalk.translate_vtds([[1, 0], [1, 1]], ['B', 'A'])
+    assert ({str(b).zfill(15) for b in blocks[translated[0].indices]} ==
+            crosswalk.map_vtds(['B']))
+    assert ({str(b).zfill(15) for b in blocks[translated[1].indices]} ==
+            crosswalk.map_vtds(['A', 'B']))
+
+
+def write_nhgis_crosswalk(path, num_blocks=200, seed=0):
+    rng = np.random.default_rng(seed)
+    blocks_2010 = 260010001001000 + rng.choice(10**4, num_blocks, replace=False)
+    rows = []
+    for block in blocks_2010:
+        targets = 260010001002000 + rng.choice(500, rng.integers(1, 4),
+                                               replace=False)
+        weights = rng.dirichlet(np.ones(len(targets)))
+        rows += [(block, target, weight)
+                 for target, weight in zip(targets, weights)]
+    frame = pd.DataFrame(rows, columns=['GEOID10', 'GEOID20', 'PAREA'])
+    frame.to_csv(path, index=False)
+    return frame
+
+
+def test_nhgis_translation_modes(tmp_path):
+    path = str(tmp_path / 'nhgis.csv')
+    frame = write_nhgis_crosswalk(path)
+    crosswalk = Crosswalk(nhgis_crosswalk_path=path)
+    blocks_2010 = frame['GEOID10'].unique()[:50]
+    rng = np.random.default_rng(3)
+    membership = rng.random((4, len(blocks_2010))) < 0.4
+
+    fractional, columns = crosswalk.translate_blocks(membership, blocks_2010,
+                                                     mode='fractional')
+    max_weight, _ = crosswalk.translate_blocks(membership, blocks_2010)
+    for i, coi in enumerate(membership):
+        pairs = frame[frame['GEOID10'].isin(blocks_2010[coi])]
+        expected = pairs.groupby('GEOID20')['PAREA'].sum()
+        actual = pd.Series(fractional[i].data, index=columns[fractional[i].indices])
+        pd.testing.assert_series_equal(actual.sort_index(), expected,
+                                       check_names=False, check_index_type=False)
+
+        best = pairs.loc[pairs.groupby('GEOID10')['PAREA'].idxmax(), 'GEOID20']
+        assert set(columns[max_weight[i].indices]) == set(best)
+
+
+def test_store_loads_states_lazily_with_lru(tmp_path):
+    store = CrosswalkStore(str(tmp_path / 'store'), max_resident=1)
+    crosswalks = {}
+    for state, seed in [('26', 4), ('6', 5)]:
+        path = str(tmp_path / f'blocks{state}.txt')
+        write_block_crosswalk(path, seed=seed)
+        crosswalks[state] = Crosswalk(path)
+        store.add(state, crosswalks[state])
+    assert store.states == ['06', '26'] and store.resident == []
+
+    michigan = store['26']
+    assert isinstance(michigan.blocks_2020, np.memmap)
+    assert store['26'] is michigan
+    bg = michigan.block_group_ids[0]
+    assert (michigan.map_2010_block_groups([bg]) ==
+            crosswalks['26'].map_2010_block_groups([bg]))
+    store[6]
+    assert store.resident == ['06']
+    assert '48' not in store
+
+
+def test_crosswalk_2010b_to_2020b_lookup_table(tmp_path, monkeypatch):
+    import lookup_table_generation
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / 'nhgis_blk2010_blk2020_ge_v0_26' / 'michigan'
+    path.mkdir(parents=True)
+    frame = write_nhgis_crosswalk(str(path / 'nhgis_blk2010_blk2020_ge_v0_26.csv'))
+    blocks_2010 = [str(block) for block in frame['GEOID10'].unique()[:20]]
+    pivot = pd.DataFrame(0, index=['p1-1', 'p2-2'],
+                         columns=['submission_text'] + blocks_2010 + ['1'])
+    pivot['submission_text'] = ['a', 'b']
+    pivot.loc['p1-1', blocks_2010[:5]] = 1
+    pivot.loc['p2-2', blocks_2010[5:8] + ['1']] = 1
+
+    lookup, block20_names = lookup_table_generation.crosswalk_2010b_to_2020b(
+        'michigan', pivot)
+    assert list(lookup.index) == ['p1-1', 'p2-1']
+    assert list(lookup['submission_text']) == ['a', 'b']
+    for name, blocks in [('p1-1', blocks_2010[:5]), ('p2-1', blocks_2010[5:8])]:
+        row = lookup.loc[name].drop(['submission_text', 'area_text', 'area_name'])
+        expected = frame[frame['GEOID10'].astype(str).isin(blocks)]['GEOID20']
+        assert set(row[row == 1].index) == set(expected.astype(str))
+    assert set(block20_names) == set(
+        frame[frame['GEOID10'].astype(str).isin(blocks_2010[:8])]['GEOID20'].astype(str))
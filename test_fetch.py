@@ -1,4 +1,49 @@
+from datetime import datetime as dt
+import pandas as pd
+import pytest
 import submission_analysis.fetch as fetch
+from submission_analysis.plan_cache import PlanCache
+from standin_portal import StandInPortal
+
+
+def test_concurrent_retrieve_against_standin_portal():
+    with StandInPortal(num_submissions=40, latency=0.01,
+                       error_rate=0.3) as portal:
+        submissions = fetch.retrieve_submission_ids_json(
+            portal.endpoints()[0], concurrency=8,
+            session=fetch.make_session(backoff_factor=0),
+            plan_read_url=portal.plan_read_url, timeout=5)
+    assert [sub.id for sub in submissions] == [
+        str(i) for i in reversed(range(40))]
+    for sub in submissions:
+        assert sub.districtr_plan == portal.plan(sub.id)
+        assert sub.plan_type == portal.submission_type(int(sub.id))
+
+
+def test_submissions_against_standin_portal():
+    with StandInPortal(num_submissions=30, num_written=4) as portal:
+        plans_df, cois_df, written_df = fetch.submissions(
+            *portal.endpoints(), plan_read_url=portal.plan_read_url)
+    assert len(plans_df) + len(cois_df) == 30 and len(written_df) == 4
+    for _, row in cois_df.iterrows():
+        assert row['districtr_data'] == portal.plan(row['plan_id'])
+
+
+def test_plan_reads_only_fetches_uncached_plans(tmp_path):
+    cache = PlanCache(str(tmp_path / 'plans.sqlite'))
+    plan_ids = [str(i) for i in range(20)]
+    with StandInPortal(not_found_rate=0.2) as portal:
+        stats = fetch.prefetch(plan_ids[:10], cache, concurrency=4,
+                               plan_read_url=portal.plan_read_url)
+        not_found = {i for i in plan_ids if not portal.is_found(i)}
+        assert stats['plans'] == len(set(plan_ids[:10]) - not_found)
+        portal.plan_reads.clear()
+        plans = fetch.plan_reads(plan_ids, concurrency=4,
+                                 plan_read_url=portal.plan_read_url,
+                                 cache=cache)
+    assert plans == [portal.plan(i) for i in plan_ids]
+    assert set(portal.plan_reads) == not_found | set(plan_ids[10:])
+    assert cache.hits == stats['plans']
 
 def test_retrieve_submission_json():
     url = "https://o1siz7rw0c.execute-api.us-east-2.amazonaws.com/beta/submissions/districtr-ids/michigan"
@@ -15,3 +60,51 @@ def test_fetch_submissions():
     assert len(plans_df) != 0
     assert len(cois_df) != 0
     assert len(written_df) != 0
+
+def baseline_parse(datetimes):
+    # the per-row parse parse_portal_datetimes replaced
+    datetimes = datetimes.map(lambda datetime: (
+        datetime.split("+")[0] + " +" + datetime.split("+")[1].split(" ")[0]))
+    return datetimes.map(lambda datetime: (
+        dt.strptime(datetime, '%a %b %d %Y %X %Z %z')))
+
+def test_parse_portal_datetimes():
+    raw = pd.Series(['Mon Jun 14 2021 16:05:12 GMT+0000 (Coordinated Universal Time)',
+                     'Tue Jun 1 2021 09:00:00 GMT+0000 (Coordinated Universal Time)'])
+    parsed = fetch.parse_portal_datetimes(raw)
+    assert list(parsed) == list(baseline_parse(raw))
+    assert list(parsed.dt.strftime('%Y-%m-%d %H:%M:%S %z')) == [
+        '2021-06-14 16:05:12 +0000', '2021-06-01 09:00:00 +0000']
+    # the same string bounds select the same rows
+    assert list(parsed > '2021-06-14') == list(baseline_parse(raw) > '2021-06-14')
+
+    # other offsets keep their wall-clock times, and mixed ones parse too
+    raw = pd.Series(['Mon Jun 14 2021 16:05:12 GMT+0100 (British Summer Time)',
+                     'Tue Jun 1 2021 09:00:00 GMT+0000 (Coordinated Universal Time)'])
+    parsed = fetch.parse_portal_datetimes(raw)
+    assert list(parsed) == list(baseline_parse(raw))
+    assert [t.strftime('%H:%M %z') for t in parsed] == ['16:05 +0100', '09:00 +0000']
+    parsed = fetch.parse_portal_datetimes(pd.Series(
+        ['Tue Jun 1 2021 09:00:00 GMT-0400 (Eastern Daylight Time)']))
+    assert list(parsed) == [pd.Timestamp('2021-06-01 13:00:00', tz='UTC')]
+
+def test_csv_read_pages_past_the_length_limit():
+    with StandInPortal(num_submissions=50, coi_fraction=0.) as portal:
+        plans_url = portal.endpoints()[1].replace('length=10000', 'length=20')
+        pages = list(fetch.csv_pages(plans_url))
+        assert [len(page) for page in pages] == [20, 20, 10]
+        plans_df = fetch.csv_read(plans_url)
+        assert list(plans_df['id']) == list(reversed(range(50)))
+        assert portal.csv_requests == 6
+
+        # an endpoint that ignores `start` is read once past its first page,
+        # with a warning that rows may be missing
+        portal.paging = False
+        with pytest.warns(UserWarning, match='repeated its rows'):
+            assert len(fetch.csv_read(plans_url)) == 20
+        # also without id or link columns to tell the rows apart
+        portal.csv_columns = ['type', 'datetime', 'text']
+        with pytest.warns(UserWarning, match='repeated its rows'):
+            assert len(fetch.csv_read(plans_url)) == 20
+        portal.paging = True
+        assert len(fetch.csv_read(plans_url)) == 50
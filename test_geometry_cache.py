@@ -0,0 +1,28 @@
+import os
+import geopandas as gpd
+import pytest
+from shapely.geometry import Point
+from submission_analysis.geometry_cache import GeometryCache
+
+
+def test_cache_then_read_offline(tmp_path):
+    source = str(tmp_path / 'bg10.geojson')
+    gpd.GeoDataFrame({'GEOID10': ['260010001001', '260010001002'],
+                      'NAME': ['a', 'b']},
+                     geometry=[Point(0, 0), Point(1, 1)],
+                     crs='EPSG:4326').to_file(source, driver='GeoJSON')
+    root = str(tmp_path / 'cache')
+
+    shp = GeometryCache(root).read(source, 'Michigan', 'blockgroups',
+                                   id_columns=['GEOID10', 'GEOID'])
+    assert list(shp['GEOID10']) == [260010001001, 260010001002]
+    os.remove(source)
+
+    offline = GeometryCache(root, offline=True)
+    shp = offline.read(source, 'Michigan', 'blockgroups')
+    assert list(shp['GEOID10']) == ['260010001001', '260010001002']
+    assert shp.crs.to_epsg() == 4326
+    attributes = offline.read_attributes(source, 'Michigan', 'blockgroups')
+    assert list(attributes.columns) == ['GEOID10', 'NAME']
+    with pytest.raises(FileNotFoundError):
+        offline.read(source, 'Michigan', 'blocks')
@@ -0,0 +1,21 @@
+import numpy as np
+from submission_analysis.hierarchy import CensusHierarchy
+
+
+def test_expand_block_groups_to_blocks():
+    blocks = ['260010001001000', '260010001001001', '260010001002000',
+              '260010002001000', '261630001001000']
+    hierarchy = CensusHierarchy(blocks)
+    assert list(hierarchy.parents('county')) == [26001, 26001, 26001, 26001,
+                                                 26163]
+
+    bgs = ['260010001001', '260010001002', 'ward 7']
+    assert list(hierarchy.nested(bgs)) == [True, True, False]
+    membership = np.array([[1, 0, 0], [1, 1, 1], [0, 0, 1]])
+    expanded = hierarchy.expand(membership, bgs)
+    assert expanded.toarray().tolist() == [[1, 1, 0, 0, 0],
+                                           [1, 1, 1, 0, 0],
+                                           [0, 0, 0, 0, 0]]
+
+    tracts = hierarchy.expand([[1, 1]], ['26001000100', '26163000100'], 'tract')
+    assert tracts.toarray().tolist() == [[1, 1, 1, 0, 1]]
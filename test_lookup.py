@@ -0,0 +1,68 @@
+import pandas as pd
+from submission_analysis.lookup import LookupTable, convert_lookup_csv, read_lookup_table
+from submission_analysis.submission_store import SubmissionStore
+
+
+def test_lookup_table_from_store(tmp_path):
+    plans = [
+        {'msg': 'Plan successfully found',
+         'plan': {'assignment': {'2': 1, '1': [0, 1], '9': 0},
+                  'parts': [{'id': 0, 'name': 'Downtown', 'description': 'x'},
+                            {'id': 1, 'name': 'Lakeshore'}]}},
+        {'msg': 'Plan successfully found',
+         'plan': {'assignment': {'3': 0}, 'parts': []}},
+    ]
+    store = SubmissionStore.from_plans(['a', 'b'], plans)
+    texts = pd.Series(['first', 'second'], index=['a', 'b'])
+    table = LookupTable.from_store(store, texts, ['1', '2', '3'])
+
+    # parts in first-assigned order, unknown tiles appended as columns
+    assert list(table.metadata.index) == ['a-2', 'a-1', 'b-1']
+    assert list(table.tiles) == ['1', '2', '3', '9']
+    assert list(table.metadata['submission_text']) == ['first', 'first', 'second']
+    assert list(table.metadata['area_name']) == ['Lakeshore', 'Downtown', '']
+    assert list(table.metadata['area_text']) == ['', 'x', '']
+    assert table.matrix.toarray().tolist() == [[1, 1, 0, 0],
+                                               [1, 0, 0, 1],
+                                               [0, 0, 1, 0]]
+
+    frame = table.to_frame()
+    assert list(frame.columns) == ['submission_text', 'area_text',
+                                   'area_name', '1', '2', '3', '9']
+    assert frame['9'].sparse.density == 1 / 3
+
+    path = tmp_path / 'lookup.csv'
+    table.to_csv(str(path), chunk_rows=2)
+    written = pd.read_csv(path, index_col=0, keep_default_na=False)
+    pd.testing.assert_frame_equal(written, table.to_frame(sparse=False),
+                                  check_dtype=False)
+
+    # wide frames (sparse or dense) read back into the same table
+    for wide in (frame, written):
+        read = LookupTable.from_frame(wide)
+        assert list(read.tiles) == list(table.tiles)
+        assert (read.matrix != table.matrix).nnz == 0
+        assert read.metadata.equals(table.metadata)
+
+
+def test_lookup_table_compact_format(tmp_path):
+    frame = pd.DataFrame({
+        'submission_text': ['first', 'first', 'second'],
+        'area_text': ['x', '', ''],
+        'area_name': ['Downtown', 'Lakeshore', ''],
+        '1': [1, 1, 0], '2': [0, 1, 0], '9': [0, 0, 1],
+    }, index=['a-1', 'a-2', 'b-1'])
+    table = LookupTable.from_frame(frame)
+
+    csv_path = str(tmp_path / 'ohio_lookup_table.csv')
+    table.write(csv_path)
+    directory = convert_lookup_csv(csv_path)
+    assert directory == str(tmp_path / 'ohio_lookup_table.lookup')
+
+    # overwrite in place, then read both formats back
+    table.write(directory)
+    for read in (read_lookup_table(directory),
+                 read_lookup_table(csv_path, chunk_rows=2)):
+        assert list(read.tiles) == ['1', '2', '9']
+        assert (read.matrix != table.matrix).nnz == 0
+        pd.testing.assert_frame_equal(read.metadata.fillna(""), table.metadata)
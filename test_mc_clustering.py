@@ -0,0 +1,213 @@
+import random
+from collections import Counter
+import numpy as np
+import pytest
+import submission_analysis.mc_clustering as mc
+
+
+def distance_matrix(num_docs, seed=0):
+    points = np.random.default_rng(seed).random((num_docs, 2))
+    return np.linalg.norm(points[:, None, :] - points[None, :, :], axis=2)
+
+
+def test_resume_matches_uninterrupted_run(tmp_path):
+    dists = distance_matrix(40)
+    random.seed(2021)
+    uninterrupted = mc.geo_chain(dists, beta=1., num_clusters=4, length=300)
+    for _ in uninterrupted:
+        pass
+    rng_state = random.getstate()
+
+    random.seed(2021)
+    checkpoint_path = str(tmp_path / 'chain.npz')
+    first_half = mc.geo_chain(dists, beta=1., num_clusters=4, length=300,
+                              checkpoint_path=checkpoint_path)
+    for _ in range(150):
+        next(first_half)
+    first_half.checkpoint(checkpoint_path)
+
+    random.seed(12345)  # a fresh process would have a different RNG state
+    resumed = mc.geo_chain(dists, beta=1., num_clusters=4, length=300,
+                           checkpoint_path=checkpoint_path)
+    assert resumed.step == 150
+    for _ in resumed:
+        pass
+    assert resumed.state.assignment == uninterrupted.state.assignment
+    assert resumed.state.scores == uninterrupted.state.scores
+    assert resumed.best_scores == uninterrupted.best_scores
+    assert resumed.diagnostics == uninterrupted.diagnostics
+    assert random.getstate() == rng_state
+
+
+def test_best_scores_track_objective_direction():
+    dists = distance_matrix(30, seed=1)
+    chain = mc.geo_semantic_chain(dists, 1 - dists, beta=1., num_clusters=3,
+                                  length=200)
+    best_geo = chain.state.scores['geo']
+    best_semantic = chain.state.scores['semantic']
+    for state in chain:
+        best_geo = min(best_geo, state.scores['geo'])
+        best_semantic = max(best_semantic, state.scores['semantic'])
+    best_geo = min(best_geo, chain.state.scores['geo'])
+    best_semantic = max(best_semantic, chain.state.scores['semantic'])
+    assert chain.best_scores == {'geo': best_geo, 'semantic': best_semantic}
+
+
+def test_nearest_neighbors_excludes_self():
+    dists = distance_matrix(50, seed=2)
+    neighbors = mc.nearest_neighbors(dists, 5, chunk_size=16)
+    assert neighbors.shape == (50, 5)
+    for doc, row in enumerate(neighbors):
+        assert doc not in row
+        expected = np.argsort(np.where(np.arange(50) == doc, np.inf,
+                                       dists[doc]))[:5]
+        assert set(row) == set(expected)
+        assert np.all(np.diff(dists[doc, row]) >= 0)
+
+
+def test_neighbor_proposal_ratio_matches_empirical_rates():
+    dists = distance_matrix(6, seed=3)
+    proposal_fn = mc.neighbor_flip_proposal(mc.nearest_neighbors(dists, 2),
+                                            uniform_prob=0.2)
+
+    def sample_moves(state, samples=20000):
+        counts, ratios = Counter(), {}
+        for _ in range(samples):
+            proposal = proposal_fn(state)
+            doc = next(doc for doc, part in state.assignment.items()
+                       if proposal.assignment[doc] != part)
+            move = (doc, proposal.assignment[doc])
+            counts[move] += 1
+            ratios[move] = proposal.proposal_ratio
+        return counts, ratios
+
+    random.seed(7)
+    start = mc.ChainState.from_assignment(
+        {0: 0, 1: 0, 2: 1, 3: 1, 4: 2, 5: 2}, 3, {})
+    forward_counts, forward_ratios = sample_moves(start)
+    for (doc, part), count in forward_counts.most_common(3):
+        reverse_counts, _ = sample_moves(start.flip({doc: part}))
+        reverse_count = reverse_counts[(doc, start.assignment[doc])]
+        expected = forward_ratios[(doc, part)]
+        assert abs(reverse_count / count - expected) < 0.15 * expected
+
+
+def test_running_stats_match_numpy():
+    values = np.cumsum(np.random.default_rng(4).normal(size=500)) + 1000
+    stats = mc.RunningStats()
+    for value in values:
+        stats.push(value)
+    centered = values - values.mean()
+    assert np.isclose(stats.mean, values.mean())
+    assert np.isclose(stats.variance, values.var(ddof=1))
+    assert np.isclose(stats.autocorrelation,
+                      (centered[1:] * centered[:-1]).sum() /
+                      (centered**2).sum())
+    assert stats.effective_sample_size < len(values) / 10
+
+
+def test_stopping_rule_ends_chain_early():
+    dists = distance_matrix(30, seed=5)
+    chain = mc.geo_chain(dists, beta=1., num_clusters=3, length=100000,
+                         stopping_rule=mc.ess_stopping_rule(min_ess=50,
+                                                            min_steps=200))
+    for _ in chain:
+        pass
+    assert chain.converged
+    assert 200 <= chain.step < chain.length
+    assert chain.diagnostics.min_effective_sample_size >= 50
+
+
+def test_replicas_converge():
+    dists = distance_matrix(30, seed=6)
+    random.seed(8)
+    chains = [
+        mc.geo_chain(dists, beta=1., num_clusters=3, length=20000)
+        for _ in range(4)
+    ]
+    assert mc.run_replicas(chains, max_rhat=1.1)
+    assert all(chain.step < chain.length for chain in chains)
+    diagnostics = [chain.diagnostics for chain in chains]
+    assert mc.gelman_rubin(diagnostics, 'geo') <= 1.1
+
+
+def test_replicas_keep_checking_after_a_replica_ends(monkeypatch):
+    dists = distance_matrix(20, seed=6)
+    random.seed(8)
+    chains = [
+        mc.geo_chain(dists, beta=1., num_clusters=3, length=length)
+        for length in (150, 1000, 1000)
+    ]
+    checks = []
+    monkeypatch.setattr(mc, 'gelman_rubin',
+                        lambda diagnostics, name: checks.append(name) or np.inf)
+    assert not mc.run_replicas(chains, check_every=100)
+    # every 100 iterations while the others run, and once they have all ended
+    assert len(checks) == 11
+    assert [chain.step for chain in chains] == [150, 1000, 1000]
+
+
+def test_flip_maintains_cluster_sizes():
+    random.seed(9)
+    state = mc.ChainState.random(25, 6, {})
+    for _ in range(2000):
+        previous = state
+        state = mc.single_flip_proposal(state)
+        sizes = [len(indices) for indices in state.partitions.values()]
+        assert state.min_cluster_size == min(sizes)
+        assert state.size_counts == dict(Counter(sizes))
+        assert sum(len(p) for p in previous.partitions.values()) == 25
+
+
+def test_schedules():
+    chain = mc.geo_chain(distance_matrix(20, seed=10), beta=1.,
+                         num_clusters=2, length=400,
+                         schedule=mc.linear_schedule(0.5, 4., 200))
+    betas = [chain.beta for _ in chain]
+    assert betas[0] == 0.5
+    assert np.isclose(betas[100], 0.5 + 3.5 * 100 / 200)
+    assert betas[-1] == 4.
+
+    geometric = mc.geometric_schedule(1., 100., 100)
+    chain.step = 50
+    assert np.isclose(geometric(chain), 10.)
+
+
+def test_schedule_needs_an_accept_fn_that_takes_beta():
+    dists = distance_matrix(20, seed=12)
+    chain = mc.geo_chain(dists, beta=1., num_clusters=2, length=10)
+
+    def greedy(current, proposed):
+        return float(proposed.scores['geo'] <= current.scores['geo'])
+
+    kwargs = dict(proposal_fn=chain.proposal_fn, score_fns=chain.score_fns,
+                  accept_fn=greedy, soft_constraints=chain.soft_constraints,
+                  num_docs=20, num_clusters=2, length=10,
+                  objectives=chain.objectives)
+    schedule = mc.linear_schedule(0.5, 4., 5)
+
+    assert not mc.takes_beta(greedy)
+    assert len(list(mc.checkpointed_chain(**kwargs))) == 10
+    with pytest.raises(ValueError, match='takes beta'):
+        mc.checkpointed_chain(**kwargs, schedule=schedule)
+
+    def annealed_greedy(current, proposed, beta):
+        return greedy(current, proposed)
+
+    annealed_greedy.takes_beta = True
+    kwargs['accept_fn'] = annealed_greedy
+    chain = mc.checkpointed_chain(**kwargs, schedule=schedule)
+    assert len(list(chain)) == 10
+    assert chain.beta == 4.
+
+
+def test_adaptive_schedule_tracks_target_rate():
+    random.seed(11)
+    chain = mc.geo_chain(distance_matrix(40, seed=11), beta=1.,
+                         num_clusters=4, length=6000,
+                         schedule=mc.adaptive_schedule(1., target_rate=0.2,
+                                                       gain=0.05))
+    chain.diagnostics.burn_in = 1000
+    for _ in chain:
+        pass
+    assert abs(chain.diagnostics.acceptance_rate - 0.2) < 0.05
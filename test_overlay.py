@@ -0,0 +1,64 @@
+import os
+import shutil
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import box
+from submission_analysis.overlay import (Incidence, cached_incidence,
+                                         overlay_incidence)
+
+
+def test_overlay_incidence_translate_and_cache(tmp_path):
+    # three unit squares in a row; two precincts, the second in two pieces
+    targets = gpd.GeoDataFrame({'GEOID10': ['1', '2', '3']},
+                               geometry=[box(i, 0, i + 1, 1) for i in range(3)],
+                               crs='EPSG:3857')
+    sources = gpd.GeoDataFrame({'VTD': ['A', 'B', 'B']},
+                               geometry=[box(0, 0, 1.1, 1), box(1.5, 0, 2, 1),
+                                         box(2, 0, 3, 1)],
+                               crs='EPSG:3857')
+    incidence = overlay_incidence(sources, targets, sources['VTD'],
+                                  targets['GEOID10'])
+    assert list(incidence.source_ids) == ['A', 'B']
+    assert incidence.matrix.toarray().tolist() == [[1, 1, 0], [0, 1, 1]]
+
+    # A only covers a sliver of block group 2, and touches nothing else
+    thresholded = overlay_incidence(sources, targets, sources['VTD'],
+                                    targets['GEOID10'], min_overlap=0.2)
+    assert thresholded.matrix.toarray().tolist() == [[1, 0, 0], [0, 1, 1]]
+
+    membership = np.array([[1, 0], [0, 1], [1, 1]])
+    translated = incidence.translate(membership, ['A', 'B'])
+    assert translated.toarray().tolist() == [[1, 1, 0], [0, 1, 1], [1, 1, 1]]
+    # unknown precinct ids are dropped
+    assert incidence.translate([[1, 1]], ['X', 'B']).toarray().tolist() == [[0, 1, 1]]
+
+    built = []
+    build = lambda: built.append(1) or incidence
+    key = {'precincts': 'a.shp', 'min_overlap': 0.}
+    cached = cached_incidence(str(tmp_path), key, build)
+    cached = cached_incidence(str(tmp_path), key, build)
+    assert len(built) == 1
+    assert (cached.matrix != incidence.matrix).nnz == 0
+    assert list(cached.target_ids) == ['1', '2', '3']
+
+    # the same key with other units (a changed shapefile) is rebuilt
+    ids_key = {'precincts': 'b.shp', 'min_overlap': 0.}
+    cached_incidence(str(tmp_path), ids_key, build, ['A', 'B'], ['1', '2', '3'])
+    cached_incidence(str(tmp_path), ids_key, build, sources['VTD'],
+                     targets['GEOID10'])
+    assert len(built) == 2
+    digests = set(os.listdir(tmp_path))
+    renumbered = overlay_incidence(sources, targets, sources['VTD'],
+                                   [1, 2, 4])
+    cached = cached_incidence(str(tmp_path), ids_key, lambda: renumbered,
+                              sources['VTD'], [1, 2, 4])
+    assert list(cached.target_ids) == ['1', '2', '4']
+
+    # a cache entry whose ids don't match (a stale copy, say) is rebuilt
+    path = str(tmp_path / (set(os.listdir(tmp_path)) - digests).pop())
+    shutil.rmtree(path)
+    incidence.save(path)
+    cached = cached_incidence(str(tmp_path), ids_key, lambda: renumbered,
+                              sources['VTD'], [1, 2, 4])
+    assert list(cached.target_ids) == ['1', '2', '4']
+    assert list(Incidence.load(path).target_ids) == ['1', '2', '4']
@@ -0,0 +1,59 @@
+from submission_analysis.pipeline import Pipeline, Stage
+
+
+def source(n):
+    return list(range(n))
+
+
+def total(values, scale=1):
+    return sum(values) * scale
+
+
+def count(values):
+    return len(values)
+
+
+def combine(a, b):
+    return (a, b)
+
+
+def stages(n, scale=1):
+    return [
+        Stage('source', source, params={'n': n}, volatile=True),
+        Stage('total', total, inputs=('source', ), params={'scale': scale}),
+        Stage('count', count, inputs=('source', )),
+        Stage('both', combine, inputs=('total', 'count')),
+    ]
+
+
+def test_pipeline_skips_up_to_date_stages(tmp_path):
+    artifacts = str(tmp_path)
+    pipeline = Pipeline(stages(4), artifacts)
+    assert pipeline.run(['both']) == {'both': (6, 4)}
+    assert pipeline.ran == ['source', 'total', 'count', 'both']
+
+    # volatile stages rerun, but unchanged output keeps the rest up to date
+    pipeline = Pipeline(stages(4), artifacts)
+    assert pipeline.run(['both']) == {'both': (6, 4)}
+    assert pipeline.ran == ['source']
+    assert pipeline.skipped == ['total', 'count', 'both']
+
+    # changing a stage's params reruns it and what depends on it
+    pipeline = Pipeline(stages(4, scale=10), artifacts)
+    assert pipeline.run(['both']) == {'both': (60, 4)}
+    assert pipeline.ran == ['source', 'total', 'both']
+
+    # independent stages run in parallel
+    pipeline = Pipeline(stages(5), artifacts, processes=2)
+    assert pipeline.run() == {'source': [0, 1, 2, 3, 4], 'total': 10,
+                              'count': 5, 'both': (10, 5)}
+    assert Pipeline(stages(5)).run(['count']) == {'count': 5}
+
+
+def test_stage_code_digest():
+    # the defining module's source is hashed, so helpers count too
+    stage = Stage('total', total)
+    assert stage.code_digest() == Stage('count', count).code_digest()
+    assert Stage('total', total, version='2').code_digest() != stage.code_digest()
+    assert Stage('total', total, depends=(Pipeline, )).code_digest() \
+        != stage.code_digest()
@@ -0,0 +1,52 @@
+import geopandas as gpd
+import pandas as pd
+from shapely.geometry import Point
+from submission_analysis.pivot import UnitIndex, unit_lookup_tables
+
+
+def plan(units, key, assignment):
+    return {'plan': {'assignment': assignment,
+                     'parts': [{'id': 0, 'name': 'Area 1'}],
+                     'units': {'id': units},
+                     'place': {'state': 'Michigan'},
+                     'idColumn': {'key': key}}}
+
+
+def test_unit_lookup_tables_bucket_by_unit(tmp_path):
+    shapefiles = {
+        'blockgroups': gpd.GeoDataFrame(
+            {'GEOID10': ['260010001001', '260010001002']},
+            geometry=[Point(0, 0), Point(1, 1)], crs='EPSG:4326'),
+        'precincts': gpd.GeoDataFrame(
+            {'VTD': ['P1', 'P2', 'P3']},
+            geometry=[Point(0, 0), Point(1, 1), Point(2, 2)], crs='EPSG:4326'),
+    }
+    links = {}
+    for unit, shp in shapefiles.items():
+        links[unit] = str(tmp_path / f'{unit}.geojson')
+        shp.to_file(links[unit], driver='GeoJSON')
+    reads = []
+
+    def link(state, unit):
+        reads.append(unit)
+        return links[unit]
+
+    df = pd.DataFrame({
+        'plan_id': ['a', 'b', 'c'],
+        'text': ['x', 'y', 'z'],
+        'districtr_data': [plan('blockgroups', 'GEOID', {'260010001002': 0}),
+                           plan('precincts', 'VTD', {'P3': 0, 'P1': 0}),
+                           plan('blockgroups', 'GEOID', {'260010001001': 0})],
+    })
+    index = UnitIndex(link)
+    tables = unit_lookup_tables(df, index)
+    assert set(tables) == {'blockgroups', 'precincts'}
+    assert list(tables['blockgroups'].metadata.index) == ['a-1', 'c-1']
+    # GEOID falls back to the shapefile's GEOID10 column
+    assert list(tables['blockgroups'].tiles) == ['260010001001', '260010001002']
+    assert tables['blockgroups'].matrix.toarray().tolist() == [[0, 1], [1, 0]]
+    assert tables['precincts'].matrix.toarray().tolist() == [[1, 0, 1]]
+
+    # the unit index reads each shapefile once
+    unit_lookup_tables(df, index, ['precincts'])
+    assert sorted(reads) == ['blockgroups', 'precincts']
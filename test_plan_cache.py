@@ -0,0 +1,25 @@
+from submission_analysis.plan_cache import PlanCache, PLAN_FOUND_MSG
+
+
+def found(plan_id):
+    return {'msg': PLAN_FOUND_MSG, 'plan': {'id': plan_id}}
+
+
+def test_round_trip_and_hit_rate(tmp_path):
+    path = str(tmp_path / 'plans.sqlite')
+    cache = PlanCache(path)
+    stored = cache.put_many({
+        'a': found('a'),
+        'b': found('b'),
+        'c': {'msg': 'Plan not found'},
+    })
+    assert stored == 2 and 'c' not in cache
+    cache.close()
+
+    cache = PlanCache(path)
+    assert cache.get_many(['b', 'a', 'c', 'd']) == {
+        'a': found('a'),
+        'b': found('b'),
+    }
+    assert cache.stats() == {'plans': 2, 'hits': 2, 'misses': 2,
+                             'hit_rate': 0.5}
@@ -0,0 +1,62 @@
+import pandas as pd
+from submission_analysis.submission_store import (SubmissionStore, flatten_assignment,
+                                                  submission_kinds)
+
+
+def test_flatten_and_parquet_round_trip(tmp_path):
+    plans = [
+        {'msg': 'Plan successfully found',
+         'plan': {'assignment': {'260010001001': 0, '260010001002': [1, 0]},
+                  'parts': [{'id': 0, 'name': 'Downtown', 'description': 'x'},
+                            {'id': 1, 'name': 'Lakeshore'}],
+                  'units': {'id': 'blockgroups'},
+                  'place': {'state': 'Michigan'},
+                  'idColumn': {'key': 'GEOID'}}},
+        {'msg': 'Plan not found'},
+    ]
+    store = SubmissionStore.from_plans(['a', 'b'], plans, ['coi', 'plan'])
+    assert list(store.assignments['tile']) == ['260010001001', '260010001002',
+                                               '260010001002']
+    assert list(store.assignments['part']) == [0, 1, 0]
+    assert list(store.first_parts()['part']) == [0, 1]
+    assert list(store.parts['description']) == ['x', '']
+    assert list(store.submissions['num_parts']) == [2, 0]
+    assert list(store.submissions['has_assignment']) == [True, False]
+
+    store.save(str(tmp_path))
+    loaded = SubmissionStore.load(str(tmp_path))
+    for table in ('submissions', 'parts', 'assignments'):
+        assert getattr(loaded, table).equals(getattr(store, table))
+    assert str(loaded.assignments['tile'].dtype) == 'category'
+
+
+def test_classify_submissions():
+    found = 'Plan successfully found'
+    df = pd.DataFrame({
+        'plan_id': [1, 2, 3, 4, 5, 6],
+        'type': ['coi', 'plan', 'plan', 'plan', 'plan', 'written'],
+        'districtr_data': [
+            {'msg': found, 'plan': {'assignment': {'1': 0, '2': 1}}},
+            # only first assignments count towards districts
+            {'msg': found, 'plan': {'assignment': {'1': [2, 0], '2': 2}}},
+            {'msg': found, 'plan': {'assignment': {'1': 0, '2': 1}}},
+            {'msg': 'Plan not found'},
+            {'msg': found, 'plan': {'assignment': {}}},
+            None,
+        ]}, index=list('abcdef'))
+    classes = SubmissionStore.from_frame(df).classify()
+    assert list(classes.index) == ['1', '2', '3', '4', '5']
+    assert list(classes['valid']) == [True, True, True, False, True]
+    assert list(classes['districts']) == [2, 1, 2, 0, 0]
+    assert list(submission_kinds(df)) == ['coi', 'pseudo_coi', 'plan',
+                                          'invalid', 'plan', 'invalid']
+
+
+def test_flatten_assignment():
+    tiles, parts, ranks = flatten_assignment({'1': 0, '2': 1})
+    assert (tiles, list(parts), list(ranks)) == (['1', '2'], [0, 1], [0, 0])
+    # unassigned parts are skipped, but keep the ranks of the others
+    tiles, parts, ranks = flatten_assignment({'1': [2, 0], '2': None,
+                                              '3': [None, 1], '4': []})
+    assert (tiles, list(parts), list(ranks)) == (['1', '1', '3'], [2, 0, 1],
+                                                 [0, 1, 1])
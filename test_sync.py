@@ -0,0 +1,82 @@
+import os
+from standin_portal import StandInPortal
+import submission_analysis.sync as sync
+
+
+def test_sync_fetches_only_new_submissions(tmp_path):
+    snapshot_dir = str(tmp_path / 'ohio')
+    with StandInPortal(num_submissions=20, num_written=3,
+                       not_found_rate=0.2) as portal:
+        sync.sync_submissions(snapshot_dir, *portal.endpoints('ohio'),
+                              concurrency=4,
+                              plan_read_url=portal.plan_read_url)
+        portal.plan_reads.clear()
+        portal.num_submissions = 30
+        # later syncs only see the newest 8 csv rows of each type
+        urls = [url.replace('length=10000', 'length=8')
+                for url in portal.endpoints('ohio')]
+        plans_df, cois_df, written_df = sync.sync_submissions(
+            snapshot_dir, *urls, concurrency=4,
+            plan_read_url=portal.plan_read_url)
+
+    # only new plans and the ones that were not found before are read
+    not_found = {str(i) for i in range(20) if not portal.is_found(str(i))}
+    assert set(portal.plan_reads) == not_found | {str(i) for i in range(20, 30)}
+    # the snapshot keeps rows that have aged out of the csv endpoints
+    assert sorted(plans_df['id']) == [
+        i for i in range(30) if portal.submission_type(i) == 'plan']
+    assert sorted(cois_df['id']) == [
+        i for i in range(30) if portal.submission_type(i) == 'coi']
+    assert len(written_df) == 3
+    for _, row in cois_df.iterrows():
+        assert row['districtr_data'] == portal.plan(row['plan_id'])
+    assert plans_df['datetime'].iloc[0].utcoffset().total_seconds() == 0
+    assert os.path.exists(os.path.join(snapshot_dir, 'snapshot.json'))
+
+
+def test_sync_drops_removed_submissions(tmp_path):
+    snapshot_dir = str(tmp_path / 'ohio')
+    with StandInPortal(num_submissions=20, num_written=3) as portal:
+        urls = [url.replace('length=10000', 'length=8')
+                for url in portal.endpoints('ohio')]
+        sync.sync_submissions(snapshot_dir, *portal.endpoints('ohio'),
+                              plan_read_url=portal.plan_read_url)
+        # moderate away the oldest plan, which is out of the csv window
+        removed = min(i for i in range(20) if portal.submission_type(i) == 'plan')
+        portal.removed.add(removed)
+        portal.num_submissions = 22
+        portal.csv_requests = 0
+        plans_df, cois_df, _ = sync.sync_submissions(
+            snapshot_dir, *urls, plan_read_url=portal.plan_read_url)
+        # the newest page already reaches back into the snapshot
+        assert portal.csv_requests == 3
+        plans_df, cois_df, _ = sync.sync_submissions(
+            snapshot_dir, *urls, plan_read_url=portal.plan_read_url)
+
+    assert sorted(plans_df['id']) == [
+        i for i in range(22)
+        if portal.submission_type(i) == 'plan' and i != removed]
+    assert sorted(cois_df['id']) == [
+        i for i in range(22) if portal.submission_type(i) == 'coi']
+    for _, row in plans_df.iterrows():
+        assert row['districtr_data'] == portal.plan(row['plan_id'])
+
+
+def test_sync_pages_only_new_rows(tmp_path):
+    snapshot_dir = str(tmp_path / 'ohio')
+    with StandInPortal(num_submissions=300, num_written=3) as portal:
+        # the production urls, with length=10000
+        urls = portal.endpoints('ohio')
+        sync.sync_submissions(snapshot_dir, *urls,
+                              plan_read_url=portal.plan_read_url)
+        assert portal.csv_rows_served == 303
+        portal.num_submissions = 305
+        portal.csv_requests = portal.csv_rows_served = 0
+        plans_df, cois_df, _ = sync.sync_submissions(
+            snapshot_dir, *urls, plan_read_url=portal.plan_read_url,
+            page_length=10)
+
+    # one short page per table instead of the whole table
+    assert portal.csv_requests == 3
+    assert portal.csv_rows_served == 23
+    assert len(plans_df) + len(cois_df) == 305
@@ -1,3 +1,4 @@
+import pandas as pd
 import utils
 import submission_analysis.fetch as fetch
 
@@ -51,3 +52,13 @@ def test_summary_table_wrapper():
     plans_df, cois_df, written_df = utils.submission_dfs("miChIgAn")
     weeks_1_6_summary2 = utils.summary_table(weeks_1_6_dates, plans_df, cois_df, written_df)
     assert(len(weeks_1_6_summary) == len(weeks_1_6_summary2))
+
+def test_dfs_in_date_range_with_parsed_datetimes():
+    df = pd.DataFrame({'datetime': fetch.parse_portal_datetimes(pd.Series([
+        'Sat May 01 2021 00:00:00 GMT+0000 (Coordinated Universal Time)',
+        'Fri May 07 2021 23:59:59 GMT+0000 (Coordinated Universal Time)',
+        'Sat May 08 2021 12:00:00 GMT+0000 (Coordinated Universal Time)',
+    ]))})
+    week_1, week_2 = utils.dfs_in_date_range(
+        [('2021-5-01', '2021-5-07'), ('2021-5-08', '2021-5-14')], df)
+    assert list(week_1.index) == [1] and list(week_2.index) == [2]
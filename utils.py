@@ -12,6 +12,8 @@ from datetime import datetime as dt
 from datetime import timedelta
 from typing import Tuple
 import submission_analysis.fetch as fetch
+import submission_analysis.sync as sync
+import os
 
 def all_submissions_df(state: str) -> pd.DataFrame:
     """ 
@@ -43,6 +45,18 @@ def submission_dfs(state: str) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame
                                      ids_url, plans_url, cois_url, written_url)
     return plans_df, cois_df, written_df
 
+def synced_submission_dfs(state: str, snapshot_root: str = sync.DEFAULT_SNAPSHOT_ROOT
+                          ) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Same as submission_dfs, but keeps a local snapshot of the state's portal...
+    under snapshot_root and only fetches submissions that are not in it yet
+    To use:
+    >>> plans_df, cois_df, written_df = synced_submission_dfs("ohio")
+    """
+    ids_url, plans_url, cois_url, written_url, subs = submission_endpts(state)
+    return sync.sync_submissions(os.path.join(snapshot_root, state.lower()),
+                                 ids_url, plans_url, cois_url, written_url)
+
 def all_submissions_endpts(state: str) -> Tuple[str, str]:
     """
     Takes in the desired state portal and returns the endpoints for all plan...
@@ -149,10 +163,10 @@ def dfs_in_date_range(dates: list, df: pd.DataFrame) -> list:
         start_date = date[0]
         end_date = date[1]
         # increase end_date by one day to keep mask consistent w/ the way the..
-        # portal queries by date
-        end_date = dt.strptime(end_date, '%Y-%m-%d')
-        end_date += timedelta(days=1)
-        end_date = end_date.strftime('%Y-%m-%d')
+        # portal queries by date; bounds are in the datetime column's timezone
+        tz = df['datetime'].dt.tz
+        start_date = pd.Timestamp(start_date, tz=tz)
+        end_date = pd.Timestamp(end_date, tz=tz) + pd.Timedelta(days=1)
         mask = (df['datetime'] > start_date) & (df['datetime'] <= end_date)
         masked_df = df.loc[mask]
         dfs.append(masked_df)